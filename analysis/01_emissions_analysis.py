@@ -15,6 +15,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+from data_access import load_emissions_panel, load_sp500
+
 # Set up paths
 DATA_DIR = Path(__file__).parent.parent / "data"
 OUTPUT_DIR = Path(__file__).parent / "output"
@@ -32,22 +34,16 @@ print("=" * 60)
 print("LOADING DATA")
 print("=" * 60)
 
-# EPA GHGRP emissions panel
-emissions = pd.read_csv(DATA_DIR / "epa_ghgrp/processed/ghgrp_company_year_sp500_all_years.csv")
+# EPA GHGRP emissions panel with S&P 500 sector information
+emissions = load_emissions_panel()
 print(f"\nEmissions panel: {len(emissions)} company-year observations")
 print(f"  Companies: {emissions['ticker'].nunique()}")
 print(f"  Years: {emissions['year'].min()}-{emissions['year'].max()}")
 
-# S&P 500 constituents with sector info
-sp500 = pd.read_csv(DATA_DIR / "sp500_constituents.csv")
+# S&P 500 constituents
+sp500 = load_sp500()
 print(f"\nS&P 500 list: {len(sp500)} companies")
 
-# Merge sector information
-emissions = emissions.merge(
-    sp500[['Symbol', 'Security', 'GICS Sector', 'GICS Sub-Industry']],
-    left_on='ticker', right_on='Symbol', how='left'
-)
-
 # =============================================================================
 # 2. SUMMARY STATISTICS
 # =============================================================================
@@ -57,7 +53,7 @@ print("=" * 60)
 
 # Panel structure
 print("\n--- Panel Structure ---")
-obs_per_firm = emissions.groupby('ticker')['year'].count()
+obs_per_firm = emissions.groupby('ticker', observed=True)['year'].count()
 print(f"Mean years per firm: {obs_per_firm.mean():.1f}")
 print(f"Firms with complete panel (14 years): {(obs_per_firm == 14).sum()}")
 
@@ -77,7 +73,7 @@ for _, row in top_2023.iterrows():
 
 # Emissions by sector
 print("\n--- Emissions by GICS Sector (2023, Million Metric Tons) ---")
-sector_2023 = emissions[emissions['year'] == 2023].groupby('GICS Sector')['total_emissions'].agg(['sum', 'mean', 'count'])
+sector_2023 = emissions[emissions['year'] == 2023].groupby('GICS Sector', observed=True)['total_emissions'].agg(['sum', 'mean', 'count'])
 sector_2023['sum'] = sector_2023['sum'] / 1e6
 sector_2023['mean'] = sector_2023['mean'] / 1e6
 sector_2023 = sector_2023.sort_values('sum', ascending=False)
@@ -98,8 +94,8 @@ emissions['post_chatgpt'] = (emissions['year'] >= 2023).astype(int)
 emissions['pre_period'] = emissions['year'].isin([2019, 2020, 2021, 2022]).astype(int)
 
 # Calculate firm-level changes
-pre_avg = emissions[emissions['year'].isin([2020, 2021, 2022])].groupby('ticker')['total_emissions'].mean()
-post_avg = emissions[emissions['year'] == 2023].groupby('ticker')['total_emissions'].mean()
+pre_avg = emissions[emissions['year'].isin([2020, 2021, 2022])].groupby('ticker', observed=True)['total_emissions'].mean()
+post_avg = emissions[emissions['year'] == 2023].groupby('ticker', observed=True)['total_emissions'].mean()
 
 changes = pd.DataFrame({
     'pre_avg': pre_avg,
@@ -122,7 +118,7 @@ print(f"  Firms with increased emissions: {(changes['change'] > 0).sum()} ({(cha
 
 # Changes by sector
 print("\n--- Emissions Change by Sector (%) ---")
-sector_changes = changes.groupby('GICS Sector')['pct_change'].agg(['mean', 'median', 'count'])
+sector_changes = changes.groupby('GICS Sector', observed=True)['pct_change'].agg(['mean', 'median', 'count'])
 sector_changes = sector_changes.sort_values('mean', ascending=False)
 sector_changes.columns = ['Mean %', 'Median %', 'N']
 print(sector_changes.to_string())
@@ -255,7 +251,7 @@ yearly_summary.to_csv(OUTPUT_DIR / 'yearly_summary.csv')
 print(f"  Saved: yearly_summary.csv")
 
 # Export sector summary
-sector_summary = emissions.groupby(['year', 'GICS Sector']).agg({
+sector_summary = emissions.groupby(['year', 'GICS Sector'], observed=True).agg({
     'total_emissions': ['sum', 'mean', 'count']
 }).round(2)
 sector_summary.columns = ['total_emissions', 'mean_emissions', 'n_firms']
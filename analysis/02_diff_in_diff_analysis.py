@@ -9,19 +9,30 @@ Identification Strategy:
 - Treatment: High AI exposure industries × Post-ChatGPT (Nov 2022)
 - Outcome: Firm-level emissions changes
 - Model: Emissions_it = β(HighExposure_i × Post_t) + FirmFE + YearFE + ε
+
+Usage:
+    python analysis/02_diff_in_diff_analysis.py [--no-figures | --tables-only]
+
+With --no-figures (alias --tables-only) the figures are skipped and
+matplotlib is never imported; tables and CSV exports are unchanged.
 """
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import statsmodels.api as sm
-import statsmodels.formula.api as smf
+import sys
 from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+from data_access import SECTOR_AI_EXPOSURE, load_emissions_panel
+from fixed_effects import feols
+from grouped_regressions import feols_by
+from instrumentation import stage
+from wild_bootstrap import wild_cluster_bootstrap
+
 DATA_DIR = Path(__file__).parent.parent / "data"
 OUTPUT_DIR = Path(__file__).parent / "output"
+FIGURES = not ('--no-figures' in sys.argv or '--tables-only' in sys.argv)
 
 # =============================================================================
 # 1. LOAD AND MERGE DATA
@@ -30,37 +41,12 @@ print("=" * 70)
 print("DIFF-IN-DIFF ANALYSIS: AI EXPOSURE AND EMISSIONS")
 print("=" * 70)
 
-# Load emissions panel
+# Load emissions panel with S&P 500 sectors and sector AI exposure
+# (O*NET index, manual estimates for Energy/Utilities; see data_access.py)
 print("\n1. Loading data...")
-emissions = pd.read_csv(DATA_DIR / "epa_ghgrp/processed/ghgrp_company_year_sp500_all_years.csv")
+emissions = load_emissions_panel()
 print(f"   Emissions panel: {len(emissions)} company-year obs")
 
-# Load S&P 500 with sectors
-sp500 = pd.read_csv(DATA_DIR / "sp500_constituents.csv")
-
-# Merge sector info
-emissions = emissions.merge(
-    sp500[['Symbol', 'Security', 'GICS Sector']],
-    left_on='ticker', right_on='Symbol', how='left'
-)
-
-# Define AI exposure by sector (from our analysis + manual for Energy/Utilities)
-SECTOR_AI_EXPOSURE = {
-    'Information Technology': 81.5,
-    'Financials': 81.2,
-    'Health Care': 65.1,
-    'Consumer Discretionary': 62.6,
-    'Communication Services': 58.8,
-    'Industrials': 50.3,
-    'Energy': 45.0,           # Manual estimate
-    'Utilities': 42.0,        # Manual estimate
-    'Materials': 37.2,
-    'Consumer Staples': 29.6,
-    'Real Estate': 28.9,
-}
-
-emissions['ai_exposure'] = emissions['GICS Sector'].map(SECTOR_AI_EXPOSURE)
-
 # Create treatment variables
 emissions['post_chatgpt'] = (emissions['year'] >= 2023).astype(int)
 median_exposure = emissions['ai_exposure'].median()
@@ -119,32 +105,44 @@ print("=" * 70)
 
 # Model 1: Basic DiD (no fixed effects)
 print("\n--- Model 1: Basic Diff-in-Diff ---")
-model1 = smf.ols('log_emissions ~ high_ai_exposure * post_chatgpt', data=emissions).fit()
-print(f"  DiD coefficient (HighExp × Post): {model1.params['high_ai_exposure:post_chatgpt']:.4f}")
-print(f"  Standard error: {model1.bse['high_ai_exposure:post_chatgpt']:.4f}")
-print(f"  P-value: {model1.pvalues['high_ai_exposure:post_chatgpt']:.4f}")
+model1 = feols(emissions, 'log_emissions', ['high_ai_exposure', 'post_chatgpt', 'treatment'], cov_type='nonrobust')
+print(f"  DiD coefficient (HighExp × Post): {model1.params['treatment']:.4f}")
+print(f"  Standard error: {model1.bse['treatment']:.4f}")
+print(f"  P-value: {model1.pvalues['treatment']:.4f}")
 print(f"  R-squared: {model1.rsquared:.4f}")
 
 # Model 2: With firm fixed effects
 print("\n--- Model 2: Firm Fixed Effects ---")
 emissions['firm_fe'] = pd.Categorical(emissions['ticker'])
-model2 = smf.ols('log_emissions ~ treatment + C(year) + C(firm_fe)', data=emissions).fit()
+model2 = feols(emissions, 'log_emissions', 'treatment', fe=['firm_fe', 'year'], cov_type='nonrobust')
 print(f"  Treatment coefficient: {model2.params['treatment']:.4f}")
 print(f"  Standard error: {model2.bse['treatment']:.4f}")
 print(f"  P-value: {model2.pvalues['treatment']:.4f}")
-print(f"  R-squared: {model2.rsquared:.4f}")
+print(f"  R-squared: {model2.rsquared:.4f} (within: {model2.rsquared_within:.4f})")
 
 # Model 3: Continuous AI exposure
 print("\n--- Model 3: Continuous AI Exposure ---")
 emissions['ai_exposure_std'] = (emissions['ai_exposure'] - emissions['ai_exposure'].mean()) / emissions['ai_exposure'].std()
 emissions['ai_post_interaction'] = emissions['ai_exposure_std'] * emissions['post_chatgpt']
 
-model3 = smf.ols('log_emissions ~ ai_post_interaction + C(year) + C(firm_fe)', data=emissions).fit()
+model3 = feols(emissions, 'log_emissions', 'ai_post_interaction', fe=['firm_fe', 'year'], cov_type='nonrobust')
 print(f"  AI Exposure × Post coefficient: {model3.params['ai_post_interaction']:.4f}")
 print(f"  Standard error: {model3.bse['ai_post_interaction']:.4f}")
 print(f"  P-value: {model3.pvalues['ai_post_interaction']:.4f}")
 print(f"  Interpretation: 1 SD increase in AI exposure → {model3.params['ai_post_interaction']*100:.2f}% emissions change post-ChatGPT")
 
+# Treatment varies at the sector level (~11 clusters): wild cluster bootstrap
+# p-values with Webb weights; firms without a sector form their own cluster
+print("\n--- Wild Cluster Bootstrap (clusters = GICS sectors, Webb weights, 9,999 reps) ---")
+emissions['sector_cluster'] = emissions['GICS Sector'].astype(object).fillna(emissions['ticker'].astype(object))
+wcb_results = {}
+for label, model, param in [('Model 2', model2, 'treatment'), ('Model 3', model3, 'ai_post_interaction')]:
+    wcb = wild_cluster_bootstrap(emissions, 'log_emissions', param, param, fe=['firm_fe', 'year'],
+                                 cluster='sector_cluster', weights='webb')
+    wcb_results[param] = wcb
+    print(f"  {label} {param}: {model.params[param]:+.4f}, cluster SE {wcb['se']:.4f}, "
+          f"WCB p-value {wcb['p_value']:.4f} ({wcb['n_clusters']} clusters)")
+
 # =============================================================================
 # 4. EVENT STUDY / PARALLEL TRENDS
 # =============================================================================
@@ -162,8 +160,8 @@ for yr in event_study_years:
     emissions[f'high_x_{yr}'] = ((emissions['year'] == yr) & (emissions['high_ai_exposure'] == 1)).astype(int)
 
 # Run event study regression
-event_formula = 'log_emissions ~ ' + ' + '.join([f'high_x_{yr}' for yr in event_study_years]) + ' + C(year) + C(firm_fe)'
-event_model = smf.ols(event_formula, data=emissions).fit()
+event_model = feols(emissions, 'log_emissions', [f'high_x_{yr}' for yr in event_study_years],
+                    fe=['firm_fe', 'year'], cov_type='nonrobust')
 
 print("\n--- Event Study Coefficients (ref: 2022) ---")
 event_coefs = []
@@ -171,12 +169,15 @@ for yr in event_study_years:
     coef = event_model.params[f'high_x_{yr}']
     se = event_model.bse[f'high_x_{yr}']
     pval = event_model.pvalues[f'high_x_{yr}']
+    wcb = wild_cluster_bootstrap(emissions, 'log_emissions', [f'high_x_{y}' for y in event_study_years],
+                                 f'high_x_{yr}', fe=['firm_fe', 'year'], cluster='sector_cluster',
+                                 weights='webb')
     sig = "***" if pval < 0.01 else "**" if pval < 0.05 else "*" if pval < 0.1 else ""
-    print(f"  {yr}: {coef:+.4f} (SE: {se:.4f}) {sig}")
-    event_coefs.append({'year': yr, 'coef': coef, 'se': se, 'pval': pval})
+    print(f"  {yr}: {coef:+.4f} (SE: {se:.4f}) {sig}  [WCB p = {wcb['p_value']:.3f}]")
+    event_coefs.append({'year': yr, 'coef': coef, 'se': se, 'pval': pval, 'wcb_pval': wcb['p_value']})
 
 event_coefs_df = pd.DataFrame(event_coefs)
-event_coefs_df.loc[len(event_coefs_df)] = {'year': 2022, 'coef': 0, 'se': 0, 'pval': 1}
+event_coefs_df.loc[len(event_coefs_df)] = {'year': 2022, 'coef': 0, 'se': 0, 'pval': 1, 'wcb_pval': 1}
 event_coefs_df = event_coefs_df.sort_values('year')
 
 # =============================================================================
@@ -186,23 +187,17 @@ print("\n" + "=" * 70)
 print("5. HETEROGENEITY BY SECTOR")
 print("=" * 70)
 
-# Run DiD by sector
-sector_results = []
-for sector in emissions['GICS Sector'].dropna().unique():
-    sector_data = emissions[emissions['GICS Sector'] == sector]
-    if len(sector_data) > 20:  # Need enough obs
-        try:
-            model = smf.ols('log_emissions ~ post_chatgpt + C(ticker)', data=sector_data).fit()
-            sector_results.append({
-                'sector': sector,
-                'post_coef': model.params['post_chatgpt'],
-                'se': model.bse['post_chatgpt'],
-                'pval': model.pvalues['post_chatgpt'],
-                'n_firms': sector_data['ticker'].nunique(),
-                'ai_exposure': SECTOR_AI_EXPOSURE.get(sector, np.nan)
-            })
-        except:
-            pass
+# Run DiD by sector: all sector regressions in one pass, firm FE absorbed within sector
+sector_fit, sector_failures = feols_by(emissions, 'log_emissions', 'post_chatgpt', by='GICS Sector',
+                                       fe='ticker', cov_type='nonrobust', min_obs=21)
+sector_results = [{
+    'sector': row['GICS Sector'],
+    'post_coef': row['coef'],
+    'se': row['se'],
+    'pval': row['pval'],
+    'n_firms': emissions.loc[emissions['GICS Sector'] == row['GICS Sector'], 'ticker'].nunique(),
+    'ai_exposure': SECTOR_AI_EXPOSURE.get(row['GICS Sector'], np.nan)
+} for _, row in sector_fit.iterrows()]
 
 sector_df = pd.DataFrame(sector_results).sort_values('ai_exposure', ascending=False)
 print("\n--- Post-ChatGPT Emissions Change by Sector ---")
@@ -210,6 +205,26 @@ for _, row in sector_df.iterrows():
     sig = "***" if row['pval'] < 0.01 else "**" if row['pval'] < 0.05 else "*" if row['pval'] < 0.1 else ""
     pct_change = (np.exp(row['post_coef']) - 1) * 100
     print(f"  {row['sector']:25} (AI: {row['ai_exposure']:5.1f}): {pct_change:+6.2f}% {sig}")
+for _, row in sector_failures.iterrows():
+    print(f"  {row['GICS Sector']:25} not estimated (n={row['nobs']}): {row['reason']}")
+
+# Same engine by plant state and by firm size (terciles of pre-period mean emissions)
+pre_size = emissions[emissions['post_chatgpt'] == 0].groupby('ticker', observed=True)['total_emissions'].mean()
+emissions['size_tercile'] = emissions['ticker'].map(pd.qcut(pre_size, 3, labels=['Small', 'Medium', 'Large']))
+heterogeneity = {'GICS Sector': (sector_fit, sector_failures)}
+for by in ['primary_state', 'size_tercile']:
+    heterogeneity[by] = feols_by(emissions, 'log_emissions', 'post_chatgpt', by=by,
+                                 fe='ticker', cov_type='nonrobust', min_obs=21)
+
+state_fit, state_failures = heterogeneity['primary_state']
+print(f"\n--- By Primary State: {len(state_fit)} states estimated, {len(state_failures)} not estimated ---")
+for _, row in state_fit.sort_values('coef').iloc[[0, -1]].iterrows():
+    print(f"  {row['primary_state']:4} {(np.exp(row['coef']) - 1) * 100:+6.2f}% (p={row['pval']:.3f}, n={row['nobs']})")
+
+print("\n--- By Firm Size (pre-period emissions tercile) ---")
+size_fit, _ = heterogeneity['size_tercile']
+for _, row in size_fit.iterrows():
+    print(f"  {row['size_tercile']:8} {(np.exp(row['coef']) - 1) * 100:+6.2f}% (p={row['pval']:.3f}, n={row['nobs']})")
 
 # =============================================================================
 # 6. VISUALIZATIONS
@@ -218,57 +233,63 @@ print("\n" + "=" * 70)
 print("6. GENERATING FIGURES")
 print("=" * 70)
 
-# Figure 1: Parallel trends
-fig, axes = plt.subplots(1, 2, figsize=(14, 5))
-
-# Panel A: Mean emissions by treatment group over time
-ax1 = axes[0]
-for treat, label, color in [(1, 'High AI Exposure', 'red'), (0, 'Low AI Exposure', 'blue')]:
-    group_data = emissions[emissions['high_ai_exposure'] == treat].groupby('year')['log_emissions'].mean()
-    ax1.plot(group_data.index, group_data.values, '-o', color=color, linewidth=2, markersize=5, label=label)
-ax1.axvline(x=2022.92, color='gray', linestyle='--', alpha=0.7, label='ChatGPT Launch')
-ax1.set_xlabel('Year')
-ax1.set_ylabel('Log Emissions (Mean)')
-ax1.set_title('A. Parallel Trends: High vs Low AI Exposure')
-ax1.legend()
-ax1.grid(True, alpha=0.3)
-
-# Panel B: Event study plot
-ax2 = axes[1]
-ax2.errorbar(event_coefs_df['year'], event_coefs_df['coef'],
-             yerr=1.96*event_coefs_df['se'], fmt='o-', capsize=4, capthick=2,
-             color='darkblue', markersize=8, linewidth=2)
-ax2.axhline(y=0, color='gray', linestyle='-', alpha=0.5)
-ax2.axvline(x=2022, color='red', linestyle='--', alpha=0.7, label='ChatGPT Launch')
-ax2.set_xlabel('Year')
-ax2.set_ylabel('Coefficient (High AI Exp × Year)')
-ax2.set_title('B. Event Study: Treatment Effect by Year')
-ax2.legend()
-ax2.grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig(OUTPUT_DIR / 'fig5_parallel_trends.png', dpi=150, bbox_inches='tight')
-print("  Saved: fig5_parallel_trends.png")
-
-# Figure 2: Sector heterogeneity
-fig, ax = plt.subplots(figsize=(10, 6))
-sector_df_plot = sector_df.sort_values('post_coef')
-colors = ['green' if x < 0 else 'red' for x in sector_df_plot['post_coef']]
-pct_changes = (np.exp(sector_df_plot['post_coef']) - 1) * 100
-ax.barh(sector_df_plot['sector'], pct_changes, color=colors, alpha=0.7)
-ax.axvline(x=0, color='black', linewidth=0.8)
-ax.set_xlabel('% Change in Emissions (Post-ChatGPT)')
-ax.set_title('Emissions Change by Sector After ChatGPT (Firm FE)')
-
-# Add AI exposure annotation
-for i, (_, row) in enumerate(sector_df_plot.iterrows()):
-    ax.annotate(f'AI: {row["ai_exposure"]:.0f}', xy=(0.5, i), fontsize=9, va='center')
-
-plt.tight_layout()
-plt.savefig(OUTPUT_DIR / 'fig6_sector_heterogeneity.png', dpi=150, bbox_inches='tight')
-print("  Saved: fig6_sector_heterogeneity.png")
-
-plt.close('all')
+if not FIGURES:
+    print("  Skipped (--no-figures)")
+else:
+    with stage('figures'):
+        import matplotlib.pyplot as plt
+
+        # Figure 1: Parallel trends
+        fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+
+        # Panel A: Mean emissions by treatment group over time
+        ax1 = axes[0]
+        for treat, label, color in [(1, 'High AI Exposure', 'red'), (0, 'Low AI Exposure', 'blue')]:
+            group_data = emissions[emissions['high_ai_exposure'] == treat].groupby('year')['log_emissions'].mean()
+            ax1.plot(group_data.index, group_data.values, '-o', color=color, linewidth=2, markersize=5, label=label)
+        ax1.axvline(x=2022.92, color='gray', linestyle='--', alpha=0.7, label='ChatGPT Launch')
+        ax1.set_xlabel('Year')
+        ax1.set_ylabel('Log Emissions (Mean)')
+        ax1.set_title('A. Parallel Trends: High vs Low AI Exposure')
+        ax1.legend()
+        ax1.grid(True, alpha=0.3)
+
+        # Panel B: Event study plot
+        ax2 = axes[1]
+        ax2.errorbar(event_coefs_df['year'], event_coefs_df['coef'],
+                     yerr=1.96*event_coefs_df['se'], fmt='o-', capsize=4, capthick=2,
+                     color='darkblue', markersize=8, linewidth=2)
+        ax2.axhline(y=0, color='gray', linestyle='-', alpha=0.5)
+        ax2.axvline(x=2022, color='red', linestyle='--', alpha=0.7, label='ChatGPT Launch')
+        ax2.set_xlabel('Year')
+        ax2.set_ylabel('Coefficient (High AI Exp × Year)')
+        ax2.set_title('B. Event Study: Treatment Effect by Year')
+        ax2.legend()
+        ax2.grid(True, alpha=0.3)
+
+        plt.tight_layout()
+        plt.savefig(OUTPUT_DIR / 'fig5_parallel_trends.png', dpi=150, bbox_inches='tight')
+        print("  Saved: fig5_parallel_trends.png")
+
+        # Figure 2: Sector heterogeneity
+        fig, ax = plt.subplots(figsize=(10, 6))
+        sector_df_plot = sector_df.sort_values('post_coef')
+        colors = ['green' if x < 0 else 'red' for x in sector_df_plot['post_coef']]
+        pct_changes = (np.exp(sector_df_plot['post_coef']) - 1) * 100
+        ax.barh(sector_df_plot['sector'], pct_changes, color=colors, alpha=0.7)
+        ax.axvline(x=0, color='black', linewidth=0.8)
+        ax.set_xlabel('% Change in Emissions (Post-ChatGPT)')
+        ax.set_title('Emissions Change by Sector After ChatGPT (Firm FE)')
+
+        # Add AI exposure annotation
+        for i, (_, row) in enumerate(sector_df_plot.iterrows()):
+            ax.annotate(f'AI: {row["ai_exposure"]:.0f}', xy=(0.5, i), fontsize=9, va='center')
+
+        plt.tight_layout()
+        plt.savefig(OUTPUT_DIR / 'fig6_sector_heterogeneity.png', dpi=150, bbox_inches='tight')
+        print("  Saved: fig6_sector_heterogeneity.png")
+
+        plt.close('all')
 
 # =============================================================================
 # 7. EXPORT RESULTS
@@ -281,25 +302,39 @@ print("=" * 70)
 results_summary = pd.DataFrame({
     'Model': ['Basic DiD', 'Firm FE', 'Continuous AI'],
     'Coefficient': [
-        model1.params['high_ai_exposure:post_chatgpt'],
+        model1.params['treatment'],
         model2.params['treatment'],
         model3.params['ai_post_interaction']
     ],
     'SE': [
-        model1.bse['high_ai_exposure:post_chatgpt'],
+        model1.bse['treatment'],
         model2.bse['treatment'],
         model3.bse['ai_post_interaction']
     ],
     'P-value': [
-        model1.pvalues['high_ai_exposure:post_chatgpt'],
+        model1.pvalues['treatment'],
         model2.pvalues['treatment'],
         model3.pvalues['ai_post_interaction']
     ],
+    'WCB P-value': [
+        np.nan,
+        wcb_results['treatment']['p_value'],
+        wcb_results['ai_post_interaction']['p_value']
+    ],
     'R-squared': [model1.rsquared, model2.rsquared, model3.rsquared]
 })
 results_summary.to_csv(OUTPUT_DIR / 'did_regression_results.csv', index=False)
 print("  Saved: did_regression_results.csv")
 
+# Export group-wise heterogeneity estimates (and the groups that could not be estimated)
+pd.concat([fit.rename(columns={by: 'group'}).assign(dimension=by)
+           for by, (fit, _) in heterogeneity.items()], ignore_index=True).to_csv(
+    OUTPUT_DIR / 'did_heterogeneity_by_group.csv', index=False)
+pd.concat([failed.rename(columns={by: 'group'}).assign(dimension=by)
+           for by, (_, failed) in heterogeneity.items()], ignore_index=True).to_csv(
+    OUTPUT_DIR / 'did_heterogeneity_failures.csv', index=False)
+print("  Saved: did_heterogeneity_by_group.csv, did_heterogeneity_failures.csv")
+
 # Export event study coefficients
 event_coefs_df.to_csv(OUTPUT_DIR / 'event_study_coefficients.csv', index=False)
 print("  Saved: event_study_coefficients.csv")
@@ -321,7 +356,7 @@ print(f"""
 KEY FINDINGS:
 
 1. DIFF-IN-DIFF ESTIMATE (High AI Exposure × Post-ChatGPT):
-   - Basic DiD: {model1.params['high_ai_exposure:post_chatgpt']:+.4f} (p={model1.pvalues['high_ai_exposure:post_chatgpt']:.3f})
+   - Basic DiD: {model1.params['treatment']:+.4f} (p={model1.pvalues['treatment']:.3f})
    - With Firm FE: {model2.params['treatment']:+.4f} (p={model2.pvalues['treatment']:.3f})
 
 2. INTERPRETATION:
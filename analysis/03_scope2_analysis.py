@@ -14,8 +14,12 @@ This analysis:
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+from emissions_store import query_emissions
+
 DATA_DIR = Path(__file__).parent.parent / "data"
 OUTPUT_DIR = Path(__file__).parent / "output"
 
@@ -130,8 +134,7 @@ total_missing = bigtech_2023['scope_2'].sum() / 1e6
 print(f"\n  Total Big Tech Scope 2 (missing from GHGRP): {total_missing:.1f} M tonnes")
 
 # Compare to GHGRP totals
-ghgrp = pd.read_csv(DATA_DIR / "epa_ghgrp/processed/ghgrp_company_year_sp500_all_years.csv")
-ghgrp_2023 = ghgrp[ghgrp['year'] == 2023]['total_emissions'].sum() / 1e6
+ghgrp_2023 = query_emissions(years=[2023], columns=['total_emissions'])['total_emissions'].sum() / 1e6
 print(f"  Total GHGRP S&P 500 emissions (2023): {ghgrp_2023:.1f} M tonnes")
 print(f"  Big Tech Scope 2 as % of GHGRP total: {total_missing/ghgrp_2023*100:.1f}%")
 
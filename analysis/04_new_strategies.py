@@ -15,12 +15,17 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+import sys
 from pathlib import Path
 import statsmodels.api as sm
 from statsmodels.formula.api import ols
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+from emissions_store import query_emissions
+from data_access import load_sp500
+
 # Set paths
 BASE_DIR = Path('/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research')
 DATA_DIR = BASE_DIR / 'data'
@@ -40,7 +45,7 @@ print("=" * 70)
 print("\n[1] Loading existing datasets...")
 
 # S&P 500 constituents
-sp500 = pd.read_csv(DATA_DIR / 'sp500_constituents.csv')
+sp500 = load_sp500()
 sp500 = sp500.rename(columns={'Symbol': 'ticker', 'Security': 'company', 'GICS Sector': 'GICS_sector'})
 print(f"    S&P 500 companies: {len(sp500)}")
 
@@ -49,7 +54,7 @@ ai_exposure = pd.read_csv(OUTPUT_DIR / 'ai_exposure_by_sector.csv')
 print(f"    AI exposure by sector: {len(ai_exposure)} sectors")
 
 # GHGRP emissions panel
-ghgrp = pd.read_csv(DATA_DIR / 'epa_ghgrp' / 'processed' / 'ghgrp_company_year_sp500_all_years.csv')
+ghgrp = query_emissions()
 print(f"    GHGRP panel: {len(ghgrp)} company-year obs")
 
 # Stock data
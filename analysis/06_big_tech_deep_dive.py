@@ -18,8 +18,12 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+from emissions_store import query_emissions
+
 BASE_DIR = Path('/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research')
 OUTPUT_DIR = BASE_DIR / 'analysis' / 'output'
 
@@ -164,12 +168,8 @@ print("2. GHGRP vs. SUSTAINABILITY REPORT COMPARISON")
 print("=" * 70)
 
 # Load GHGRP data for these companies
-ghgrp_path = BASE_DIR / 'data' / 'epa_ghgrp' / 'processed' / 'ghgrp_company_year_sp500_all_years.csv'
-ghgrp = pd.read_csv(ghgrp_path)
-
-# Filter for Big Tech
 big_tech_tickers = ['MSFT', 'GOOGL', 'META', 'AMZN', 'AAPL']
-ghgrp_bigtech = ghgrp[ghgrp['ticker'].isin(big_tech_tickers)]
+ghgrp_bigtech = query_emissions(tickers=big_tech_tickers)
 
 print("\nGHGRP Reports (Scope 1 only) for Big Tech:")
 if len(ghgrp_bigtech) > 0:
@@ -11,21 +11,31 @@ This analysis:
 1. Moves reference year to 2019 (pre-GPT-3)
 2. Decomposes effects into anticipation (2020-2022) and post-shock (2023+)
 3. Tests multiple break dates for robustness
-4. Implements IV strategy using state tax incentives
+4. Estimates staggered-adoption group-time ATTs (adoption year by sector)
+5. Estimates 2SLS with state data center siting instruments
+
+Usage:
+    python analysis/10_anticipation_effects.py [--no-figures | --tables-only]
 """
 
 import os
 import sys
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import statsmodels.api as sm
 from pathlib import Path
-from scipy import stats
+from scipy import special
 
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / 'scripts'))
+
+import data_access
+from break_scan import break_scan
+from staggered_did import group_time_att
+from fixed_effects import feols
+from instrumental_variables import STATE_INSTRUMENTS, feiv, load_state_instruments
+from instrumentation import instrumented
 
 # Output directory
 output_dir = project_root / 'analysis' / 'output'
@@ -37,21 +47,13 @@ def load_emissions_panel():
     panel_path = project_root / 'data' / 'epa_ghgrp' / 'processed' / 'ghgrp_company_year_sp500_all_years.csv'
 
     if panel_path.exists():
-        df = pd.read_csv(panel_path)
+        df = data_access.load_emissions_panel()
         print(f"Loaded {len(df)} observations")
 
-        # Merge with S&P 500 to get sector info
-        sp500_path = project_root / 'data' / 'sp500_constituents.csv'
-        if sp500_path.exists():
-            sp500 = pd.read_csv(sp500_path)
-            # Rename columns if needed
-            if 'Symbol' in sp500.columns:
-                sp500 = sp500.rename(columns={'Symbol': 'ticker', 'GICS Sector': 'gics_sector'})
-            elif 'symbol' in sp500.columns:
-                sp500 = sp500.rename(columns={'symbol': 'ticker', 'sector': 'gics_sector'})
-
-            df = df.merge(sp500[['ticker', 'gics_sector']], on='ticker', how='left')
-            print(f"Merged with S&P 500 sectors")
+        # S&P 500 sectors come with the panel
+        df = df[['ticker', 'year', 'total_emissions', 'num_facilities', 'primary_state', 'GICS Sector']]
+        # Plain object column (not str) so tickers without a sector stay NaN
+        df = df.rename(columns={'GICS Sector': 'gics_sector'}).astype({'gics_sector': object})
 
         # Also add company name for firm fixed effects
         df['company'] = df['ticker']
@@ -63,28 +65,8 @@ def load_emissions_panel():
 
 
 def load_ai_exposure():
-    """Load AI exposure index by sector."""
-    ai_path = project_root / 'data' / 'ai_exposure' / 'ai_exposure_by_sector.csv'
-
-    if ai_path.exists():
-        df = pd.read_csv(ai_path)
-        return df
-    else:
-        # Create from previous analysis
-        ai_exposure = {
-            'Information Technology': 81.5,
-            'Financials': 81.2,
-            'Communication Services': 72.3,
-            'Health Care': 65.1,
-            'Consumer Discretionary': 62.6,
-            'Industrials': 55.4,
-            'Consumer Staples': 48.2,
-            'Real Estate': 45.3,
-            'Utilities': 42.0,
-            'Energy': 39.8,
-            'Materials': 37.2
-        }
-        return pd.DataFrame(list(ai_exposure.items()), columns=['gics_sector', 'ai_exposure'])
+    """Load AI exposure index by sector (shared with 02; see data_access.py)."""
+    return data_access.load_sector_exposure().reset_index()
 
 
 def run_anticipation_event_study(df, ai_exposure, reference_year=2019):
@@ -128,22 +110,8 @@ def run_anticipation_event_study(df, ai_exposure, reference_year=2019):
     # Run event study regression
     interaction_cols = [f'high_ai_x_{y}' for y in years if y != reference_year]
 
-    # Add firm and year dummies
-    firm_dummies = pd.get_dummies(df['company'], prefix='firm', drop_first=True)
-    year_dummies = pd.get_dummies(df['year'], prefix='year', drop_first=True)
-
-    X = pd.concat([df[interaction_cols], firm_dummies, year_dummies], axis=1)
-    X = X.astype(float)  # Ensure all columns are numeric
-    X = sm.add_constant(X)
-    y = df['log_emissions'].astype(float)
-
-    # Drop any rows with NaN
-    mask = ~(X.isna().any(axis=1) | y.isna())
-    X = X[mask]
-    y = y[mask]
-
-    # Run regression
-    model = sm.OLS(y, X).fit(cov_type='HC1')
+    # Absorb firm and year fixed effects (rows with missing values are dropped)
+    model = feols(df, 'log_emissions', interaction_cols, fe=['company', 'year'], cov_type='HC1')
 
     # Extract event study coefficients
     event_study_results = []
@@ -226,9 +194,13 @@ def decompose_anticipation_effects(es_df):
     }
 
 
-def test_multiple_break_dates(df, ai_exposure):
+def test_multiple_break_dates(df, ai_exposure, n_boot=999):
     """
     Test DiD with multiple candidate break dates.
+
+    Reports the four named break dates at the median AI-exposure threshold,
+    then scans every break year x exposure threshold with the FE absorbed once
+    and compares the sup-Wald / QLR statistics with bootstrap critical values.
     """
     print("\n" + "=" * 60)
     print("TESTING MULTIPLE BREAK DATES")
@@ -244,111 +216,174 @@ def test_multiple_break_dates(df, ai_exposure):
     # Merge with AI exposure
     df = df.merge(ai_exposure, on='gics_sector', how='left')
     median_ai = ai_exposure['ai_exposure'].median()
-    df['high_ai'] = (df['ai_exposure'] >= median_ai).astype(int)
     df['log_emissions'] = np.log(df['total_emissions'] + 1)
 
-    results = []
+    # Every break year x exposure threshold, including the median split
+    thresholds = np.union1d(ai_exposure['ai_exposure'].dropna().unique(), [median_ai])
+    scan, summary = break_scan(df, 'log_emissions', 'ai_exposure', time='year',
+                               fe=['company', 'year'], thresholds=thresholds, n_boot=n_boot)
+    scan['p_value'] = 2 * special.ndtr(-np.abs(scan['coef'] / scan['se']))
+    scan.to_csv(output_dir / 'break_scan_results.csv', index=False)
 
+    named = scan[scan['threshold'] == median_ai].set_index('break_year')
+    results = []
     for name, break_year in break_dates.items():
-        # Create post indicator
-        df['post'] = (df['year'] >= break_year).astype(int)
-        df['treatment'] = df['high_ai'] * df['post']
+        row = named.loc[break_year]
+        results.append({
+            'break_date': name,
+            'break_year': break_year,
+            'coefficient': row['coef'],
+            'se': row['se'],
+            'p_value': row['p_value'],
+            'significant': row['p_value'] < 0.10
+        })
+        print(f"{name}: β = {row['coef']:+.4f} (SE: {row['se']:.4f}, p = {row['p_value']:.3f})")
+
+    print(f"\nBreak-date scan: {summary['n_candidates']} specifications "
+          f"(break year x exposure threshold), {summary['n_boot']} bootstrap draws")
+    print(f"  sup-Wald = {summary['sup_wald']:.2f} at {summary['sup_wald_break_year']}, "
+          f"threshold {summary['sup_wald_threshold']:.1f} "
+          f"(5% critical value {summary['sup_wald_critical']:.2f}, p = {summary['sup_wald_pvalue']:.3f})")
+    print(f"  QLR (sup-F) = {summary['qlr']:.2f} at {summary['qlr_break_year']}, "
+          f"threshold {summary['qlr_threshold']:.1f} "
+          f"(5% critical value {summary['qlr_critical']:.2f}, p = {summary['qlr_pvalue']:.3f})")
+    print(f"  Saved: {output_dir / 'break_scan_results.csv'}")
 
-        # Run DiD with firm and year FE
-        firm_dummies = pd.get_dummies(df['company'], prefix='firm', drop_first=True)
-        year_dummies = pd.get_dummies(df['year'], prefix='year', drop_first=True)
+    return pd.DataFrame(results)
 
-        X = pd.concat([df[['treatment']], firm_dummies, year_dummies], axis=1)
-        X = X.astype(float)
-        X = sm.add_constant(X)
-        y = df['log_emissions'].astype(float)
 
-        # Drop NaN
-        mask = ~(X.isna().any(axis=1) | y.isna())
-        X_clean = X[mask]
-        y_clean = y[mask]
+# First treated year by sector. These are assumptions of this analysis, not
+# estimates: the treated sectors are those at or above the median sector AI
+# exposure (50.3, the high_ai split used throughout this script), and each is
+# assigned to one of the break dates of test_multiple_break_dates:
+#   2020 (GPT-3)             - IT and Communication Services, which build and
+#                              host the models (cloud, chips, platforms)
+#   2021 (investment surge)  - Financials, the most exposed non-builder sector
+#                              (81.2) and the earliest large-scale adopter
+#   2023 (post-ChatGPT)      - Health Care, Consumer Discretionary, Industrials
+# Sectors below the median are never treated. Pass another mapping to
+# run_staggered_did to test alternative timings.
+ADOPTION_COHORTS = {
+    'Information Technology': 2020,
+    'Communication Services': 2020,
+    'Financials': 2021,
+    'Health Care': 2023,
+    'Consumer Discretionary': 2023,
+    'Industrials': 2023,
+}
+
+
+def run_staggered_did(df, control_group='never', n_boot=999, cohorts=None):
+    """
+    Callaway-Sant'Anna group-time ATTs with sector-specific adoption years.
+
+    Instead of one common break year, each sector is treated from its own
+    adoption year (`cohorts`, sector -> first treated year; default
+    ADOPTION_COHORTS, sectors not listed are never treated); every cohort is
+    compared with never-treated (or not-yet-treated) firms in 2x2 long
+    differences, and the cells are aggregated by event time with
+    multiplier-bootstrap bands.
+    """
+    print("\n" + "=" * 60)
+    print("STAGGERED ADOPTION: GROUP-TIME ATTs")
+    print("=" * 60)
 
-        model = sm.OLS(y_clean, X_clean).fit(cov_type='HC1')
+    df['log_emissions'] = np.log(df['total_emissions'].astype(float) + 1)
+    df['cohort'] = df['gics_sector'].map(cohorts or ADOPTION_COHORTS).fillna(0)
 
-        coef = model.params['treatment']
-        se = model.bse['treatment']
-        pval = model.pvalues['treatment']
+    res = group_time_att(df, 'log_emissions', unit='company', time='year', cohort='cohort',
+                         control_group=control_group, n_boot=n_boot)
+    sizes = ', '.join(f"{g}: {n}" for g, n in res['cohort_sizes'].items())
+    print(f"Cohorts (firms): {sizes}; never treated: {res['n_never_treated']}")
+    print(f"Control group: {control_group}; {len(res['group_time'])} group-time cells")
 
-        results.append({
-            'break_date': name,
-            'break_year': break_year,
-            'coefficient': coef,
-            'se': se,
-            'p_value': pval,
-            'significant': pval < 0.10
-        })
+    print("\nEvent-time ATTs (multiplier bootstrap SEs, "
+          f"uniform band critical value {res['critical_value_event_time']:.2f}):")
+    for _, row in res['event_time'].iterrows():
+        sig = '*' if row['band_lower'] > 0 or row['band_upper'] < 0 else ''
+        print(f"  e = {int(row['event_time']):+3d}: {row['att']:+.4f} (SE: {row['se']:.4f}) "
+              f"[{row['band_lower']:+.4f}, {row['band_upper']:+.4f}] {sig}")
 
-        print(f"{name}: β = {coef:+.4f} (SE: {se:.4f}, p = {pval:.3f})")
+    overall = res['overall']
+    print(f"\nOverall ATT (post-adoption cells, cohort-weighted): {overall['att']:+.4f} "
+          f"(SE: {overall['se']:.4f}, p = {overall['p_value']:.3f})")
 
-    return pd.DataFrame(results)
+    res['group_time'].to_csv(output_dir / 'staggered_did_group_time.csv', index=False)
+    res['event_time'].to_csv(output_dir / 'staggered_did_event_time.csv', index=False)
+    print(f"  Saved: {output_dir / 'staggered_did_event_time.csv'}")
+    return res
 
 
 def run_iv_analysis(df, ai_exposure):
     """
-    IV analysis using state tax incentives as instrument for data center capacity.
-
-    First stage: DC_capacity = π * TaxIncentive + controls + ε
-    Second stage: Emissions = β * DC_capacity_hat + controls + ε
+    2SLS on the firm-year panel: state data center capacity -> firm emissions.
+
+    Endogenous: log(1 + major AI data center capacity operational in the
+    firm's primary state by that year). Instruments: pre-determined state
+    siting characteristics (tax incentive score, IXP count, 2019 electricity
+    rate, pre-2020 capacity) x post-GPT-3 (2020+). Firm and year FE are
+    absorbed; SEs, the Kleibergen-Paap F, Anderson-Rubin CI and score
+    bootstrap are clustered by state.
     """
     print("\n" + "=" * 60)
-    print("IV ANALYSIS: TAX INCENTIVES → DATA CENTER CAPACITY → EMISSIONS")
+    print("IV ANALYSIS: STATE DC SITING -> DATA CENTER CAPACITY -> EMISSIONS")
     print("=" * 60)
 
-    # Load tax incentives
+    dc_path = project_root / 'data' / 'data_centers' / 'major_ai_data_centers.csv'
     incentives_path = project_root / 'data' / 'data_centers' / 'state_dc_tax_incentives.csv'
-    if not incentives_path.exists():
-        print("Tax incentives data not found. Run download_ai_datasets.py first.")
+    if not (dc_path.exists() and incentives_path.exists()):
+        print("Data center / tax incentive data not found. Run download_ai_datasets.py first.")
         return None
 
-    incentives = pd.read_csv(incentives_path)
-
-    # Load data center data
-    dc_path = project_root / 'data' / 'data_centers' / 'major_ai_data_centers.csv'
-    if dc_path.exists():
-        dc_data = pd.read_csv(dc_path)
-
-        # Aggregate by state
-        dc_by_state = dc_data.groupby('state').agg({
-            'power_mw': 'sum',
-            'name': 'count'
-        }).reset_index()
-        dc_by_state.columns = ['state', 'total_power_mw', 'n_facilities']
-
-        # Merge with incentives
-        iv_data = incentives.merge(dc_by_state, on='state', how='left')
-        iv_data = iv_data.fillna(0)
-
-        print("\nInstrument Relevance Check:")
-        print("-" * 40)
-
-        # First stage: Regress DC capacity on tax incentives
-        X = sm.add_constant(iv_data['incentive_score'])
-        y = iv_data['total_power_mw']
-
-        first_stage = sm.OLS(y, X).fit()
-        print(f"First Stage: DC Power ~ Tax Incentive")
-        print(f"  Coefficient: {first_stage.params['incentive_score']:.2f}")
-        print(f"  t-stat: {first_stage.tvalues['incentive_score']:.2f}")
-        print(f"  R-squared: {first_stage.rsquared:.3f}")
-        print(f"  F-stat: {first_stage.fvalue:.2f}")
-
-        if first_stage.fvalue > 10:
-            print("  ✓ Instrument passes weak instrument test (F > 10)")
-        else:
-            print("  ✗ Weak instrument warning (F < 10)")
+    states = load_state_instruments()
+    dc_data = pd.read_csv(dc_path)
+    years = np.sort(df['year'].unique())
+    # Capacity operational by each year, per state
+    capacity = pd.DataFrame([(state, year, group.loc[group['year_operational'] <= year, 'power_mw'].sum())
+                             for state, group in dc_data.groupby('state') for year in years],
+                            columns=['primary_state', 'year', 'dc_capacity_mw'])
+
+    df = df.merge(states.rename(columns={'state': 'primary_state'}), on='primary_state', how='left')
+    df = df.merge(capacity, on=['primary_state', 'year'], how='left')
+    df['dc_capacity_mw'] = df['dc_capacity_mw'].fillna(0)
+    df['log_dc_capacity'] = np.log1p(df['dc_capacity_mw'])
+    df['log_emissions'] = np.log(df['total_emissions'].astype(float) + 1)
+    df['post_gpt3'] = (df['year'] >= 2020).astype(int)
+    instruments = []
+    for col in STATE_INSTRUMENTS:
+        df[f'{col}_x_post'] = df[col] * df['post_gpt3']
+        instruments.append(f'{col}_x_post')
+
+    model = feiv(df, 'log_emissions', 'log_dc_capacity', instruments,
+                 fe=['company', 'year'], cluster='primary_state')
+    print(f"\nFirm-years: {model.nobs}, firms: {model.n_fe['company']}, state clusters: {model.n_clusters}")
+    print("\nFirst Stage: log DC capacity ~ state characteristics x post-2020 (firm + year FE)")
+    print("-" * 40)
+    for _, row in model.first_stage.iterrows():
+        print(f"  {row['instrument']:32} {row['coef']:+.4f} ({row['se']:.4f})")
+    print(f"  Kleibergen-Paap rk Wald F: {model.kp_f:.2f}")
+    print(f"  Cragg-Donald F: {model.cragg_donald_f:.2f}")
+    if model.kp_f > 10:
+        print("  ✓ Instrument passes weak instrument test (KP F > 10)")
+    else:
+        print("  ✗ Weak instrument warning (KP F < 10): rely on the Anderson-Rubin CI")
 
-        return iv_data, first_stage
+    ar_ci = model.ar_conf_int()
+    boot = model.bootstrap('log_dc_capacity', weights='webb')
+    coef, se = model.params['log_dc_capacity'], model.bse['log_dc_capacity']
+    print("\nSecond Stage: log emissions ~ log DC capacity (instrumented)")
+    print(f"  2SLS coefficient: {coef:+.4f} (SE: {se:.4f}, p = {model.pvalues['log_dc_capacity']:.4f})")
+    print("  Anderson-Rubin 95% CI: " + (" U ".join(f"[{lo:+.4f}, {hi:+.4f}]" for lo, hi in ar_ci)
+                                         if ar_ci else "empty (all values rejected)"))
+    print(f"  Score bootstrap (Webb): p = {boot['p_value']:.4f}")
 
-    return None
+    return {'model': model, 'ar_ci': ar_ci, 'bootstrap': boot}
 
 
+@instrumented('figures')
 def create_anticipation_figure(es_df, decomposition):
     """Create visualization of anticipation effects."""
+    import matplotlib.pyplot as plt
 
     fig, axes = plt.subplots(2, 2, figsize=(14, 10))
 
@@ -469,8 +504,9 @@ def create_anticipation_figure(es_df, decomposition):
     plt.close()
 
 
-def main():
-    """Run anticipation effects analysis."""
+def main(args=()):
+    """Run anticipation effects analysis (figures skipped with --no-figures / --tables-only)."""
+    figures = not ('--no-figures' in args or '--tables-only' in args)
     print("ANTICIPATION EFFECTS ANALYSIS")
     print("=" * 60)
     print("""
@@ -503,11 +539,24 @@ def main():
     # 3. Test multiple break dates
     break_date_results = test_multiple_break_dates(df.copy(), ai_exposure)
 
-    # 4. IV analysis
+    # 4. Staggered adoption
+    staggered_results = run_staggered_did(df.copy())
+
+    # 5. IV analysis
     iv_results = run_iv_analysis(df.copy(), ai_exposure)
 
-    # 5. Create figure
-    create_anticipation_figure(es_df, decomposition)
+    # 6. Create figure
+    if figures:
+        create_anticipation_figure(es_df, decomposition)
+    else:
+        print("\nFigure skipped (--no-figures)")
+
+    if iv_results is not None:
+        iv = iv_results['model']
+        iv_summary = (f"2SLS {iv.params['log_dc_capacity']:+.4f} (SE: {iv.bse['log_dc_capacity']:.4f}), "
+                      f"Kleibergen-Paap F {iv.kp_f:.2f}")
+    else:
+        iv_summary = "not estimated (data center data missing)"
 
     # Summary
     print("\n" + "=" * 60)
@@ -532,12 +581,13 @@ Key Findings:
    attenuates the measured effect because anticipation had already
    shifted treated firms' emissions upward.
 
-4. IV Strategy:
-   State tax incentives for data centers (enacted 2003-2018) provide
-   plausibly exogenous variation in data center capacity that predates
-   the AI boom. First-stage F-statistic should exceed 10.
+4. Staggered Adoption (sector-specific adoption years):
+   - Overall ATT: {staggered_results['overall']['att']:+.4f} (SE: {staggered_results['overall']['se']:.4f})
+
+5. IV Strategy (state siting characteristics x post-2020):
+   {iv_summary}
     """)
 
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1:])
@@ -15,9 +15,10 @@ import statsmodels.formula.api as smf
 from scipy import stats
 import os
 
+from data_access import load_scope2_panel
+
 # Set paths
 BASE_DIR = "/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research"
-DATA_PATH = os.path.join(BASE_DIR, "data/scope2_manual/top50_scope2_template.csv")
 OUTPUT_DIR = os.path.join(BASE_DIR, "analysis/output")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -26,7 +27,8 @@ print("=" * 60)
 print("DIFFERENCE-IN-DIFFERENCES ANALYSIS: SCOPE 2 EMISSIONS")
 print("=" * 60)
 
-df = pd.read_csv(DATA_PATH)
+# Plain strings: formulas expand every category level, including ones the subsamples drop
+df = load_scope2_panel('top50').astype({'ticker': 'str', 'sector': 'str'})
 print(f"\nLoaded {len(df)} observations for {df['ticker'].nunique()} companies")
 
 # Define treatment and control groups
@@ -10,13 +10,16 @@ import matplotlib.pyplot as plt
 import statsmodels.formula.api as smf
 import os
 
+from data_access import load_scope2_panel
+from wild_bootstrap import wild_cluster_bootstrap
+
 # Set paths
 BASE_DIR = "/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research"
-DATA_PATH = os.path.join(BASE_DIR, "data/scope2_manual/top50_scope2_template.csv")
 OUTPUT_DIR = os.path.join(BASE_DIR, "analysis/output")
 
 # Load data
-df = pd.read_csv(DATA_PATH)
+# Plain strings: formulas expand every category level, including ones the subsamples drop
+df = load_scope2_panel('top50').astype({'ticker': 'str', 'sector': 'str'})
 
 print("=" * 70)
 print("REFINED DiD ANALYSIS: AI INFRASTRUCTURE vs. CONTROL")
@@ -188,6 +191,12 @@ print(f"\nDiD Coefficient: {did_model.params['did']:.4f}")
 print(f"Standard Error:  {did_model.bse['did']:.4f}")
 print(f"t-statistic:     {did_model.tvalues['did']:.4f}")
 print(f"P-value:         {did_model.pvalues['did']:.4f}")
+
+# Only 5 firms: wild cluster bootstrap by firm (Webb weights; Rademacher has 32 draws)
+wcb = wild_cluster_bootstrap(df_did_tech, 'ln_scope2', ['post_gpt', 'did'], 'did',
+                             fe='ticker', cluster='ticker', weights='webb')
+print(f"WCB p-value:     {wcb['p_value']:.4f} ({wcb['n_clusters']} firm clusters, "
+      f"{wcb['n_boot']:,} Webb draws)")
 print(f"\nInterpretation: Cloud builders grew {(np.exp(did_model.params['did'])-1)*100:.1f}% more")
 print(f"                than Apple post-ChatGPT (relative to pre-trend)")
 
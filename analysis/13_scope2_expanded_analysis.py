@@ -13,12 +13,13 @@ from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
+from data_access import load_scope2_panel
+
 # Set style
 plt.style.use('seaborn-v0_8-whitegrid')
 
 # Load expanded dataset
-data_path = '/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research/data/scope2_manual/sp500_scope2_expanded.csv'
-df = pd.read_csv(data_path)
+df = load_scope2_panel('expanded')
 
 print("=" * 70)
 print("EXPANDED SCOPE 2 PANEL: DATA SUMMARY")
@@ -36,10 +37,10 @@ print(df.groupby('year').size().to_string())
 
 # Sector distribution
 print("\nObservations by sector:")
-print(df.groupby('sector').size().sort_values(ascending=False).to_string())
+print(df.groupby('sector', observed=True).size().sort_values(ascending=False).to_string())
 
 # Companies with multi-year data
-multi_year = df.groupby('ticker').size()
+multi_year = df.groupby('ticker', observed=True).size()
 print(f"\nCompanies with multi-year data: {(multi_year > 1).sum()}")
 print(f"Companies with 5+ years: {(multi_year >= 5).sum()}")
 
@@ -54,7 +55,7 @@ print("=" * 70)
 df['scope2_share'] = df['scope2_location_mt'] / df['total_mt'] * 100
 
 # Sector summary for 2023
-sector_2023 = df[df['year'] == 2023].groupby('sector').agg({
+sector_2023 = df[df['year'] == 2023].groupby('sector', observed=True).agg({
     'scope1_mt': ['sum', 'mean'],
     'scope2_location_mt': ['sum', 'mean'],
     'total_mt': ['sum', 'mean'],
@@ -85,7 +86,8 @@ pivot = df_bigtech.pivot_table(
     index='ticker',
     columns='year',
     values='scope2_location_mt',
-    aggfunc='first'
+    aggfunc='first',
+    observed=True
 )
 print("\nBig Tech Scope 2 Emissions (MT CO2e):")
 print(pivot.to_string())
@@ -107,7 +109,7 @@ print("=" * 70)
 
 # Create balanced panel for companies with data 2019-2023
 years_needed = [2019, 2020, 2021, 2022, 2023]
-complete_panel = df[df['year'].isin(years_needed)].groupby('ticker').filter(
+complete_panel = df[df['year'].isin(years_needed)].groupby('ticker', observed=True).filter(
     lambda x: set(years_needed).issubset(set(x['year']))
 )
 
@@ -148,7 +150,7 @@ print("ANALYSIS 4: EVENT STUDY (Reference Year: 2022)")
 print("=" * 70)
 
 # For companies with multi-year data
-multi_year_df = df[df.groupby('ticker')['ticker'].transform('count') >= 3]
+multi_year_df = df[df.groupby('ticker', observed=True)['ticker'].transform('count') >= 3]
 multi_year_df = multi_year_df[multi_year_df['year'] >= 2019].copy()
 
 if len(multi_year_df) > 20:
@@ -178,7 +180,7 @@ print("=" * 70)
 df_2023 = df[df['year'] == 2023].copy()
 df_2023['s2_share'] = df_2023['scope2_location_mt'] / df_2023['total_mt'] * 100
 
-sector_comparison = df_2023.groupby('sector').agg({
+sector_comparison = df_2023.groupby('sector', observed=True).agg({
     's2_share': ['mean', 'median', 'std'],
     'ticker': 'count'
 }).round(1)
@@ -230,7 +232,8 @@ if len(complete_panel) > 0:
         index='ticker',
         columns='year',
         values='scope2_location_mt',
-        aggfunc='first'
+        aggfunc='first',
+        observed=True
     )
     if 2019 in growth_data.columns and 2023 in growth_data.columns:
         growth_data['growth'] = ((growth_data[2023] - growth_data[2019]) / growth_data[2019] * 100)
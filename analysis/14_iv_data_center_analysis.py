@@ -10,6 +10,7 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import statsmodels.formula.api as smf
 from scipy import stats
+from instrumental_variables import STATE_INSTRUMENTS, feiv, load_state_instruments
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -27,62 +28,9 @@ print("\n" + "=" * 70)
 print("PART 1: CONSTRUCTING DATA CENTER SUITABILITY INDEX")
 print("=" * 70)
 
-# Load tax incentive data
-tax_incentives = pd.read_csv('/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research/data/data_centers/state_dc_tax_incentives.csv')
-
-# Load major data centers
-data_centers = pd.read_csv('/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research/data/data_centers/major_ai_data_centers.csv')
-
-# Create state-level data center capacity (pre-2020 baseline)
-dc_by_state = data_centers[data_centers['year_operational'] <= 2019].groupby('state').agg({
-    'power_mw': 'sum',
-    'company': 'count'
-}).rename(columns={'power_mw': 'pre2020_capacity_mw', 'company': 'pre2020_facilities'})
-
-# Expand to all 50 states + DC
-all_states = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
-              'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
-              'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
-              'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
-              'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY', 'DC']
-
-# Create comprehensive state-level dataset
-state_data = pd.DataFrame({'state': all_states})
-
-# Merge tax incentives
-state_data = state_data.merge(tax_incentives, on='state', how='left')
-state_data['sales_tax_exemption'] = state_data['sales_tax_exemption'].fillna(False)
-state_data['incentive_score'] = state_data['incentive_score'].fillna(1)
-
-# Merge pre-2020 data center capacity
-state_data = state_data.merge(dc_by_state, on='state', how='left')
-state_data['pre2020_capacity_mw'] = state_data['pre2020_capacity_mw'].fillna(0)
-state_data['pre2020_facilities'] = state_data['pre2020_facilities'].fillna(0)
-
-# Add Internet Exchange Point proximity data (major IXPs by state)
-# Based on PeeringDB and public IXP lists
-ixp_states = {
-    'VA': 5, 'CA': 4, 'NY': 4, 'TX': 3, 'IL': 3, 'WA': 2, 'GA': 2,
-    'FL': 2, 'NJ': 2, 'OR': 2, 'AZ': 1, 'CO': 1, 'MA': 1, 'PA': 1,
-    'NC': 1, 'OH': 1, 'NV': 1, 'UT': 1
-}
-state_data['ixp_count'] = state_data['state'].map(ixp_states).fillna(0)
-
-# Add commercial electricity rates (2019 baseline, cents/kWh)
-# Source: EIA State Electricity Profiles
-elec_rates_2019 = {
-    'WA': 7.8, 'OR': 8.1, 'ID': 7.5, 'MT': 9.2, 'WY': 8.5,
-    'NV': 8.4, 'UT': 8.3, 'AZ': 9.5, 'NM': 9.8, 'CO': 9.4,
-    'ND': 8.9, 'SD': 9.1, 'NE': 8.8, 'KS': 10.2, 'OK': 8.1,
-    'TX': 8.3, 'MN': 9.8, 'IA': 9.5, 'MO': 9.2, 'AR': 8.7,
-    'LA': 8.4, 'WI': 10.1, 'IL': 8.9, 'MI': 11.2, 'IN': 9.8,
-    'OH': 9.4, 'KY': 9.1, 'TN': 10.0, 'MS': 9.8, 'AL': 10.5,
-    'GA': 9.8, 'FL': 9.9, 'SC': 9.4, 'NC': 8.8, 'VA': 8.2,
-    'WV': 8.9, 'MD': 10.8, 'DE': 10.2, 'PA': 9.1, 'NJ': 12.1,
-    'NY': 14.8, 'CT': 16.2, 'RI': 15.8, 'MA': 15.4, 'VT': 14.1,
-    'NH': 14.8, 'ME': 12.5, 'CA': 15.2, 'AK': 18.5, 'HI': 27.5, 'DC': 11.5
-}
-state_data['elec_rate_2019'] = state_data['state'].map(elec_rates_2019).fillna(10.0)
+# Tax incentives, pre-2020 data center capacity, IXP proximity and 2019
+# electricity rates for all 50 states + DC
+state_data = load_state_instruments()
 
 # Create composite Data Center Suitability Index (Bartik-style "share")
 # Higher score = more suitable for data centers
@@ -225,9 +173,7 @@ print(f"  SE: {first_stage.bse.get('dc_suitability', 0):.4f}")
 print(f"  P-value: {first_stage.pvalues.get('dc_suitability', 1):.4f}")
 print(f"  R-squared: {first_stage.rsquared:.4f}")
 
-# Calculate F-statistic for instrument strength
-f_stat = (first_stage.params.get('dc_suitability', 0) / first_stage.bse.get('dc_suitability', 1))**2
-print(f"  F-statistic (instrument strength): {f_stat:.1f}")
+print("  (Instrument strength: Kleibergen-Paap F of the 2SLS first stage, Part 6)")
 
 # Alternative first stage: Tax incentive as instrument
 first_stage_tax = smf.ols(
@@ -312,10 +258,42 @@ print(f"  P-value: {did_scope2.pvalues.get('did_term', 1):.4f}")
 print(f"  Implied % effect: {(np.exp(did_scope2.params.get('did_term', 0)) - 1) * 100:.1f}%")
 
 # ============================================================
-# PART 6: EVENT STUDY WITH SUITABILITY
+# PART 6: 2SLS WITH STATE AND YEAR FIXED EFFECTS
+# ============================================================
+print("\n" + "=" * 70)
+print("PART 6: 2SLS WITH STATE + YEAR FE (SHIFT-SHARE INSTRUMENTS)")
+print("=" * 70)
+
+# Each pre-determined siting characteristic times the national AI demand shift;
+# the state FE absorb the levels, the year FE the common shift
+iv_instruments = []
+for col in STATE_INSTRUMENTS:
+    panel[f'{col}_x_shift'] = panel[col] * panel['ai_demand_shift']
+    iv_instruments.append(f'{col}_x_shift')
+
+iv_models = {}
+for outcome, label in [('ln_scope2', 'Log Scope 2 Emissions'), ('ln_elec', 'Log Commercial Electricity')]:
+    model = feiv(panel, outcome, 'ln_dc_demand', iv_instruments, fe=['state', 'year'], cluster='state')
+    ar_ci = model.ar_conf_int()
+    boot = model.bootstrap('ln_dc_demand', weights='webb')
+    iv_models[outcome] = (model, ar_ci, boot)
+    print(f"\n{label} ~ Log DC Demand (instrumented), {model.nobs} obs, {model.n_clusters} clusters:")
+    print(f"  2SLS coefficient: {model.params['ln_dc_demand']:.4f} (SE: {model.bse['ln_dc_demand']:.4f}, "
+          f"p = {model.pvalues['ln_dc_demand']:.4f})")
+    print(f"  Kleibergen-Paap rk Wald F: {model.kp_f:.1f}   Cragg-Donald F: {model.cragg_donald_f:.1f}")
+    print("  Anderson-Rubin 95% CI: " + " U ".join(f"[{lo:.4f}, {hi:.4f}]" for lo, hi in ar_ci)
+          if ar_ci else "  Anderson-Rubin 95% CI: empty (all values rejected)")
+    print(f"  Score bootstrap (Webb, {boot['n_boot']} draws): p = {boot['p_value']:.4f}")
+
+iv_scope2 = iv_models['ln_scope2'][0]
+print("\nFirst stage (Log DC Demand on instruments, state + year FE):")
+print(iv_scope2.first_stage[['instrument', 'coef', 'se', 'pval']].to_string(index=False))
+
+# ============================================================
+# PART 7: EVENT STUDY WITH SUITABILITY
 # ============================================================
 print("\n" + "=" * 70)
-print("PART 6: EVENT STUDY")
+print("PART 7: EVENT STUDY")
 print("=" * 70)
 
 # Create year dummies interacted with suitability
@@ -342,7 +320,7 @@ print(f"  2022: {event_study.params.get('suit_2022', 0):.4f} (SE: {event_study.b
 print(f"  2023: {event_study.params.get('suit_2023', 0):.4f} (SE: {event_study.bse.get('suit_2023', 0):.4f})")
 
 # ============================================================
-# PART 7: VISUALIZATION
+# PART 8: VISUALIZATION
 # ============================================================
 print("\n" + "=" * 70)
 print("CREATING VISUALIZATIONS")
@@ -416,7 +394,7 @@ plt.savefig(output_path, dpi=300, bbox_inches='tight')
 print(f"Figure saved: {output_path}")
 
 # ============================================================
-# PART 8: SUMMARY TABLE FOR PAPER
+# PART 9: SUMMARY TABLE FOR PAPER
 # ============================================================
 print("\n" + "=" * 70)
 print("SUMMARY: IV ANALYSIS RESULTS")
@@ -433,7 +411,7 @@ Instrument: Pre-2020 Data Center Suitability Index
 First Stage: Suitability → Electricity Demand Growth (2019-2023)
   - Coefficient: {first_stage.params.get('dc_suitability', 0):.3f}
   - SE: {first_stage.bse.get('dc_suitability', 0):.3f}
-  - F-statistic: {f_stat:.1f}
+  - Kleibergen-Paap F (2SLS first stage): {iv_scope2.kp_f:.1f}
   - Interpretation: 1-unit suitability → {first_stage.params.get('dc_suitability', 0):.2f}% more elec growth
 
 Reduced Form: Suitability → Scope 2 Emissions Growth
@@ -445,6 +423,10 @@ Diff-in-Diff: High Suitability × Post-ChatGPT
   - Electricity: {did_model.params.get('did_term', 0):.4f} ({(np.exp(did_model.params.get('did_term', 0)) - 1) * 100:.1f}%)
   - Scope 2: {did_scope2.params.get('did_term', 0):.4f} ({(np.exp(did_scope2.params.get('did_term', 0)) - 1) * 100:.1f}%)
 
+2SLS: Log Scope 2 ~ Log DC Demand (state + year FE, shift-share instruments)
+  - Coefficient: {iv_scope2.params['ln_dc_demand']:.4f} (SE: {iv_scope2.bse['ln_dc_demand']:.4f})
+  - Kleibergen-Paap F: {iv_scope2.kp_f:.1f}, Cragg-Donald F: {iv_scope2.cragg_donald_f:.1f}
+
 Event Study (High Suitability × Year):
   - 2020: {event_study.params.get('suit_2020', 0):.4f}
   - 2021: {event_study.params.get('suit_2021', 0):.4f}
@@ -460,25 +442,35 @@ buildout drove emissions growth invisible in Scope 1 (GHGRP) data.
 
 # Save results to CSV
 results_df = pd.DataFrame({
-    'Specification': ['First Stage', 'Reduced Form', 'DiD Electricity', 'DiD Scope 2'],
+    'Specification': ['First Stage', 'Reduced Form', 'DiD Electricity', 'DiD Scope 2',
+                      '2SLS Scope 2', '2SLS Electricity'],
     'Coefficient': [
         first_stage.params.get('dc_suitability', 0),
         reduced_form.params.get('dc_suitability', 0),
         did_model.params.get('did_term', 0),
-        did_scope2.params.get('did_term', 0)
+        did_scope2.params.get('did_term', 0),
+        iv_models['ln_scope2'][0].params['ln_dc_demand'],
+        iv_models['ln_elec'][0].params['ln_dc_demand']
     ],
     'SE': [
         first_stage.bse.get('dc_suitability', 0),
         reduced_form.bse.get('dc_suitability', 0),
         did_model.bse.get('did_term', 0),
-        did_scope2.bse.get('did_term', 0)
+        did_scope2.bse.get('did_term', 0),
+        iv_models['ln_scope2'][0].bse['ln_dc_demand'],
+        iv_models['ln_elec'][0].bse['ln_dc_demand']
     ],
     'P_value': [
         first_stage.pvalues.get('dc_suitability', 1),
         reduced_form.pvalues.get('dc_suitability', 1),
         did_model.pvalues.get('did_term', 1),
-        did_scope2.pvalues.get('did_term', 1)
-    ]
+        did_scope2.pvalues.get('did_term', 1),
+        iv_models['ln_scope2'][0].pvalues['ln_dc_demand'],
+        iv_models['ln_elec'][0].pvalues['ln_dc_demand']
+    ],
+    'KP_F': [np.nan] * 4 + [iv_models['ln_scope2'][0].kp_f, iv_models['ln_elec'][0].kp_f],
+    'AR_CI': [''] * 4 + [' U '.join(f"[{lo:.4f}, {hi:.4f}]" for lo, hi in iv_models[o][1])
+                         for o in ('ln_scope2', 'ln_elec')]
 })
 results_df.to_csv('/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research/analysis/output/iv_results_summary.csv', index=False)
 
@@ -0,0 +1,175 @@
+"""
+Structural-break scan for two-way FE difference-in-differences.
+
+For every candidate break year b and treatment-intensity threshold q the
+treatment is D = 1[intensity >= q] * 1[year >= b] in
+
+    y_it = beta * D_it(b, q) + firm FE + year FE + e_it
+
+The FE are absorbed once: y and all candidate D columns are demeaned together
+(fixed_effects.demean), after which each specification is a one-regressor
+problem (Frisch-Waugh), so coefficients, robust Wald statistics and F
+statistics for all candidates come from a few matrix products. The sup over
+candidates is compared with a bootstrap critical value from a wild (cluster)
+bootstrap that imposes the null of no break (y* = FE fit + v_g * residual).
+
+    from break_scan import break_scan
+    scan, summary = break_scan(df, 'log_emissions', 'ai_exposure',
+                               fe=['company', 'year'], cluster='company')
+"""
+
+import numpy as np
+import pandas as pd
+
+from fixed_effects import absorbed_dof, demean, factorize_fe
+
+
+def candidate_designs(df, intensity, time, break_years, thresholds):
+    """Stack one treatment column per (break year, threshold) pair.
+
+    Missing intensity counts as untreated. Returns (specs DataFrame, D array).
+    """
+    level = df[intensity].to_numpy(dtype=float)
+    level = np.where(np.isnan(level), -np.inf, level)
+    t = df[time].to_numpy()
+    treated = level[:, None] >= np.asarray(thresholds, dtype=float)[None, :]
+    post = t[:, None] >= np.asarray(break_years)[None, :]
+    # (n, years, thresholds) -> (n, years * thresholds), break year major
+    D = (post[:, :, None] & treated[:, None, :]).reshape(len(df), -1).astype(float)
+    specs = pd.DataFrame([(b, q) for b in break_years for q in thresholds],
+                         columns=['break_year', 'threshold'])
+    return specs, D
+
+
+def _scale(n, k, n_clusters):
+    if n_clusters is None:
+        return n / (n - k)
+    return n_clusters / (n_clusters - 1) * (n - 1) / (n - k)
+
+
+def fwl_stats(y_dm, D_dm, dd, groups, n_clusters, k, df_resid):
+    """Coefficients, robust variances and F statistics for every column of D_dm.
+
+    y_dm may hold several outcome columns (bootstrap draws); results are (S, B).
+    """
+    Y = y_dm if y_dm.ndim == 2 else y_dm[:, None]
+    n = len(Y)
+    beta = (D_dm.T @ Y) / dd[:, None]
+
+    # Robust variance via sum_g (A_g - beta * C_g)^2 with A_g = sum d*y, C_g = sum d^2
+    if groups is None:
+        a2 = (D_dm ** 2).T @ (Y ** 2)
+        ac = (D_dm ** 3).T @ Y
+        c2 = (D_dm ** 4).sum(axis=0)[:, None]
+    else:
+        a2 = np.zeros_like(beta)
+        ac = np.zeros_like(beta)
+        c2 = np.zeros((D_dm.shape[1], 1))
+        order = np.argsort(groups, kind='stable')
+        bounds = np.r_[0, np.cumsum(np.bincount(groups, minlength=n_clusters))]
+        for g in range(n_clusters):
+            rows = order[bounds[g]:bounds[g + 1]]
+            Dg = D_dm[rows]
+            A = Dg.T @ Y[rows]
+            C = (Dg ** 2).sum(axis=0)[:, None]
+            a2 += A ** 2
+            ac += A * C
+            c2 += C ** 2
+    meat = a2 - 2 * beta * ac + beta ** 2 * c2
+    var = _scale(n, k, n_clusters) * meat / dd[:, None] ** 2
+    wald = beta ** 2 / var
+
+    ssr0 = (Y ** 2).sum(axis=0)[None, :]
+    ssr1 = ssr0 - beta ** 2 * dd[:, None]
+    f_stat = (ssr0 - ssr1) / (ssr1 / df_resid)
+    return beta, var, wald, f_stat
+
+
+def break_scan(df, y, intensity, time='year', fe=('company', 'year'), break_years=None,
+               thresholds=None, cluster=None, n_boot=999, alpha=0.05, trim=0.05, seed=42):
+    """Scan all (break year, threshold) DiD specifications with absorbed FE.
+
+    Args:
+        df: panel DataFrame
+        y: outcome column
+        intensity: treatment-intensity column (e.g. sector AI exposure)
+        time: time column defining the post period
+        fe: fixed effects to absorb
+        break_years, thresholds: candidates (default: every year after the first,
+            every distinct intensity value)
+        cluster: cluster column for SEs and bootstrap weights (None = HC1 / per-obs)
+        n_boot: wild bootstrap replications for the sup-statistic critical values
+        trim: candidates whose treated share is below trim or above 1 - trim are
+            still estimated but left out of the sup statistics (`in_sup` = False)
+
+    Returns (scan DataFrame with one row per candidate, summary dict with the
+    sup-Wald and QLR (sup-F) statistics, their argmax, bootstrap critical values
+    and p-values).
+    """
+    fe = [fe] if isinstance(fe, str) else list(fe)
+    cols = [y, time] + fe + ([cluster] if cluster is not None else [])
+    data = df[list(dict.fromkeys(cols + [intensity]))].dropna(subset=list(dict.fromkeys(cols)))
+    n = len(data)
+
+    if break_years is None:
+        break_years = np.sort(data[time].unique())[1:]
+    if thresholds is None:
+        thresholds = np.sort(data[intensity].dropna().unique())
+
+    specs, D = candidate_designs(data, intensity, time, break_years, thresholds)
+    share = D.mean(axis=0)
+
+    fe_codes = factorize_fe(data, fe)
+    M, _ = demean(np.column_stack([data[y].to_numpy(dtype=float), D]), fe_codes)
+    y_dm, D_dm = M[:, 0], M[:, 1:]
+    dd = (D_dm ** 2).sum(axis=0)
+    identified = dd > 1e-9 * n
+    D_dm, dd = D_dm[:, identified], dd[identified]
+    idx = np.flatnonzero(identified)
+
+    k = absorbed_dof(fe_codes) + 1
+    df_resid = n - k
+    if cluster is not None:
+        groups, levels = pd.factorize(data[cluster])
+        n_clusters = len(levels)
+    else:
+        groups, n_clusters = None, None
+
+    beta, var, wald, f_stat = fwl_stats(y_dm, D_dm, dd, groups, n_clusters, k, df_resid)
+    scan = specs.iloc[idx].reset_index(drop=True)
+    scan['treated_share'] = share[idx]
+    scan['in_sup'] = (share[idx] >= trim) & (share[idx] <= 1 - trim)
+    scan['coef'] = beta[:, 0]
+    scan['se'] = np.sqrt(var[:, 0])
+    scan['wald'] = wald[:, 0]
+    scan['f_stat'] = f_stat[:, 0]
+
+    # Wild (cluster) bootstrap under the null: restricted residuals are y_dm
+    rng = np.random.default_rng(seed)
+    n_draw = n_clusters if cluster is not None else n
+    v = rng.choice([-1.0, 1.0], size=(n_draw, n_boot))
+    y_star = y_dm[:, None] * (v[groups] if cluster is not None else v)
+    y_star, _ = demean(y_star, fe_codes)
+    in_sup = scan['in_sup'].to_numpy()
+    _, _, wald_b, f_b = fwl_stats(y_star, D_dm[:, in_sup], dd[in_sup], groups,
+                                    n_clusters, k, df_resid)
+    sup_wald_b = wald_b.max(axis=0)
+    sup_f_b = f_b.max(axis=0)
+
+    best_w = int(np.argmax(np.where(in_sup, scan['wald'], -np.inf)))
+    best_f = int(np.argmax(np.where(in_sup, scan['f_stat'], -np.inf)))
+    summary = {
+        'n_candidates': int(in_sup.sum()),
+        'n_boot': n_boot,
+        'sup_wald': scan['wald'].iloc[best_w],
+        'sup_wald_break_year': scan['break_year'].iloc[best_w],
+        'sup_wald_threshold': scan['threshold'].iloc[best_w],
+        'sup_wald_critical': np.quantile(sup_wald_b, 1 - alpha),
+        'sup_wald_pvalue': (1 + np.sum(sup_wald_b >= scan['wald'].iloc[best_w])) / (n_boot + 1),
+        'qlr': scan['f_stat'].iloc[best_f],
+        'qlr_break_year': scan['break_year'].iloc[best_f],
+        'qlr_threshold': scan['threshold'].iloc[best_f],
+        'qlr_critical': np.quantile(sup_f_b, 1 - alpha),
+        'qlr_pvalue': (1 + np.sum(sup_f_b >= scan['f_stat'].iloc[best_f])) / (n_boot + 1),
+    }
+    return scan, summary
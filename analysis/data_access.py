@@ -0,0 +1,189 @@
+"""
+Shared loaders for the S&P 500, GHGRP emissions, sector AI exposure and Scope 2 data.
+
+Every analysis starts from the same few merges: the GHGRP company-year panel,
+the S&P 500 constituents joined on ticker, and the sector AI-exposure scores.
+The loaders here build each frame once and reuse it:
+
+  - in process, keyed by a content hash of the source files, so repeated calls
+    return a copy of the cached frame (cheap under copy-on-write);
+  - on disk, as a pickle under data/cache/ named by the same hash, so a new
+    process skips the CSV parsing and merges while the sources are unchanged.
+
+Editing a source file changes its hash and the frame is rebuilt on next use.
+Ticker, sector and state columns are categorical.
+
+Usage:
+    from data_access import load_emissions_panel, load_sp500, load_sector_exposure, load_scope2_panel
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+from emissions_store import SOURCES, STATE_COLUMN, STORE_DIR, query_emissions
+from instrumentation import stage
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_DIR = PROJECT_ROOT / "data"
+CACHE_DIR = DATA_DIR / "cache"
+CACHE_VERSION = 1
+
+SP500_CSV = DATA_DIR / "sp500_constituents.csv"
+SCOPE2_FILES = {
+    'expanded': DATA_DIR / "scope2_manual" / "sp500_scope2_expanded.csv",
+    'top50': DATA_DIR / "scope2_manual" / "top50_scope2_template.csv",
+}
+
+# O*NET index from scripts/build_ai_exposure_index.py (analysis/output/ai_exposure_by_sector.csv)
+# rounded to one decimal, with manual estimates for Energy and Utilities, which have no
+# matched occupations in the index
+SECTOR_AI_EXPOSURE = {
+    'Information Technology': 81.5, 'Financials': 81.2, 'Health Care': 65.1,
+    'Consumer Discretionary': 62.6, 'Communication Services': 58.8, 'Industrials': 50.3,
+    'Energy': 45.0, 'Utilities': 42.0, 'Materials': 37.2, 'Consumer Staples': 29.6,
+    'Real Estate': 28.9,
+}
+
+_file_digests = {}
+_memo = {}
+
+
+def _file_digest(path):
+    """SHA-256 of a file, recomputed only when its size or mtime changes."""
+    stat = path.stat()
+    signature = (str(path), stat.st_size, stat.st_mtime_ns)
+    if signature not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_digests[signature] = digest.hexdigest()
+    return _file_digests[signature]
+
+
+def _cached(name, sources, build, params=None):
+    """Return build() through the in-process memo and the on-disk cache.
+
+    The key covers the loader name and parameters, the cache and pandas
+    versions, and the contents of every source file.
+    """
+    digest = hashlib.sha256(f"{name}:{CACHE_VERSION}:{pd.__version__}:"
+                            f"{json.dumps(params, sort_keys=True)}\n".encode())
+    for path in sorted(sources):
+        digest.update(f"{path.relative_to(PROJECT_ROOT)}:{_file_digest(path)}\n".encode())
+    key = digest.hexdigest()[:16]
+
+    with stage(f"load_{name}") as s:
+        if name in _memo and _memo[name][0] == key:
+            s.cache_hit()
+            s.attrs['cache'] = 'memory'
+            s.rows_out = len(_memo[name][1])
+            return _memo[name][1].copy()
+
+        path = CACHE_DIR / f"{name}-{key}.pkl"
+        df = None
+        if path.exists():
+            try:
+                df = pd.read_pickle(path)
+                s.cache_hit()
+                s.attrs['cache'] = 'disk'
+            except Exception:
+                df = None
+        if df is None:
+            s.cache_miss()
+            df = build()
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Pipeline stages running in parallel can miss at the same time:
+            # write through a per-process tmp file, never remove the entry for
+            # this key (a sibling may have just written it) and tolerate a
+            # stale entry another process already removed
+            for stale in CACHE_DIR.glob(f"{name}-*.pkl"):
+                if stale != path:
+                    stale.unlink(missing_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            df.to_pickle(tmp)
+            os.replace(tmp, path)
+
+        _memo[name] = (key, df)
+        s.rows_out = len(df)
+        return df.copy()
+
+
+def _categorize(df, columns):
+    for col in columns:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def _emissions_sources(level):
+    # The CSV is hashed even when the store exists: regenerating it makes the
+    # store stale, and query_emissions then reads the CSV instead
+    root = STORE_DIR / level
+    parts = sorted(root.rglob("*.parquet")) if root.exists() else []
+    csv = [SOURCES[level]] if SOURCES[level].exists() else []
+    return parts + csv
+
+
+def load_sp500():
+    """S&P 500 constituents (Symbol, Security, GICS Sector, GICS Sub-Industry, ...)."""
+    def build():
+        df = pd.read_csv(SP500_CSV)
+        return _categorize(df, ['Symbol', 'GICS Sector', 'GICS Sub-Industry'])
+
+    return _cached('sp500', [SP500_CSV], build)
+
+
+def load_sector_exposure():
+    """AI exposure score by GICS sector, as a Series indexed by sector name."""
+    exposure = pd.Series(SECTOR_AI_EXPOSURE, name='ai_exposure', dtype='float64')
+    exposure.index.name = 'gics_sector'
+    return exposure
+
+
+def load_emissions_panel(level='company'):
+    """GHGRP emissions of S&P 500 firms with sector and AI exposure.
+
+    Args:
+        level: 'company' (ticker-year panel) or 'facility' (facility-year rows)
+
+    Returns the query_emissions frame with Security, GICS Sector and
+    GICS Sub-Industry from the constituents list and the sector ai_exposure
+    (NaN for tickers no longer in the index), sorted as query_emissions.
+    """
+    if level not in SOURCES:
+        raise ValueError(f"level must be one of {list(SOURCES)}, got {level!r}")
+
+    def build():
+        df = query_emissions(level=level)
+        sp500 = load_sp500()[['Symbol', 'Security', 'GICS Sector', 'GICS Sub-Industry']]
+        sp500 = sp500.astype({'Symbol': 'str', 'GICS Sector': 'str', 'GICS Sub-Industry': 'str'})
+        df = df.merge(sp500.rename(columns={'Symbol': 'ticker'}), on='ticker', how='left')
+        df['ai_exposure'] = df['GICS Sector'].map(SECTOR_AI_EXPOSURE)
+        return _categorize(df, ['ticker', STATE_COLUMN[level], 'GICS Sector', 'GICS Sub-Industry'])
+
+    return _cached(f"emissions_{level}", _emissions_sources(level) + [SP500_CSV], build,
+                   params=SECTOR_AI_EXPOSURE)
+
+
+def load_scope2_panel(source='expanded'):
+    """Hand-collected Scope 1/2 emissions from sustainability reports.
+
+    Args:
+        source: 'expanded' (S&P 500 panel, data/scope2_manual/sp500_scope2_expanded.csv)
+                or 'top50' (top-50 emitters template, top50_scope2_template.csv)
+    """
+    if source not in SCOPE2_FILES:
+        raise ValueError(f"source must be one of {list(SCOPE2_FILES)}, got {source!r}")
+    path = SCOPE2_FILES[source]
+
+    def build():
+        return _categorize(pd.read_csv(path), ['ticker', 'sector'])
+
+    return _cached(f"scope2_{source}", [path], build)
@@ -0,0 +1,292 @@
+"""
+Warm worker for running the analyses without paying start-up costs on every run.
+
+A cold run of one analysis script spends most of its time importing pandas,
+statsmodels, scipy, matplotlib and seaborn and parsing the input CSVs. The
+worker (`serve`) imports those libraries once, preloads the data_access panels,
+and then runs each requested script inside the same interpreter:
+
+  - a script's entry point is the script itself, executed with runpy as
+    __main__ with the given arguments (so `if __name__ == "__main__"` blocks
+    and sys.argv parsing behave as on the command line);
+  - stdout and stderr stream back to the client, which exits with the
+    script's status;
+  - matplotlib rcParams and warning filters are restored and figures closed
+    after each run, so one script's plt.style.use() does not leak into the next;
+  - the worker always traces: the stage timings recorded during a run
+    (scripts/instrumentation.py) are appended to
+    analysis/.pipeline/traces/esg.jsonl and summarized after it;
+  - local modules (analysis/, scripts/) whose source, or a local module they
+    import, changed since they were loaded are re-imported on the next run;
+    the data_access memo survives as long as data_access is unchanged.
+
+Without a running worker, `run` executes the script in the client process.
+
+Usage:
+    python analysis/esg.py serve                   # start the worker (foreground)
+    python analysis/esg.py run 02 [ARGS ...]       # stage name, unique prefix or path
+    python analysis/esg.py status | stop | list
+"""
+
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import runpy
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+import traceback
+import warnings
+from pathlib import Path
+
+from pipeline import MODULE_DIRS, PROJECT_ROOT, STAGES, local_imports
+
+WARM_MODULES = ['numpy', 'pandas', 'scipy.stats', 'scipy.sparse', 'scipy.optimize',
+                'statsmodels.api', 'statsmodels.formula.api', 'matplotlib.pyplot', 'seaborn']
+EXIT_MARKER = "\x00esg-exit "
+
+_module_dirs = [d.resolve() for d in MODULE_DIRS]
+_module_mtimes = {}
+
+
+def socket_path():
+    """Per-checkout socket in the temp directory (project paths can exceed the AF_UNIX limit)."""
+    digest = hashlib.sha256(str(PROJECT_ROOT.resolve()).encode()).hexdigest()[:12]
+    return Path(tempfile.gettempdir()) / f"esg-{digest}.sock"
+
+
+def resolve_script(name):
+    """Script path for a pipeline stage name, a unique stage-name prefix or a file path."""
+    if name in STAGES:
+        return (PROJECT_ROOT / STAGES[name]['script']).resolve()
+    matches = [stage for stage in STAGES if stage.startswith(name)]
+    if len(matches) == 1:
+        return (PROJECT_ROOT / STAGES[matches[0]]['script']).resolve()
+    if len(matches) > 1:
+        raise ValueError(f"{name!r} matches several stages: {', '.join(matches)}")
+    path = Path(name)
+    if path.suffix == '.py' and path.exists():
+        return path.resolve()
+    raise ValueError(f"unknown script {name!r} (see `esg.py list`)")
+
+
+def _local_modules():
+    modules = {}
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+        if path and path.endswith('.py') and Path(path).resolve().parent in _module_dirs:
+            modules[name] = Path(path).resolve()
+    return modules
+
+
+def reload_changed_modules():
+    """Forget local modules whose source, or a local module they import, changed since loading."""
+    changed = {path for path, mtime in _module_mtimes.items()
+               if not path.exists() or path.stat().st_mtime_ns != mtime}
+    if not changed:
+        return []
+    dropped = []
+    for name, path in _local_modules().items():
+        if changed & {p.resolve() for p in local_imports(path)}:
+            del sys.modules[name]
+            dropped.append(name)
+    for path in changed:
+        _module_mtimes.pop(path)
+    return dropped
+
+
+def _record_modules():
+    for path in _local_modules().values():
+        _module_mtimes.setdefault(path, path.stat().st_mtime_ns)
+
+
+def run_script(script, args=(), cwd=None, stdout=None):
+    """Run an analysis script as __main__ in this interpreter.
+
+    Args:
+        script: stage name, unique prefix or path (see resolve_script)
+        args: command-line arguments for the script
+        cwd: working directory for the run (default: project root)
+        stdout: text stream receiving the script's stdout and stderr (default: unchanged)
+
+    Returns (exit status, seconds).
+    """
+    path = resolve_script(script)
+    reload_changed_modules()
+    saved_argv, saved_path, saved_cwd = sys.argv, list(sys.path), os.getcwd()
+    status, start = 0, time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if stdout is not None:
+            stack.enter_context(contextlib.redirect_stdout(stdout))
+            stack.enter_context(contextlib.redirect_stderr(stdout))
+        stack.enter_context(warnings.catch_warnings())
+        if 'matplotlib' in sys.modules:
+            stack.enter_context(sys.modules['matplotlib'].rc_context())
+        try:
+            sys.argv = [str(path)] + list(args)
+            sys.path.insert(0, str(path.parent))
+            os.chdir(cwd or PROJECT_ROOT)
+            runpy.run_path(str(path), run_name='__main__')
+        except SystemExit as exc:
+            if isinstance(exc.code, int) or exc.code is None:
+                status = exc.code or 0
+            else:
+                print(exc.code, file=sys.stderr)
+                status = 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.argv, sys.path[:] = saved_argv, saved_path
+            os.chdir(saved_cwd)
+            if 'matplotlib.pyplot' in sys.modules:
+                sys.modules['matplotlib.pyplot'].close('all')
+            _record_modules()
+            # Stage timings of this run (the worker itself never exits)
+            importlib.import_module('instrumentation').flush()
+    return status, time.perf_counter() - start
+
+
+def warm_up():
+    """Import the heavy libraries and load the shared panels."""
+    import matplotlib
+    matplotlib.use('Agg')
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    import data_access
+    loaders = [data_access.load_sp500, data_access.load_emissions_panel,
+               lambda: data_access.load_emissions_panel(level='facility'),
+               lambda: data_access.load_scope2_panel('expanded'),
+               lambda: data_access.load_scope2_panel('top50')]
+    for load in loaders:
+        try:
+            load()
+        except (OSError, ValueError):
+            pass
+    _record_modules()
+
+
+class _Worker(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        out = io.TextIOWrapper(self.wfile, encoding='utf-8', line_buffering=True, write_through=True)
+        try:
+            if request['command'] == 'stop':
+                out.write(EXIT_MARKER + json.dumps({'status': 0}) + "\n")
+                self.server.stopping = True
+            elif request['command'] == 'status':
+                data_access = sys.modules.get('data_access')
+                cached = sorted(data_access._memo) if data_access else []
+                out.write(f"pid {os.getpid()}, up {time.time() - self.server.started:.0f}s, "
+                          f"{self.server.runs} runs, cached panels: {', '.join(cached) or 'none'}\n")
+                out.write(EXIT_MARKER + json.dumps({'status': 0}) + "\n")
+            else:
+                try:
+                    status, seconds = run_script(request['script'], request['args'], request['cwd'], out)
+                except ValueError as exc:
+                    out.write(f"{exc}\n")
+                    status, seconds = 2, 0.0
+                self.server.runs += 1
+                out.write(EXIT_MARKER + json.dumps({'status': status, 'seconds': seconds}) + "\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            try:
+                out.detach()
+            except ValueError:
+                pass
+
+
+def _request(payload):
+    """Send one request to the worker and stream its output; None when no worker is running."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path()))
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    with sock, sock.makefile('rwb') as f:
+        f.write((json.dumps(payload) + "\n").encode())
+        f.flush()
+        for raw in f:
+            line = raw.decode('utf-8', errors='replace')
+            if line.startswith(EXIT_MARKER):
+                return json.loads(line[len(EXIT_MARKER):])
+            sys.stdout.write(line)
+            sys.stdout.flush()
+    return {'status': 1}
+
+
+def serve():
+    path = socket_path()
+    if _request({'command': 'status'}) is not None:
+        print(f"A worker is already running at {path}")
+        return 1
+    path.unlink(missing_ok=True)
+
+    print("=" * 60)
+    print("ESG ANALYSIS WORKER")
+    print("=" * 60)
+    start = time.perf_counter()
+    instrumentation = importlib.import_module('instrumentation')
+    instrumentation.start_trace(instrumentation.TRACE_DIR / "esg.jsonl")
+    warm_up()
+    server = socketserver.UnixStreamServer(str(path), _Worker)
+    server.started, server.runs, server.stopping = time.time(), 0, False
+    print(f"Ready in {time.perf_counter() - start:.1f}s at {path}")
+    print("Run analyses with: python analysis/esg.py run <script> [args]")
+    try:
+        while not server.stopping:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
+    print("Worker stopped")
+    return 0
+
+
+def main(args):
+    command = args[0] if args else 'list'
+
+    if command == 'serve':
+        return serve()
+    if command == 'list':
+        for name, stage in STAGES.items():
+            print(f"  {name:34s} {stage['script']}")
+        return 0
+    if command in ('status', 'stop'):
+        reply = _request({'command': command})
+        if reply is None:
+            print("No worker running")
+        return 0
+    if command == 'run' and len(args) > 1:
+        payload = {'command': 'run', 'script': args[1], 'args': args[2:], 'cwd': os.getcwd()}
+        reply = _request(payload)
+        if reply is None:
+            print("(no worker running; running in this process -- start one with "
+                  "`python analysis/esg.py serve`)", file=sys.stderr)
+            try:
+                status, seconds = run_script(args[1], args[2:], os.getcwd())
+            except ValueError as exc:
+                print(exc, file=sys.stderr)
+                return 2
+            reply = {'status': status, 'seconds': seconds}
+        if 'seconds' in reply:
+            print(f"[esg] {args[1]}: exit {reply['status']} in {reply['seconds']:.2f}s", file=sys.stderr)
+        return reply['status']
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
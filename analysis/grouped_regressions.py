@@ -0,0 +1,197 @@
+"""
+Group-wise fixed-effects regressions in one pass.
+
+Heterogeneity tables (by sector, state, NAICS code, size class) need the same
+FE regression fitted separately within every group. Instead of filtering the
+panel and refitting per group, the panel is sorted by group once and:
+
+- every FE is interacted with the group, so a single demeaning sweep
+  (fixed_effects.demean) absorbs each group's own FE;
+- per-group X'X, X'y and score sums come from segment reductions over the
+  sorted rows (np.add.reduceat), and all normal equations are solved as one
+  stacked (G, k, k) system;
+- groups that cannot be estimated (too few observations, no within variation,
+  collinear regressors, no residual degrees of freedom, a single cluster) are
+  returned in a failures table with the reason instead of being skipped.
+
+    from grouped_regressions import feols_by
+    table, failures = feols_by(df, 'log_emissions', 'post_chatgpt', by='GICS Sector',
+                               fe='ticker', cov_type='nonrobust')
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import special
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from fixed_effects import COV_TYPES, demean
+
+
+def _nested_codes(groups, codes):
+    """Codes of (group, level) pairs and the group each pair belongs to."""
+    pairs, inverse = np.unique(np.column_stack([groups, codes]), axis=0, return_inverse=True)
+    return inverse.ravel(), len(pairs), pairs[:, 0]
+
+
+def _absorbed_dof_by(fe_codes, level_groups, n_groups):
+    """Parameters absorbed by group-nested FE, per group (cf. fixed_effects.absorbed_dof)."""
+    levels = sum(np.bincount(lg, minlength=n_groups) for lg in level_groups)
+    if len(fe_codes) == 2:
+        (a, na), (b, nb) = fe_codes
+        graph = csr_matrix((np.ones(len(a)), (a, b + na)), shape=(na + nb, na + nb))
+        _, labels = connected_components(graph, directed=False)
+        node_group = np.concatenate(level_groups)
+        component_group = np.zeros(labels.max() + 1, dtype=int)
+        component_group[labels] = node_group
+        return levels - np.bincount(component_group, minlength=n_groups)
+    return levels - max(len(fe_codes) - 1, 0)
+
+
+def feols_by(data, y, x, by, fe=None, cluster=None, cov_type=None, use_t=None, min_obs=1):
+    """Fit `y ~ x + fe` separately within every group of `by`.
+
+    Args:
+        data: DataFrame
+        y: outcome column
+        x: regressor column(s)
+        by: grouping column (sector, state, NAICS code, size class, ...)
+        fe: fixed-effect column(s) absorbed within each group (None = constant only)
+        cluster: column to cluster SEs on within each group (implies cov_type='cluster')
+        cov_type: 'nonrobust', 'HC0', 'HC1' or 'cluster', as in fixed_effects.feols
+        use_t: t vs normal inference (default: t only for nonrobust)
+        min_obs: groups with fewer complete observations are reported as failures
+
+    Returns (table, failures): a tidy table with one row per group and term
+    (coef, se, t, pval, nobs, df_resid, rsquared_within, plus n_clusters when
+    clustering), and a table of the groups or terms that could not be
+    estimated with the reason.
+    """
+    x = [x] if isinstance(x, str) else list(x)
+    fe = [fe] if isinstance(fe, str) else list(fe or [])
+    cov_type = cov_type or ('cluster' if cluster is not None else 'HC1')
+    if cov_type not in COV_TYPES:
+        raise ValueError(f"cov_type must be one of {COV_TYPES}, got {cov_type!r}")
+    if cov_type == 'cluster' and cluster is None:
+        raise ValueError("cov_type='cluster' requires a cluster column")
+    if use_t is None:
+        use_t = cov_type == 'nonrobust'
+
+    cols = list(dict.fromkeys([y] + x + fe + ([cluster] if cluster is not None else [])))
+    data = data[data[by].notna()]
+    complete = data[cols].notna().all(axis=1)
+    group_codes, group_levels = pd.factorize(data[by], sort=True)
+    n_complete = np.bincount(group_codes[complete.to_numpy()], minlength=len(group_levels))
+
+    failures = [{by: level, 'term': None, 'nobs': int(n_g),
+                 'reason': f"fewer than {min_obs} complete observations" if n_g else "no complete observations"}
+                for level, n_g in zip(group_levels, n_complete) if n_g < min_obs or n_g == 0]
+
+    # Sort the estimable rows by group so every group is a contiguous segment
+    ok = n_complete >= max(min_obs, 1)
+    keep = complete.to_numpy() & ok[group_codes]
+    levels = group_levels[ok]
+    g = np.cumsum(ok)[group_codes[keep]] - 1
+    order = np.argsort(g, kind='stable')
+    df, g = data.loc[keep, cols].iloc[order], g[order]
+    G = len(levels)
+    if G == 0:
+        return pd.DataFrame(), pd.DataFrame(failures)
+    nobs = np.bincount(g, minlength=G)
+    starts = np.r_[0, np.cumsum(nobs)[:-1]]
+
+    M = df[[y] + x].to_numpy(dtype=float)
+    if fe:
+        nested = [_nested_codes(g, pd.factorize(df[col])[0]) for col in fe]
+        fe_codes = [(codes, n_levels) for codes, n_levels, _ in nested]
+        M, _ = demean(M, fe_codes)
+        k_fe = _absorbed_dof_by(fe_codes, [lg for _, _, lg in nested], G)
+        names = x
+    else:
+        M = np.column_stack([M[:, 0], np.ones(len(M)), M[:, 1:]])
+        k_fe = np.zeros(G, dtype=int)
+        names = ['Intercept'] + x
+    y_dm, X = M[:, 0], M[:, 1:]
+    k = X.shape[1]
+
+    XX = np.add.reduceat(X[:, :, None] * X[:, None, :], starts)
+    Xy = np.add.reduceat(X * y_dm[:, None], starts)
+    yy = np.add.reduceat(y_dm ** 2, starts)
+
+    # Regressors without within-group variation are dropped for that group;
+    # setting their rows/columns to the identity keeps the stacked solve valid
+    raw_ss = np.add.reduceat(M[:, 1:] ** 2, starts)
+    varies = np.diagonal(XX, axis1=1, axis2=2) > 1e-9 * np.maximum(raw_ss, 1.0)
+    mask = varies[:, :, None] & varies[:, None, :]
+    A = np.where(mask, XX, 0.0) + np.eye(k)[None] * ~varies[:, :, None]
+    b = np.where(varies, Xy, 0.0)
+
+    eig = np.linalg.eigvalsh(A)
+    collinear = eig[:, 0] <= 1e-10 * np.maximum(eig[:, -1], 1.0)
+    k_g = varies.sum(axis=1)
+    df_resid = nobs - k_g - k_fe
+
+    A_inv = np.linalg.inv(np.where(collinear[:, None, None], np.eye(k), A))
+    beta = np.einsum('gij,gj->gi', A_inv, b)
+    e = y_dm - np.einsum('ij,ij->i', X, beta[g] * varies[g])
+    ssr = np.bincount(g, weights=e ** 2, minlength=G)
+
+    n_clusters = None
+    if cov_type == 'nonrobust':
+        cov = A_inv * (ssr / np.where(df_resid > 0, df_resid, np.nan))[:, None, None]
+    elif cov_type in ('HC0', 'HC1'):
+        meat = np.add.reduceat(X[:, :, None] * X[:, None, :] * (e ** 2)[:, None, None], starts)
+        cov = A_inv @ meat @ A_inv
+        if cov_type == 'HC1':
+            cov *= (nobs / np.where(df_resid > 0, df_resid, np.nan))[:, None, None]
+    else:
+        cl, n_cl, cl_group = _nested_codes(g, pd.factorize(df[cluster])[0])
+        scores = X * e[:, None]
+        S = np.column_stack([np.bincount(cl, weights=scores[:, i], minlength=n_cl) for i in range(k)])
+        meat = np.zeros((G, k, k))
+        np.add.at(meat, cl_group, S[:, :, None] * S[:, None, :])
+        n_clusters = np.bincount(cl_group, minlength=G)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = n_clusters / (n_clusters - 1) * (nobs - 1) / np.where(df_resid > 0, df_resid, np.nan)
+        cov = A_inv @ meat @ A_inv * scale[:, None, None]
+
+    rows = []
+    for i, level in enumerate(levels):
+        reason = None
+        if not varies[i].any():
+            reason = "no within-group variation in the regressors"
+        elif collinear[i]:
+            reason = "collinear regressors"
+        elif df_resid[i] <= 0:
+            reason = "no residual degrees of freedom"
+        elif n_clusters is not None and n_clusters[i] < 2:
+            reason = "fewer than 2 clusters"
+        if reason:
+            failures.append({by: level, 'term': None, 'nobs': int(nobs[i]), 'reason': reason})
+            continue
+
+        dof = n_clusters[i] - 1 if n_clusters is not None else df_resid[i]
+        for t_idx, term in enumerate(names):
+            if not varies[i, t_idx]:
+                failures.append({by: level, 'term': term, 'nobs': int(nobs[i]),
+                                 'reason': "no within-group variation (absorbed)"})
+                continue
+            se = np.sqrt(cov[i, t_idx, t_idx])
+            t = beta[i, t_idx] / se
+            row = {
+                by: level,
+                'term': term,
+                'coef': beta[i, t_idx],
+                'se': se,
+                't': t,
+                'pval': 2 * (special.stdtr(dof, -abs(t)) if use_t else special.ndtr(-abs(t))),
+                'nobs': int(nobs[i]),
+                'df_resid': int(df_resid[i]),
+                'rsquared_within': 1 - ssr[i] / yy[i] if yy[i] > 0 else np.nan,
+            }
+            if n_clusters is not None:
+                row['n_clusters'] = int(n_clusters[i])
+            rows.append(row)
+
+    failures = pd.DataFrame(failures, columns=[by, 'term', 'nobs', 'reason'])
+    return pd.DataFrame(rows), failures
@@ -0,0 +1,419 @@
+"""
+Two-stage least squares with absorbed fixed effects.
+
+The outcome, endogenous regressors, exogenous controls and excluded
+instruments are demeaned together once (fixed_effects.demean), so state-year
+and firm-year panels with high-dimensional FE are fitted without dummies.
+On the demeaned data:
+
+- the structural 2SLS coefficients use the projection of the regressors on
+  all instruments, with nonrobust, HC or cluster-robust SEs as in feols;
+- instrument strength is reported as the Kleibergen-Paap rk Wald F (robust to
+  heteroskedasticity / clustering; equal to the robust first-stage F with one
+  endogenous regressor) and the Cragg-Donald F (homoskedastic);
+- Anderson-Rubin tests are robust to weak instruments. With the controls
+  partialled out, the AR statistic at beta0 is a ratio of quadratic forms in
+  beta0 whose pieces are computed once, so the AR confidence set is found by
+  evaluating a fine grid in one batch and refining the edges with brentq;
+- the score (wild) bootstrap of Kline & Santos (2012) perturbs the cluster
+  scores of the restricted 2SLS fit, so each replication is a G-vector dot
+  product instead of a refit.
+
+load_state_instruments() builds the pre-determined state siting
+characteristics (tax incentives, IXP count, 2019 electricity rates, pre-2020
+data center capacity) used as shift-share instruments in 10 and 14.
+
+    from instrumental_variables import feiv
+    model = feiv(panel, 'ln_scope2', 'ln_dc_demand', ['incentive_x_shift', 'ixp_x_shift'],
+                 fe=['state', 'year'], cluster='state')
+    model.params, model.kp_f, model.ar_conf_int(), model.bootstrap('ln_dc_demand')
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import special
+from scipy.optimize import brentq
+
+from fixed_effects import COV_TYPES, FEOLSResults, absorbed_dof, demean, factorize_fe
+from instrumentation import instrumented
+from wild_bootstrap import CHUNK_SIZE, draw_weights
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+STATE_INSTRUMENTS = ['incentive_score', 'ixp_count', 'elec_rate_2019', 'pre2020_capacity_mw']
+
+ALL_STATES = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
+              'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
+              'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
+              'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
+              'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY', 'DC']
+
+# Major Internet Exchange Points by state (PeeringDB and public IXP lists)
+STATE_IXP_COUNT = {
+    'VA': 5, 'CA': 4, 'NY': 4, 'TX': 3, 'IL': 3, 'WA': 2, 'GA': 2,
+    'FL': 2, 'NJ': 2, 'OR': 2, 'AZ': 1, 'CO': 1, 'MA': 1, 'PA': 1,
+    'NC': 1, 'OH': 1, 'NV': 1, 'UT': 1
+}
+
+# Commercial electricity rates, 2019 baseline (cents/kWh; EIA State Electricity Profiles)
+STATE_ELEC_RATE_2019 = {
+    'WA': 7.8, 'OR': 8.1, 'ID': 7.5, 'MT': 9.2, 'WY': 8.5,
+    'NV': 8.4, 'UT': 8.3, 'AZ': 9.5, 'NM': 9.8, 'CO': 9.4,
+    'ND': 8.9, 'SD': 9.1, 'NE': 8.8, 'KS': 10.2, 'OK': 8.1,
+    'TX': 8.3, 'MN': 9.8, 'IA': 9.5, 'MO': 9.2, 'AR': 8.7,
+    'LA': 8.4, 'WI': 10.1, 'IL': 8.9, 'MI': 11.2, 'IN': 9.8,
+    'OH': 9.4, 'KY': 9.1, 'TN': 10.0, 'MS': 9.8, 'AL': 10.5,
+    'GA': 9.8, 'FL': 9.9, 'SC': 9.4, 'NC': 8.8, 'VA': 8.2,
+    'WV': 8.9, 'MD': 10.8, 'DE': 10.2, 'PA': 9.1, 'NJ': 12.1,
+    'NY': 14.8, 'CT': 16.2, 'RI': 15.8, 'MA': 15.4, 'VT': 14.1,
+    'NH': 14.8, 'ME': 12.5, 'CA': 15.2, 'AK': 18.5, 'HI': 27.5, 'DC': 11.5
+}
+
+
+def load_state_instruments():
+    """Pre-determined data-center siting characteristics for all 50 states + DC.
+
+    Columns: state, sales_tax_exemption, incentive_score (1 where no incentive),
+    pre2020_capacity_mw / pre2020_facilities (major data centers operational by
+    2019), ixp_count and elec_rate_2019.
+    """
+    incentives = pd.read_csv(DATA_DIR / "data_centers" / "state_dc_tax_incentives.csv")
+    centers = pd.read_csv(DATA_DIR / "data_centers" / "major_ai_data_centers.csv")
+    dc_by_state = centers[centers['year_operational'] <= 2019].groupby('state').agg(
+        pre2020_capacity_mw=('power_mw', 'sum'), pre2020_facilities=('company', 'count'))
+
+    states = pd.DataFrame({'state': ALL_STATES}).merge(incentives, on='state', how='left')
+    states['sales_tax_exemption'] = states['sales_tax_exemption'].fillna(False)
+    states['incentive_score'] = states['incentive_score'].fillna(1)
+    states = states.merge(dc_by_state, on='state', how='left')
+    states[['pre2020_capacity_mw', 'pre2020_facilities']] = \
+        states[['pre2020_capacity_mw', 'pre2020_facilities']].fillna(0)
+    states['ixp_count'] = states['state'].map(STATE_IXP_COUNT).fillna(0)
+    states['elec_rate_2019'] = states['state'].map(STATE_ELEC_RATE_2019).fillna(10.0)
+    return states
+
+
+def _cluster_sums(Z, groups, n_groups):
+    """(G, k) sums of the columns of Z within groups (rows when groups is None)."""
+    Z = Z.reshape(len(Z), -1)
+    if groups is None:
+        return Z
+    return np.column_stack([np.bincount(groups, weights=Z[:, i], minlength=n_groups)
+                            for i in range(Z.shape[1])])
+
+
+def _tsls(y, X, Z):
+    """2SLS coefficients, residuals, projected regressors and (X_hat' X_hat)^-1."""
+    X_hat = Z @ np.linalg.lstsq(Z, X, rcond=None)[0]
+    Q = np.linalg.pinv(X_hat.T @ X_hat)
+    beta = Q @ (X_hat.T @ y)
+    return beta, y - X @ beta, X_hat, Q
+
+
+class IVResults(FEOLSResults):
+    """FEOLSResults for 2SLS, with first-stage diagnostics and weak-IV robust inference."""
+
+    def __init__(self, first_stage, kp_rk, kp_f, cragg_donald_f, instruments, endog, iv_data,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.first_stage = first_stage
+        self.kp_rk = kp_rk
+        self.kp_f = kp_f
+        self.cragg_donald_f = cragg_donald_f
+        self.instruments = instruments
+        self.endog = endog
+        self._iv = iv_data
+
+    def __repr__(self):
+        fe = ', '.join(f"{k} ({v})" for k, v in self.n_fe.items()) or 'none'
+        return (f"IVResults(nobs={self.nobs}, FE: {fe}, cov_type={self.cov_type}, "
+                f"KP F={self.kp_f:.2f}, CD F={self.cragg_donald_f:.2f})\n"
+                f"{self.summary_frame().round(4)}")
+
+    def _ar_pieces(self):
+        """Quadratic-form pieces of the AR statistic in beta0 (controls partialled out)."""
+        if 'ar' not in self._iv:
+            d = self._iv
+            Zt, yt, Xt = d['Z_p'], d['y_p'], d['X_p']
+            coef = np.linalg.lstsq(Zt, np.column_stack([yt, Xt]), rcond=None)[0]
+            R = np.column_stack([yt, Xt]) - Zt @ coef
+            # Scores of the AR regression at beta0: z_i * (r_y,i - r_x,i' beta0)
+            S = _cluster_sums(Zt[:, :, None] * R[:, None, :], d['groups'], d['n_clusters'])
+            S = S.reshape(len(S), Zt.shape[1], -1)                    # (G, L, 1 + k1)
+            self._iv['ar'] = {
+                'h': Zt.T @ np.column_stack([yt, Xt]),                # (L, 1 + k1)
+                'SS': np.einsum('gla,gkb->ablk', S, S),               # meat = c_a c_b SS_ab
+                'RR': R.T @ R,                                        # (1 + k1, 1 + k1)
+                'ZZ': Zt.T @ Zt,
+            }
+        return self._iv['ar']
+
+    def _ar_stat(self, betas):
+        """AR Wald statistics for an (m, k1) array of hypothesized endogenous coefficients."""
+        p = self._ar_pieces()
+        d = self._iv
+        c = np.column_stack([np.ones(len(betas)), -betas])              # (m, 1 + k1)
+        h = c @ p['h'].T                                               # (m, L)
+        if self.cov_type == 'nonrobust':
+            sigma2 = np.einsum('mi,ij,mj->m', c, p['RR'], c) / d['ar_dof']
+            meat = sigma2[:, None, None] * p['ZZ'][None]
+        else:
+            meat = np.einsum('ma,mb,ablk->mlk', c, c, p['SS']) * d['ar_scale']
+        return np.einsum('ml,ml->m', h, np.linalg.solve(meat, h[:, :, None])[:, :, 0])
+
+    def ar_test(self, beta0=0.0):
+        """Anderson-Rubin test of H0: endogenous coefficients = beta0 (scalar or one per endog).
+
+        Returns a dict with the Wald statistic, its F form (stat / L) and the p-value.
+        """
+        betas = np.broadcast_to(np.asarray(beta0, dtype=float), (len(self.endog),))[None, :]
+        stat = self._ar_stat(betas)[0]
+        L = len(self.instruments)
+        p_value = (special.fdtrc(L, self._iv['ar_t_dof'], stat / L) if self.use_t
+                   else special.chdtrc(L, stat))
+        return {'stat': stat, 'f': stat / L, 'p_value': p_value, 'df': L}
+
+    def ar_conf_int(self, alpha=0.05, bounds=None, n_grid=4001):
+        """Anderson-Rubin confidence set for a single endogenous coefficient.
+
+        The set is found on a grid over `bounds` (default: estimate +/- 20 SE)
+        and its edges are refined by root finding. Returns a list of
+        (lower, upper) intervals; an interval reaching the grid edge is
+        reported as unbounded (-inf / inf), and an empty list means every
+        value is rejected (a sign of misspecification with overidentification).
+        """
+        if len(self.endog) != 1:
+            raise ValueError("ar_conf_int needs exactly one endogenous regressor; use ar_test")
+        L = len(self.instruments)
+        crit = (L * special.fdtri(L, self._iv['ar_t_dof'], 1 - alpha) if self.use_t
+                else special.chdtri(L, alpha))
+        name = self.endog[0]
+        if bounds is None:
+            half = 20 * self.bse[name] if np.isfinite(self.bse[name]) else 10.0
+            bounds = (self.params[name] - half, self.params[name] + half)
+        grid = np.linspace(*bounds, n_grid)
+        accept = self._ar_stat(grid[:, None]) <= crit
+
+        def excess(b):
+            return self._ar_stat(np.array([[b]]))[0] - crit
+
+        intervals = []
+        edges = np.flatnonzero(np.diff(accept.astype(int)))
+        lower = -np.inf if accept[0] else None
+        for i in edges:
+            root = brentq(excess, grid[i], grid[i + 1])
+            if lower is None:
+                lower = root
+            else:
+                intervals.append((lower, root))
+                lower = None
+        if lower is not None:
+            intervals.append((lower, np.inf))
+        return intervals
+
+    def bootstrap(self, param, null=0.0, n_boot=9999, weights='rademacher', seed=42):
+        """Score (wild) bootstrap test of H0: param = null (Kline & Santos 2012).
+
+        The restricted 2SLS fit imposes the null; the studentized sum of its
+        per-cluster scores for `param` is the test statistic, and each
+        replication re-weights those scores by Rademacher or Webb draws
+        (generated in chunks, as in wild_bootstrap).
+        """
+        d = self._iv
+        j = list(self.params.index).index(param)
+        X, Z, y = d['X'], d['Z'], d['y']
+        others = [i for i in range(X.shape[1]) if i != j]
+        y_r = y - null * X[:, j]
+        u_r = y_r - X[:, others] @ _tsls(y_r, X[:, others], Z)[0] if others else y_r
+
+        q_j = (d['X_hat'] @ d['Q'])[:, j]
+        a = _cluster_sums(q_j * u_r, d['groups'], d['n_clusters'])[:, 0]
+        score = a.sum() / np.sqrt((a ** 2).sum())
+
+        n_chunks = -(-n_boot // CHUNK_SIZE)
+        seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+        draws = []
+        for i in range(n_chunks):
+            v = draw_weights(len(a), min(CHUNK_SIZE, n_boot - i * CHUNK_SIZE), weights,
+                             np.random.default_rng(seeds[i]))
+            draws.append((a @ v) / np.sqrt(((a[:, None] * v) ** 2).sum(axis=0)))
+        draws = np.concatenate(draws)
+        return {
+            'param': param,
+            'null': null,
+            'coef': self.params[param],
+            'score_stat': score,
+            'p_value': np.mean(np.abs(draws) >= np.abs(score)),
+            'n_boot': n_boot,
+            'weights': weights,
+        }
+
+
+@instrumented('feiv', rows_in=lambda data, *args, **kwargs: len(data), rows_out=lambda model: model.nobs)
+def feiv(data, y, endog, instruments, exog=None, fe=None, cluster=None, cov_type=None,
+         use_t=None, tol=1e-10, maxiter=1000):
+    """2SLS of `y` on `endog` (+ `exog`) instrumented by `instruments`, absorbing `fe`.
+
+    Args:
+        data: DataFrame
+        y: outcome column
+        endog: endogenous regressor column(s)
+        instruments: excluded instrument column(s); at least as many as endog
+        exog: included exogenous control column(s)
+        fe: fixed-effect column(s) to absorb (None = constant only)
+        cluster: column to cluster SEs on (implies cov_type='cluster')
+        cov_type: 'nonrobust', 'HC0', 'HC1' or 'cluster', as in fixed_effects.feols
+
+    Rows with missing values are dropped. Columns without variation after the FE
+    are dropped and listed in `.dropped`. The KP rk Wald F uses the small-sample
+    scaling of ivreg2 ((N - L_total - absorbed) / N, and (G - 1) / G when
+    clustered); compare it with the Stock-Yogo / Olea-Pflueger thresholds.
+    """
+    endog = [endog] if isinstance(endog, str) else list(endog)
+    instruments = [instruments] if isinstance(instruments, str) else list(instruments)
+    exog = [exog] if isinstance(exog, str) else list(exog or [])
+    fe = [fe] if isinstance(fe, str) else list(fe or [])
+    cov_type = cov_type or ('cluster' if cluster is not None else 'HC1')
+    if cov_type not in COV_TYPES:
+        raise ValueError(f"cov_type must be one of {COV_TYPES}, got {cov_type!r}")
+    if cov_type == 'cluster' and cluster is None:
+        raise ValueError("cov_type='cluster' requires a cluster column")
+    if use_t is None:
+        use_t = cov_type == 'nonrobust'
+
+    cols = [y] + endog + exog + instruments + fe + ([cluster] if cluster is not None else [])
+    df = data[list(dict.fromkeys(cols))].dropna()
+    n = len(df)
+    M = df[[y] + endog + exog + instruments].to_numpy(dtype=float)
+    if fe:
+        fe_codes = factorize_fe(df, fe)
+        M_dm, iterations = demean(M, fe_codes, tol=tol, maxiter=maxiter)
+        k_fe = absorbed_dof(fe_codes)
+        # Columns without variation after the FE are dropped (same rule as feols)
+        varies = np.abs(M_dm).max(axis=0) > 1e-9 * np.maximum(np.abs(M).max(axis=0), 1.0)
+    else:
+        fe_codes, iterations, k_fe = [], 0, 0
+        M_dm = M
+        varies = np.ones(M.shape[1], dtype=bool)
+    names = [y] + endog + exog + instruments
+    dropped = [c for c, v in zip(names[1:], varies[1:]) if not v]
+    col = {c: M_dm[:, i] for i, (c, v) in enumerate(zip(names, varies)) if v or i == 0}
+    endog = [c for c in endog if c in col]
+    exog = [c for c in exog if c in col]
+    instruments = [c for c in instruments if c in col]
+    if not fe:
+        exog = ['Intercept'] + exog
+        col['Intercept'] = np.ones(n)
+    if not endog:
+        raise ValueError("all endogenous regressors are absorbed by the fixed effects")
+    if len(instruments) < len(endog):
+        raise ValueError(f"underidentified: {len(instruments)} instrument(s) for "
+                         f"{len(endog)} endogenous regressor(s)")
+
+    yv = col[y]
+    X = np.column_stack([col[c] for c in endog + exog])
+    Z = np.column_stack([col[c] for c in instruments + exog])
+    beta, u, X_hat, Q = _tsls(yv, X, Z)
+    L, k1 = len(instruments), len(endog)
+    k, n_inst = X.shape[1], Z.shape[1]
+    df_resid = n - k - k_fe
+
+    groups, n_clusters = None, None
+    if cov_type == 'cluster':
+        groups, levels = pd.factorize(df[cluster])
+        n_clusters = len(levels)
+    if cov_type == 'nonrobust':
+        scale = 1.0
+        cov = Q * (u @ u) / df_resid
+    else:
+        S = _cluster_sums(X_hat * u[:, None], groups, n_clusters)
+        scale = (n_clusters / (n_clusters - 1) * (n - 1) / df_resid if cov_type == 'cluster'
+                 else n / df_resid if cov_type == 'HC1' else 1.0)
+        cov = Q @ (S.T @ S) @ Q * scale
+    params = pd.Series(beta, index=endog + exog)
+
+    # First stage with the controls partialled out
+    if exog:
+        W = np.column_stack([col[c] for c in exog])
+        partial = np.column_stack([yv, X[:, :k1], Z[:, :L]])
+        partial = partial - W @ np.linalg.lstsq(W, partial, rcond=None)[0]
+        y_p, X_p, Z_p = partial[:, 0], partial[:, 1:1 + k1], partial[:, 1 + k1:]
+    else:
+        y_p, X_p, Z_p = yv, X[:, :k1], Z[:, :L]
+    ZZ_inv = np.linalg.pinv(Z_p.T @ Z_p)
+    Pi = ZZ_inv @ (Z_p.T @ X_p)                                     # (L, k1)
+    E = X_p - Z_p @ Pi
+    if cov_type == 'nonrobust':
+        V_pi = np.kron((E.T @ E) / n, ZZ_inv)
+    else:
+        # Scores of vec(Pi): e_i (x) z_i, ordered like vec(Pi) (column-major)
+        S_pi = _cluster_sums((E[:, :, None] * Z_p[:, None, :]).reshape(n, -1), groups, n_clusters)
+        bread = np.kron(np.eye(k1), ZZ_inv)
+        V_pi = bread @ (S_pi.T @ S_pi) @ bread
+    small = (n - n_inst - k_fe) / n * ((n_clusters - 1) / n_clusters if n_clusters else 1.0)
+
+    # Kleibergen-Paap rk Wald statistic for rank(Pi) = k1 - 1 vs k1: the
+    # normalized Theta = G^1/2' Pi F^1/2 with G = Z'Z / n, F F' = (E'E / n)^-1
+    Lg = np.linalg.cholesky(Z_p.T @ Z_p / n)
+    Lf = np.linalg.cholesky(np.linalg.inv(E.T @ E / n))
+    Theta = Lg.T @ Pi @ Lf
+    U, _, Vt = np.linalg.svd(Theta)
+    U2, V2 = U[:, k1 - 1:], Vt.T[:, k1 - 1:]
+    T = np.kron(V2, U2).T @ np.kron(Lf.T, Lg.T)
+    lam = T @ Pi.ravel(order='F')
+    kp_rk = lam @ np.linalg.solve(T @ V_pi @ T.T, lam)
+    kp_f = kp_rk / L * small
+
+    sigma_vv = E.T @ E / (n - n_inst - k_fe)
+    s_inv = np.linalg.inv(np.linalg.cholesky(sigma_vv))
+    cragg_donald_f = np.linalg.eigvalsh(s_inv @ (Pi.T @ Z_p.T @ Z_p @ Pi) @ s_inv.T)[0] / L
+
+    rows = []
+    for e_idx, name in enumerate(endog):
+        block = slice(e_idx * L, (e_idx + 1) * L)
+        pi_e = Pi[:, e_idx]
+        wald = pi_e @ np.linalg.solve(V_pi[block, block], pi_e)
+        partial_r2 = 1 - (E[:, e_idx] ** 2).sum() / (X_p[:, e_idx] ** 2).sum()
+        for i_idx, inst in enumerate(instruments):
+            se = np.sqrt(V_pi[e_idx * L + i_idx, e_idx * L + i_idx])
+            rows.append({'endog': name, 'instrument': inst, 'coef': pi_e[i_idx], 'se': se,
+                         'pval': 2 * special.ndtr(-abs(pi_e[i_idx] / se)),
+                         'partial_f': wald / L * small, 'partial_r2': partial_r2})
+
+    ssr = u @ u
+    tss = ((M[:, 0] - M[:, 0].mean()) ** 2).sum()
+    tss_within = yv @ yv if fe else tss
+    iv_data = {
+        'y': yv, 'X': X, 'Z': Z, 'X_hat': X_hat, 'Q': Q, 'groups': groups,
+        'n_clusters': n_clusters,
+        'y_p': y_p, 'X_p': X_p, 'Z_p': Z_p,
+        # AR regression of y - X beta0 on the instruments (controls partialled out)
+        'ar_dof': n - n_inst - k_fe,
+        'ar_scale': (n_clusters / (n_clusters - 1) * (n - 1) / (n - n_inst - k_fe)
+                     if cov_type == 'cluster' else n / (n - n_inst - k_fe) if cov_type == 'HC1' else 1.0),
+        'ar_t_dof': n_clusters - 1 if cov_type == 'cluster' else n - n_inst - k_fe,
+    }
+    return IVResults(
+        first_stage=pd.DataFrame(rows),
+        kp_rk=kp_rk,
+        kp_f=kp_f,
+        cragg_donald_f=cragg_donald_f,
+        instruments=instruments,
+        endog=endog,
+        iv_data=iv_data,
+        params=params,
+        cov=cov,
+        resid=pd.Series(u, index=df.index),
+        nobs=n,
+        df_resid=df_resid,
+        df_model=k + k_fe - (0 if fe else 1),
+        n_fe={c: levels for c, (_, levels) in zip(fe, fe_codes)},
+        rsquared=1 - ssr / tss if tss > 0 else np.nan,
+        rsquared_within=1 - ssr / tss_within if tss_within > 0 else np.nan,
+        cov_type=cov_type,
+        use_t=use_t,
+        n_clusters=n_clusters,
+        iterations=iterations,
+        dropped=dropped,
+    )
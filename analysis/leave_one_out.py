@@ -0,0 +1,270 @@
+"""
+Leave-one-cluster-out jackknife for FE regressions without refitting.
+
+Dropping cluster g (a firm, sector or state) from a regression with design
+W = [X, FE dummies] changes the estimates by the block DFBETA identity
+
+    theta_(-g) = theta - (W'W)^-1 W_g' (I - H_gg)^-1 e_g
+
+whose slope block is (X~'X~)^-1 X~_g' (I - H_gg)^-1 e_g, with X~ the FE-demeaned
+regressors and H_gg = X~_g (X~'X~)^-1 X~_g' + P_gg, where P is the FE
+projection. The columns of P belonging to cluster g come from demeaning the
+cluster's indicator columns, so every leave-out coefficient (and the
+leave-out residuals and demeaned regressors needed for its cluster-robust SE)
+follows from the full-sample fit in one pass over clusters. When the FE are
+nested in the cluster, I - H_gg is singular on the dropped FE direction and
+the pseudo-inverse gives the refit solution.
+
+CLI (writes analysis/output/leave_one_cluster_out_results.csv; the paper's
+leave_one_out_results.csv is not produced here):
+    python analysis/leave_one_out.py --spec 13                # presets: 02, 11, 12, 13
+    python analysis/leave_one_out.py --spec 02 --by "GICS Sector"
+    python analysis/leave_one_out.py --data panel.csv --y ln_scope2 --x post,did \\
+        --param did --fe ticker,year --by state [--output file.csv]
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from fixed_effects import absorbed_dof, demean, factorize_fe
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+OUTPUT_DIR = Path(__file__).parent / "output"
+
+
+def leave_one_cluster_out(data, y, x, param, fe=None, by='ticker', cluster=None):
+    """Coefficient on `param` with each `by` group left out, in closed form.
+
+    Args:
+        data: DataFrame
+        y: outcome column
+        x: regressor column(s)
+        param: the regressor to report (must be in x)
+        fe: fixed-effect column(s) to absorb (None = constant only)
+        by: column whose groups are dropped one at a time
+        cluster: cluster column for the leave-out SEs (default: `by`)
+
+    Returns (table, summary): one row per dropped group with the leave-out
+    coefficient, cluster-robust SE, p-value and sample size; and a dict with
+    the full-sample estimate, the jackknife SE and bias, and the largest
+    swings. Groups without which `param` is not identified get NaN and are
+    left out of the jackknife moments.
+    """
+    x = [x] if isinstance(x, str) else list(x)
+    fe = [fe] if isinstance(fe, str) else list(fe or [])
+    cluster = cluster or by
+    cols = list(dict.fromkeys([y] + x + fe + [by, cluster]))
+    df = data[cols].dropna().reset_index(drop=True)
+    n = len(df)
+
+    M = df[[y] + x].to_numpy(dtype=float)
+    if fe:
+        fe_codes = factorize_fe(df, fe)
+        M, _ = demean(M, fe_codes)
+        names = x
+    else:
+        fe_codes = []
+        M = np.column_stack([M[:, 0], np.ones(n), M[:, 1:]])
+        names = ['Intercept'] + x
+    y_t, X = M[:, 0], M[:, 1:]
+    k = X.shape[1]
+    j = names.index(param)
+
+    Q = np.linalg.pinv(X.T @ X)
+    beta = Q @ (X.T @ y_t)
+    e = y_t - X @ beta
+
+    by_codes, by_levels = pd.factorize(df[by], sort=True)
+    cl_codes = pd.factorize(df[cluster])[0]
+    rows_of = np.split(np.argsort(by_codes, kind='stable'),
+                       np.cumsum(np.bincount(by_codes))[:-1])
+
+    results = []
+    for g, idx in enumerate(rows_of):
+        n_g = len(idx)
+        # Columns of the FE projection for the dropped rows: P[:, g] = I[:, g] - M I[:, g]
+        if fe:
+            E = np.zeros((n, n_g))
+            E[idx, np.arange(n_g)] = 1.0
+            P = E - demean(E, fe_codes)[0]
+        else:
+            P = np.zeros((n, n_g))
+        Xg, eg, Pgg = X[idx], e[idx], P[idx]
+        I_g = np.eye(n_g)
+
+        U = np.linalg.pinv(I_g - Xg @ Q @ Xg.T - Pgg) @ eg
+        shift = Q @ (Xg.T @ U)
+        beta_g = beta - shift
+
+        # Leave-out demeaned regressors and residuals on the remaining rows
+        keep = np.ones(n, dtype=bool)
+        keep[idx] = False
+        X_o = X[keep] + P[keep] @ (np.linalg.pinv(I_g - Pgg) @ Xg)
+        r_o = e[keep] + X[keep] @ shift + P[keep] @ U
+
+        # Dropping the group can leave the regressors collinear (e.g. the only control firm)
+        if np.linalg.matrix_rank(X_o) < k:
+            results.append({'Dropped': by_levels[g], 'Coefficient': np.nan, 'SE': np.nan,
+                            'P_value': np.nan, 'N_obs': int(keep.sum())})
+            continue
+
+        groups, levels = pd.factorize(cl_codes[keep])
+        G = len(levels)
+        n_o = int(keep.sum())
+        k_fe = absorbed_dof([(pd.factorize(codes[keep])[0], len(np.unique(codes[keep])))
+                             for codes, _ in fe_codes]) if fe else 0
+        bread = np.linalg.pinv(X_o.T @ X_o)
+        scores = X_o * r_o[:, None]
+        S = np.column_stack([np.bincount(groups, weights=scores[:, i], minlength=G) for i in range(k)])
+        cov = bread @ (S.T @ S) @ bread
+        if G > 1 and n_o - k - k_fe > 0:
+            cov *= G / (G - 1) * (n_o - 1) / (n_o - k - k_fe)
+            se = np.sqrt(cov[j, j])
+        else:
+            se = np.nan
+
+        results.append({
+            'Dropped': by_levels[g],
+            'Coefficient': beta_g[j],
+            'SE': se,
+            'P_value': 2 * stats.norm.sf(abs(beta_g[j] / se)) if se > 0 else np.nan,
+            'N_obs': n_o,
+        })
+
+    table = pd.DataFrame(results)
+    identified = table['Coefficient'].notna()
+    coefs = table.loc[identified, 'Coefficient'].to_numpy()
+    dropped = table.loc[identified, 'Dropped']
+    G = len(coefs)
+    jk_mean = coefs.mean()
+    summary = {
+        'param': param,
+        'by': by,
+        'coef': beta[j],
+        'n_groups': len(table),
+        'n_unidentified': int((~identified).sum()),
+        'jackknife_se': np.sqrt((G - 1) / G * np.sum((coefs - jk_mean) ** 2)),
+        'jackknife_bias': (G - 1) * (jk_mean - beta[j]),
+        'min_coef': coefs.min(),
+        'min_dropped': dropped.iloc[int(np.argmin(coefs))],
+        'max_coef': coefs.max(),
+        'max_dropped': dropped.iloc[int(np.argmax(coefs))],
+    }
+    table['Change'] = table['Coefficient'] - beta[j]
+    return table, summary
+
+
+# =============================================================================
+# Presets: the treatment coefficients of 02, 11, 12 and 13
+# =============================================================================
+
+def spec_02():
+    """02_diff_in_diff_analysis.py Model 2: log emissions ~ treatment + firm FE + year FE."""
+    from data_access import load_emissions_panel
+
+    df = load_emissions_panel()
+    df['post_chatgpt'] = (df['year'] >= 2023).astype(int)
+    df['high_ai_exposure'] = (df['ai_exposure'] >= df['ai_exposure'].median()).astype(int)
+    df['treatment'] = df['high_ai_exposure'] * df['post_chatgpt']
+    df['log_emissions'] = np.log(df['total_emissions'] + 1)
+    df['GICS Sector'] = df['GICS Sector'].astype(object).fillna(df['ticker'].astype(object))
+    return dict(data=df, y='log_emissions', x=['treatment'], param='treatment', fe=['ticker', 'year'])
+
+
+def _scope2_template():
+    from data_access import load_scope2_panel
+
+    df = load_scope2_panel('top50')
+    df['scope2'] = df['scope2_location_mt'].fillna(df['scope2_market_mt'])
+    df['total_emissions'] = df['total_mt'].fillna(df['scope1_mt'].fillna(0) + df['scope2'])
+    df['ln_total'] = np.log(df['total_emissions'].replace(0, np.nan))
+    df['ln_scope2'] = np.log(df['scope2'].replace(0, np.nan))
+    return df
+
+
+def spec_11():
+    """11_scope2_did_analysis.py Model 2: ln_total ~ treated + did + year FE (AI builders vs control)."""
+    ai_builders = ['MSFT', 'GOOGL', 'META', 'AMZN', 'AAPL', 'NVDA', 'ORCL', 'IBM', 'CRM', 'CSCO',
+                   'INTC', 'AMD', 'NOW', 'SNOW', 'PLTR', 'EQIX', 'DLR', 'AMT', 'CCI', 'SBAC']
+    control = ['XOM', 'CVX', 'COP', 'NEE', 'DUK', 'SO', 'CAT', 'DE', 'LMT', 'PG', 'KO', 'PEP',
+               'WMT', 'HD', 'MCD']
+    df = _scope2_template()
+    df = df[df['ticker'].isin(ai_builders + control) & df['ln_total'].notna()].copy()
+    df['treated'] = df['ticker'].isin(ai_builders).astype(int)
+    df['did'] = df['treated'] * (df['year'] >= 2023).astype(int)
+    return dict(data=df, y='ln_total', x=['treated', 'did'], param='did', fe=['year'])
+
+
+def spec_12():
+    """12_scope2_did_refined.py: cloud builders vs Apple, ln_scope2 ~ post + did + firm FE."""
+    df = _scope2_template()
+    df = df[df['ticker'].isin(['MSFT', 'GOOGL', 'META', 'AMZN', 'AAPL']) & df['scope2'].notna()].copy()
+    df['post_gpt'] = (df['year'] >= 2023).astype(int)
+    df['did'] = df['ticker'].isin(['MSFT', 'GOOGL', 'META', 'AMZN']).astype(int) * df['post_gpt']
+    return dict(data=df, y='ln_scope2', x=['post_gpt', 'did'], param='did', fe=['ticker'])
+
+
+def spec_13():
+    """13_scope2_expanded_analysis.py: balanced 2019-2023 panel, ln_scope2 ~ post + did + firm FE."""
+    from data_access import load_scope2_panel
+
+    df = load_scope2_panel('expanded')
+    years_needed = [2019, 2020, 2021, 2022, 2023]
+    df = df[df['year'].isin(years_needed)]
+    df = df[df.groupby('ticker', observed=True)['year'].transform(lambda s: set(years_needed).issubset(s))].copy()
+    ai_builders = ['MSFT', 'GOOGL', 'META', 'AMZN', 'ORCL', 'IBM', 'INTC']
+    df['post_chatgpt'] = (df['year'] >= 2023).astype(int)
+    df['did'] = df['ticker'].isin(ai_builders).astype(int) * df['post_chatgpt']
+    df['ln_scope2'] = np.log(df['scope2_location_mt'].replace(0, np.nan))
+    return dict(data=df, y='ln_scope2', x=['post_chatgpt', 'did'], param='did', fe=['ticker'])
+
+
+SPECS = {'02': spec_02, '11': spec_11, '12': spec_12, '13': spec_13}
+
+
+def main(args):
+    def option(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    if '--spec' in args:
+        spec = SPECS[option('--spec')]()
+        label = f"spec {option('--spec')}"
+    else:
+        spec = dict(data=pd.read_csv(option('--data')), y=option('--y'),
+                    x=option('--x').split(','), param=option('--param'),
+                    fe=option('--fe').split(',') if option('--fe') else None)
+        label = option('--data')
+    by = option('--by', 'ticker')
+    output = Path(option('--output', OUTPUT_DIR / "leave_one_cluster_out_results.csv"))
+
+    print("=" * 60)
+    print(f"LEAVE-ONE-OUT JACKKNIFE: {spec['param']} ({label}), dropping each {by}")
+    print("=" * 60)
+
+    table, summary = leave_one_cluster_out(spec['data'], spec['y'], spec['x'], spec['param'],
+                                           fe=spec['fe'], by=by, cluster=option('--cluster'))
+    print(f"\nFull-sample coefficient: {summary['coef']:+.4f}")
+    print(f"Groups dropped: {summary['n_groups']}")
+    if summary['n_unidentified']:
+        print(f"  {summary['n_unidentified']} not identified without the group (excluded from the jackknife)")
+    print(f"Jackknife SE: {summary['jackknife_se']:.4f}  (bias {summary['jackknife_bias']:+.4f})")
+    print(f"Range: {summary['min_coef']:+.4f} (without {summary['min_dropped']}) to "
+          f"{summary['max_coef']:+.4f} (without {summary['max_dropped']})")
+
+    print("\nMost influential groups:")
+    top = table.reindex(table['Change'].abs().sort_values(ascending=False).index).head(10)
+    for _, row in top.iterrows():
+        print(f"  {str(row['Dropped']):25s} {row['Coefficient']:+.4f} (SE {row['SE']:.4f}, "
+              f"p = {row['P_value']:.3f}, change {row['Change']:+.4f})")
+
+    table.to_csv(output, index=False)
+    print(f"\nSaved: {output}")
+    return table, summary
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
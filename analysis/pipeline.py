@@ -0,0 +1,524 @@
+"""
+Pipeline runner for the processing scripts and numbered analyses.
+
+Every stage declares the script it runs, the files it reads ('inputs', plus
+'optional' ones the script can do without) and the files it writes (paths
+relative to the project root; inputs may be glob patterns, and a directory
+output covers everything below it). A stage depends on every
+stage that writes one of its inputs, which gives the DAG, e.g.
+
+    build_ai_exposure_index -> 04_new_strategies, 08_kaggle_esg_analysis
+    process_cdp_scope2 -> 03_scope2_analysis
+    process_ghgrp_all_years -> emissions_store -> 01, 02, 03, 04, 06, 10, ...
+
+A stage is up to date when the SHA-256 of its inputs, of its code (the script
+and every local module it imports, found by walking the imports) and of its
+arguments match the manifest of its last successful run, and its outputs are
+unchanged. Files are re-hashed only when their size or mtime changed. Stale
+stages (and everything downstream of what they rewrite) run as subprocesses,
+up to --workers at a time as soon as their upstream stages finish; a failed
+stage blocks its dependents but not independent branches. Stages marked
+'pooled' run their own process pool and take --workers; each gets
+cpu_count // --workers processes so concurrent stages do not oversubscribe
+the CPU (every other stage runs single-process). A stage whose
+source data is not on this machine (an input no stage produces) is reported
+as unavailable and its existing outputs are used downstream. Logs go to
+analysis/.pipeline/logs/<stage>.log.
+
+Each run records a stage trace (see scripts/instrumentation.py) in
+analysis/.pipeline/trace.jsonl: one event per stage with its wall time, CPU
+time and peak RSS, plus the events the scripts record themselves (Excel
+parsing, matching, cache hits, regressions, figures). A summary table is
+printed at the end and the trace is exported for chrome://tracing or
+ui.perfetto.dev as analysis/.pipeline/trace.chrome.json.
+
+Usage:
+    python analysis/pipeline.py [run] [all | STAGE ...] [--workers N] [--force] [--dry-run]
+    python analysis/pipeline.py list       # stages, dependencies and status
+"""
+
+import ast
+import fnmatch
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+import instrumentation
+
+PROJECT_ROOT = Path(__file__).parent.parent
+STATE_DIR = Path(__file__).parent / ".pipeline"
+MANIFEST_PATH = STATE_DIR / "manifest.json"
+LOG_DIR = STATE_DIR / "logs"
+TRACE_PATH = STATE_DIR / "trace.jsonl"
+CHROME_TRACE_PATH = STATE_DIR / "trace.chrome.json"
+MODULE_DIRS = [PROJECT_ROOT / "analysis", PROJECT_ROOT / "scripts"]
+
+OUT = "analysis/output/"
+SP500 = "data/sp500_constituents.csv"
+STORE = "data/epa_ghgrp/store"
+COMPANY_CSV = "data/epa_ghgrp/processed/ghgrp_company_year_sp500_all_years.csv"
+FACILITY_CSV = "data/epa_ghgrp/processed/ghgrp_facilities_sp500_all_years.csv"
+SCOPE2_EXPANDED = "data/scope2_manual/sp500_scope2_expanded.csv"
+SCOPE2_TOP50 = "data/scope2_manual/top50_scope2_template.csv"
+
+STAGES = {
+    # Data processing
+    'build_ai_exposure_index': {
+        'script': "scripts/build_ai_exposure_index.py",
+        'inputs': ["data/ai_exposure/onet_*.txt", SP500],
+        'outputs': [OUT + "ai_exposure_by_occupation.csv", OUT + "ai_exposure_by_sector.csv",
+                    OUT + "ai_exposure_sp500.csv"],
+    },
+    'process_ghgrp_all_years': {
+        'script': "scripts/process_ghgrp_all_years.py",
+        'pooled': True,
+        'inputs': ["data/epa_ghgrp/raw/2023 Data Summary Spreadsheets/ghgp_data_*.xlsx",
+                   "data/epa_ghgrp/raw/EPA Parent Company Data.xlsb", SP500],
+        'outputs': ["data/epa_ghgrp/processed/ghgrp_facilities_all_years.csv", FACILITY_CSV,
+                    "data/epa_ghgrp/processed/ghgrp_parent_ownership_history.csv", COMPANY_CSV,
+                    "data/epa_ghgrp/processed/ghgrp_company_year_sp500_equity_all_years.csv"],
+    },
+    'emissions_store': {
+        'script': "scripts/emissions_store.py",
+        'inputs': [FACILITY_CSV, COMPANY_CSV],
+        'outputs': [STORE],
+    },
+    'process_cdp_scope2': {
+        'script': "scripts/process_cdp_scope2.py",
+        'inputs': ["data/cdp/2010_2013_carbon_action_emissions.csv", "data/cdp/*_global500_emissions.csv",
+                   SP500, COMPANY_CSV],
+        'outputs': [OUT + "cdp_emissions_sp500.csv", OUT + "emissions_combined_panel.csv"],
+    },
+    # Numbered analyses
+    '01_emissions_analysis': {
+        'script': "analysis/01_emissions_analysis.py",
+        'inputs': [STORE, SP500],
+        'outputs': [OUT + f"fig{i}_{name}.png" for i, name in
+                    [(1, 'emissions_trends'), (2, 'sector_changes'), (3, 'change_distribution'),
+                     (4, 'top_emitters')]]
+                   + [OUT + "firm_emissions_changes.csv", OUT + "yearly_summary.csv",
+                      OUT + "sector_year_summary.csv"],
+    },
+    '02_diff_in_diff_analysis': {
+        'script': "analysis/02_diff_in_diff_analysis.py",
+        'inputs': [STORE, SP500],
+        'outputs': [OUT + "fig5_parallel_trends.png", OUT + "fig6_sector_heterogeneity.png",
+                    OUT + "did_regression_results.csv", OUT + "did_heterogeneity_by_group.csv",
+                    OUT + "did_heterogeneity_failures.csv", OUT + "event_study_coefficients.csv",
+                    OUT + "did_analysis_data.csv"],
+    },
+    '03_scope2_analysis': {
+        'script': "analysis/03_scope2_analysis.py",
+        'inputs': [OUT + "cdp_emissions_sp500.csv", STORE],
+        'outputs': [OUT + "fig7_scope2_analysis.png", OUT + "fig8_ghgrp_gap.png",
+                    OUT + "bigtech_emissions_scope12.csv"],
+    },
+    '04_new_strategies': {
+        'script': "analysis/04_new_strategies.py",
+        'inputs': [SP500, OUT + "ai_exposure_by_sector.csv", STORE,
+                   "data/ken_french/F-F_Research_Data_Factors_daily.csv"],
+        'optional': ["data/stocks/*_prices.csv", "data/eia_861/*.csv"],
+        'outputs': [OUT + "fig9_builder_vs_user.png", OUT + "fig10_esg_scissors_pattern.png",
+                    OUT + "fig11_data_center_hubs.png", OUT + "sp500_ai_classification.csv",
+                    OUT + "big_tech_emissions_panel.csv", OUT + "strategy_summary.csv"],
+    },
+    '05_utility_electricity_analysis': {
+        'script': "analysis/05_utility_electricity_analysis.py",
+        'inputs': [],
+        'outputs': [OUT + "fig12_utility_electricity_analysis.png", OUT + "dc_electricity_panel.csv",
+                    OUT + "utility_event_study.csv", OUT + "utility_did_results.csv"],
+    },
+    '06_big_tech_deep_dive': {
+        'script': "analysis/06_big_tech_deep_dive.py",
+        'inputs': [STORE],
+        'outputs': [OUT + "fig13_big_tech_deep_dive.png", OUT + "big_tech_emissions_full_panel.csv",
+                    OUT + "big_tech_emissions_summary.csv"],
+    },
+    '07_esg_trajectory_analysis': {
+        'script': "analysis/07_esg_trajectory_analysis.py",
+        'inputs': ["data/esg_scores/big_tech_esg_manual.csv", OUT + "big_tech_emissions_full_panel.csv"],
+        'outputs': [OUT + "fig14_esg_trajectories.png", OUT + "fig15_emissions_vs_esg.png",
+                    OUT + "big_tech_esg_summary.csv"],
+    },
+    '08_kaggle_esg_analysis': {
+        'script': "analysis/08_kaggle_esg_analysis.py",
+        'inputs': ["data/kaggle_esg/SP 500 ESG Risk Ratings.csv", OUT + "ai_exposure_by_sector.csv"],
+        'outputs': [OUT + "fig16_kaggle_esg_by_sector.png", OUT + "fig17_esg_pillar_decomposition.png",
+                    OUT + "fig18_big_tech_esg_detail.png", OUT + "kaggle_esg_processed.csv"],
+    },
+    '09_multi_source_esg_analysis': {
+        'script': "analysis/09_multi_source_esg_analysis.py",
+        'inputs': ["data/kaggle_esg/SP 500 ESG Risk Ratings.csv", "data/esg_scores/fortune_most_admired.csv",
+                   "data/esg_scores/newsweek_responsible.csv", "data/esg_scores/big_tech_esg_manual.csv"],
+        'outputs': [OUT + "fig19_multi_source_esg_comparison.png",
+                    OUT + "fig19_multi_source_esg_comparison.pdf"],
+    },
+    '10_anticipation_effects': {
+        'script': "analysis/10_anticipation_effects.py",
+        'inputs': [STORE, SP500, "data/data_centers/*.csv"],
+        'outputs': [OUT + "break_scan_results.csv", OUT + "staggered_did_group_time.csv",
+                    OUT + "staggered_did_event_time.csv", OUT + "fig20_anticipation_effects.png",
+                    OUT + "fig20_anticipation_effects.pdf"],
+    },
+    '11_scope2_did_analysis': {
+        'script': "analysis/11_scope2_did_analysis.py",
+        'inputs': [SCOPE2_TOP50],
+        'outputs': [OUT + "scope2_did_analysis.png", OUT + "scope2_did_analysis.pdf",
+                    OUT + "scope2_did_results.csv"],
+    },
+    '12_scope2_did_refined': {
+        'script': "analysis/12_scope2_did_refined.py",
+        'inputs': [SCOPE2_TOP50],
+        'outputs': [OUT + "scope2_did_refined.png", OUT + "scope2_did_refined.pdf"],
+    },
+    '13_scope2_expanded_analysis': {
+        'script': "analysis/13_scope2_expanded_analysis.py",
+        'inputs': [SCOPE2_EXPANDED],
+        'outputs': [OUT + "scope2_expanded_analysis.png"],
+    },
+    '14_iv_data_center_analysis': {
+        'script': "analysis/14_iv_data_center_analysis.py",
+        'inputs': ["data/data_centers/*.csv", "data/eia_861/dc_electricity_estimates.csv"],
+        'outputs': [OUT + "fig21_iv_data_center_analysis.png", OUT + "iv_results_summary.csv"],
+    },
+    # Robustness modules with a CLI. randomization_inference re-runs the paper's
+    # placebo table (placebo_results.csv) with permutation p-values;
+    # leave_one_out writes its own table, not the paper's leave_one_out_results.csv
+    'spec_curve': {
+        'script': "analysis/spec_curve.py",
+        'pooled': True,
+        'inputs': [STORE, SP500],
+        'outputs': [OUT + "spec_curve_results.csv", OUT + "fig_spec_curve.png"],
+    },
+    'ppml': {
+        'script': "analysis/ppml.py",
+        'inputs': [STORE, SP500],
+        'outputs': [OUT + "ppml_results.csv"],
+    },
+    'randomization_inference': {
+        'script': "analysis/randomization_inference.py",
+        'pooled': True,
+        'inputs': [SCOPE2_EXPANDED],
+        'outputs': [OUT + "placebo_results.csv", OUT + "placebo_ri_distribution.csv"],
+    },
+    'leave_one_out': {
+        'script': "analysis/leave_one_out.py",
+        'args': ["--spec", "13"],
+        'inputs': [SCOPE2_EXPANDED],
+        'outputs': [OUT + "leave_one_cluster_out_results.csv"],
+    },
+    'synthetic_control': {
+        'script': "analysis/synthetic_control.py",
+        'pooled': True,
+        'inputs': [SCOPE2_EXPANDED],
+        'outputs': [OUT + "synthetic_control_results.csv", OUT + "synthetic_control_placebos.csv",
+                    OUT + "fig_synthetic_control.png"],
+    },
+}
+
+
+def _covers(output, path):
+    """Whether a declared output (file or directory) produces `path` or pattern."""
+    return output == path or path.startswith(output + "/") or fnmatch.fnmatch(output, path)
+
+
+def build_dag(stages=STAGES):
+    """Upstream stages of every stage, and a topological order (raises on cycles)."""
+    upstream = {name: sorted({other for inp in stage['inputs'] + stage.get('optional', [])
+                              for other, o_stage in stages.items() if other != name
+                              for out in o_stage['outputs'] if _covers(out, inp)})
+                for name, stage in stages.items()}
+    order, state = [], {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"dependency cycle: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for dep in upstream[name]:
+            visit(dep, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in stages:
+        visit(name, [])
+    return upstream, order
+
+
+def local_imports(script):
+    """The script plus every module under analysis/ or scripts/ it imports, transitively."""
+    seen, todo = [], [Path(script)]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        for node in ast.walk(ast.parse(path.read_text(), filename=str(path))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                for directory in MODULE_DIRS:
+                    candidate = directory / f"{name.split('.')[0]}.py"
+                    if candidate.exists():
+                        todo.append(candidate)
+                        break
+    return sorted(seen)
+
+
+class Hasher:
+    """SHA-256 of files, reusing the recorded digest while size and mtime are unchanged."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def file(self, path):
+        stat = path.stat()
+        key = str(path.relative_to(PROJECT_ROOT))
+        old = self.cache.get(key)
+        if old and old['size'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns:
+            return old['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        self.cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                           'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def paths(self, patterns):
+        """{relative path: digest} for every file matched by the patterns ('missing' if none)."""
+        digests = {}
+        for pattern in patterns:
+            target = PROJECT_ROOT / pattern
+            if target.is_dir():
+                files = [p for p in target.rglob('*') if p.is_file()]
+            elif any(ch in pattern for ch in '*?['):
+                files = list(PROJECT_ROOT.glob(pattern))
+            else:
+                files = [target] if target.exists() else []
+            if not files:
+                digests[pattern] = 'missing'
+            for path in sorted(files):
+                digests[str(path.relative_to(PROJECT_ROOT))] = self.file(path)
+        return digests
+
+
+def stage_key(name, hasher, stages=STAGES):
+    """Combined hash of a stage's code, arguments and inputs."""
+    stage = stages[name]
+    digest = hashlib.sha256()
+    for path in local_imports(PROJECT_ROOT / stage['script']):
+        digest.update(f"code:{path.relative_to(PROJECT_ROOT)}:{hasher.file(path)}\n".encode())
+    digest.update(f"args:{json.dumps(stage.get('args', []))}\n".encode())
+    for path, file_digest in sorted(hasher.paths(stage['inputs'] + stage.get('optional', [])).items()):
+        digest.update(f"input:{path}:{file_digest}\n".encode())
+    return digest.hexdigest()
+
+
+def missing_sources(name, hasher, stages=STAGES):
+    """Required inputs that no stage produces and that do not exist."""
+    produced = [out for other, stage in stages.items() if other != name for out in stage['outputs']]
+    return [inp for inp in stages[name]['inputs']
+            if not any(_covers(out, inp) for out in produced)
+            and hasher.paths([inp]).get(inp) == 'missing']
+
+
+def stale_reason(name, key, manifest, hasher, stages=STAGES):
+    """Why a stage must run (None if it is up to date)."""
+    record = manifest['stages'].get(name)
+    if record is None:
+        return "never run"
+    if record['key'] != key:
+        return "code or inputs changed"
+    outputs = hasher.paths(stages[name]['outputs'])
+    if any(d == 'missing' for d in outputs.values()):
+        return "outputs missing"
+    if outputs != record['outputs']:
+        return "outputs modified"
+    return None
+
+
+def load_manifest():
+    if MANIFEST_PATH.exists():
+        return json.loads(MANIFEST_PATH.read_text())
+    return {'files': {}, 'stages': {}}
+
+
+def save_manifest(manifest):
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_suffix('.json.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _run_stage(name, stage, pool_workers=1):
+    """Run one stage's script in a subprocess; returns (returncode, seconds).
+
+    A 'pooled' stage is passed --workers pool_workers. The child's CPU time
+    and peak RSS come from wait4 where available.
+    """
+    args = list(stage.get('args', []))
+    if stage.get('pooled'):
+        args += ['--workers', str(pool_workers)]
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    with instrumentation.stage(name, kind='pipeline_stage') as s, open(LOG_DIR / f"{name}.log", 'w') as log:
+        proc = subprocess.Popen([sys.executable, stage['script']] + args,
+                                cwd=PROJECT_ROOT, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, 'wait4'):
+            _, wait_status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(wait_status)
+            s.cpu_s = usage.ru_utime + usage.ru_stime
+            s.peak_rss_mb = instrumentation.maxrss_mb(usage.ru_maxrss)
+        else:
+            proc.wait()
+        s.attrs['returncode'] = proc.returncode
+    return proc.returncode, time.perf_counter() - start
+
+
+def run(targets=None, workers=None, force=False, dry_run=False, stages=STAGES):
+    """Bring `targets` (default: every stage) and their upstream stages up to date.
+
+    Returns {stage: status} with status 'up to date', 'ran', 'failed',
+    'blocked' (an upstream stage failed), 'unavailable' (source data missing;
+    existing outputs are kept) or 'stale' (dry run).
+    """
+    upstream, order = build_dag(stages)
+    unknown = [t for t in targets or [] if t not in stages]
+    if unknown:
+        raise ValueError(f"unknown stage(s): {', '.join(unknown)}")
+    wanted = set(targets or stages)
+    for name in reversed(order):
+        if name in wanted:
+            wanted.update(upstream[name])
+    pending = [name for name in order if name in wanted]
+
+    manifest = load_manifest()
+    hasher = Hasher(manifest['files'])
+    status = {}
+    workers = workers or os.cpu_count() or 1
+    pool_workers = max(1, (os.cpu_count() or 1) // workers)
+    running = {}
+    start = time.perf_counter()
+    trace = None if dry_run else instrumentation.start_trace(TRACE_PATH)
+
+    def check(name):
+        """Decide a ready stage: skip, mark, or submit it."""
+        if any(status[dep] in ('failed', 'blocked') for dep in upstream[name] if dep in status):
+            status[name] = 'blocked'
+            print(f"  {name:34} blocked (upstream failed)")
+            return
+        missing = missing_sources(name, hasher, stages)
+        if missing:
+            # Source data not on this machine: keep the existing outputs
+            status[name] = 'unavailable'
+            print(f"  {name:34} unavailable (missing {missing[0]}{' ...' if len(missing) > 1 else ''})")
+            return
+        key = stage_key(name, hasher, stages)
+        reason = "forced" if force else stale_reason(name, key, manifest, hasher, stages)
+        if reason is None:
+            status[name] = 'up to date'
+            print(f"  {name:34} up to date")
+        elif dry_run:
+            status[name] = 'stale'
+            print(f"  {name:34} would run ({reason})")
+        else:
+            print(f"  {name:34} running ({reason})")
+            running[pool.submit(_run_stage, name, stages[name], pool_workers)] = (name, key)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            ready = [n for n in pending if all(dep in status or dep not in wanted for dep in upstream[n])]
+            for name in ready:
+                pending.remove(name)
+                check(name)
+            if not running:
+                if pending and not ready:
+                    raise RuntimeError(f"unschedulable stages: {pending}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key = running.pop(future)
+                code, seconds = future.result()
+                if code == 0:
+                    status[name] = 'ran'
+                    manifest['stages'][name] = {'key': key, 'seconds': round(seconds, 2),
+                                                'outputs': hasher.paths(stages[name]['outputs'])}
+                    print(f"  {name:34} done in {seconds:.1f}s")
+                else:
+                    status[name] = 'failed'
+                    manifest['stages'].pop(name, None)
+                    print(f"  {name:34} FAILED (exit {code}; see {LOG_DIR / (name + '.log')})")
+                save_manifest(manifest)
+
+    save_manifest(manifest)
+    counts = {s: list(status.values()).count(s) for s in dict.fromkeys(status.values())}
+    print(f"\n{len(status)} stages in {time.perf_counter() - start:.1f}s: "
+          + ", ".join(f"{n} {s}" for s, n in counts.items()))
+    if trace is not None:
+        instrumentation.flush(summary=False)
+        events = instrumentation.read_trace(trace)
+        if events:
+            print()
+            instrumentation.print_summary(events, title=f"STAGE TIMINGS ({len(events)} events)")
+            instrumentation.export_chrome_trace(events, CHROME_TRACE_PATH)
+            print(f"\nTrace: {trace}\nChrome trace: {CHROME_TRACE_PATH}")
+    return status
+
+
+def list_stages(stages=STAGES):
+    """Print every stage with its dependencies and whether it is up to date."""
+    upstream, order = build_dag(stages)
+    manifest = load_manifest()
+    hasher = Hasher(manifest['files'])
+    for name in order:
+        if missing_sources(name, hasher, stages):
+            state = 'unavailable'
+        else:
+            reason = stale_reason(name, stage_key(name, hasher, stages), manifest, hasher, stages)
+            state = 'up to date' if reason is None else 'stale: ' + reason
+        print(f"  {name:34} {state:28} <- {', '.join(upstream[name]) or '-'}")
+    save_manifest(manifest)
+
+
+def main(args):
+    def option(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    flags = {'--workers': 1, '--force': 0, '--dry-run': 0}
+    positional, skip = [], 0
+    for arg in args:
+        if skip:
+            skip -= 1
+        elif arg in flags:
+            skip = flags[arg]
+        else:
+            positional.append(arg)
+    command = positional.pop(0) if positional and positional[0] in ('run', 'list') else 'run'
+
+    print("=" * 60)
+    print("ANALYSIS PIPELINE")
+    print("=" * 60)
+    if command == 'list':
+        list_stages()
+        return None
+    targets = [t for t in positional if t != 'all'] or None
+    workers = int(option('--workers')) if '--workers' in args else None
+    status = run(targets, workers=workers, force='--force' in args, dry_run='--dry-run' in args)
+    return status
+
+
+if __name__ == "__main__":
+    status = main(sys.argv[1:])
+    sys.exit(1 if status and 'failed' in status.values() else 0)
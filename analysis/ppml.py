@@ -0,0 +1,256 @@
+"""
+Poisson pseudo-maximum likelihood (PPML) with absorbed fixed effects.
+
+Emissions are modelled in levels, E[y | x, FE] = exp(x'b + FE), so zero and
+small emitters enter as they are instead of through log(y + 1), and facility
+rows can be used directly. The estimator follows the ppmlhdfe approach
+(Correia, Guimaraes & Zylkin 2020): IRLS where each step is a weighted
+least-squares problem on the working outcome, with the FE swept out by
+weighted alternating projections (fixed_effects.demean). The inner tolerance
+starts loose and tightens with the outer convergence, and each inner solve
+is warm-started from the previous iteration's demeaned columns: since the
+previous residual differs from the raw column only by FE terms, demeaning it
+under the new weights gives the same result in far fewer sweeps.
+
+Observations in FE groups whose outcome is zero throughout are dropped before
+fitting (their FE diverge to -inf and they carry no information on b).
+
+    from ppml import ppml
+    model = ppml(facilities, 'total_emissions', ['treatment'],
+                 fe=['facility_id', 'year'], cluster='ticker')
+    model.params['treatment'], model.bse['treatment']
+
+CLI (writes analysis/output/ppml_results.csv):
+    python analysis/ppml.py                  # company- and facility-level AI-exposure DiD
+    python analysis/ppml.py --data all_facilities.csv --x treatment \\
+        --fe facility_id,year --cluster parent_company [--y total_emissions] [--output file.csv]
+"""
+
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fixed_effects import FEOLSResults, demean, factorize_fe
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+OUTPUT_DIR = Path(__file__).parent / "output"
+
+
+class PPMLResults(FEOLSResults):
+    """FEOLSResults with the PPML fit: fitted means, deviance and dropped observations."""
+
+    def __init__(self, mu, deviance, converged, n_separated, inner_iterations, **kwargs):
+        super().__init__(**kwargs)
+        self.mu = mu
+        self.deviance = deviance
+        self.converged = converged
+        self.n_separated = n_separated
+        self.inner_iterations = inner_iterations
+
+    def __repr__(self):
+        fe = ', '.join(f"{k} ({v})" for k, v in self.n_fe.items()) or 'none'
+        return (f"PPMLResults(nobs={self.nobs}, FE: {fe}, cov_type={self.cov_type}, "
+                f"pseudo R2={self.rsquared:.4f})\n{self.summary_frame().round(4)}")
+
+
+def drop_separated(y, fe_codes):
+    """Mask of observations outside FE groups with an all-zero outcome (applied until stable)."""
+    keep = np.ones(len(y), dtype=bool)
+    while True:
+        drop = np.zeros(len(y), dtype=bool)
+        for codes, n in fe_codes:
+            totals = np.bincount(codes[keep], weights=y[keep], minlength=n)
+            drop |= keep & (totals[codes] <= 0)
+        if not drop.any():
+            return keep
+        keep &= ~drop
+
+
+def ppml(data, y, x, fe, cluster=None, cov_type=None, tol=1e-8, maxiter=100,
+         demean_tol=1e-10):
+    """Poisson PML of `y` (levels, >= 0) on `x` absorbing the fixed effects in `fe`.
+
+    Args:
+        data: DataFrame
+        y: non-negative outcome column
+        x: regressor column(s)
+        fe: fixed-effect column(s) to absorb
+        cluster: column to cluster SEs on (implies cov_type='cluster')
+        cov_type: 'HC0', 'HC1' or 'cluster' (default HC1, or cluster when `cluster` is given)
+        tol: convergence tolerance on the relative change in deviance
+
+    Clustered SEs use the G / (G - 1) small-sample factor, as in ppmlhdfe.
+    Regressors collinear with the FE are dropped and listed in `.dropped`.
+    If IRLS stops at `maxiter` before converging, a RuntimeWarning is issued
+    and `.converged` is False.
+    """
+    x = [x] if isinstance(x, str) else list(x)
+    fe = [fe] if isinstance(fe, str) else list(fe)
+    cov_type = cov_type or ('cluster' if cluster is not None else 'HC1')
+    if cov_type not in ('HC0', 'HC1', 'cluster'):
+        raise ValueError(f"cov_type must be 'HC0', 'HC1' or 'cluster', got {cov_type!r}")
+    if cov_type == 'cluster' and cluster is None:
+        raise ValueError("cov_type='cluster' requires a cluster column")
+
+    cols = [y] + x + fe + ([cluster] if cluster is not None else [])
+    df = data[list(dict.fromkeys(cols))].dropna()
+    if (df[y] < 0).any():
+        raise ValueError(f"PPML needs a non-negative outcome; {y!r} has negative values")
+    keep = drop_separated(df[y].to_numpy(dtype=float), factorize_fe(df, fe))
+    n_separated = int((~keep).sum())
+    df = df[keep]
+    n = len(df)
+
+    yv = df[y].to_numpy(dtype=float)
+    X = df[x].to_numpy(dtype=float)
+    fe_codes = factorize_fe(df, fe)
+
+    # Regressors with no variation within the FE are dropped (same rule as feols)
+    X_dm, _ = demean(X, fe_codes, tol=demean_tol)
+    varies = np.abs(X_dm).max(axis=0) > 1e-9 * np.maximum(np.abs(X).max(axis=0), 1.0)
+    dropped = [name for name, v in zip(x, varies) if not v]
+    X, X_dm, names = X[:, varies], X_dm[:, varies], [name for name, v in zip(x, varies) if v]
+    k = X.shape[1]
+
+    mu = (yv + yv.mean()) / 2
+    eta = np.log(mu)
+    z_prev = z_dm = None
+    deviance = np.inf
+    inner = 0
+    converged = False
+    change = 1.0
+    for iteration in range(1, maxiter + 1):
+        z = eta + (yv - mu) / mu
+        # Warm start: previous demeaned columns differ from the raw ones only by FE terms;
+        # the inner tolerance tightens as the outer loop converges
+        start = np.column_stack([z if z_prev is None else z - z_prev + z_dm, X_dm])
+        inner_tol = max(demean_tol, min(1e-4, change / 10))
+        M, sweeps = demean(start, fe_codes, weights=mu, tol=inner_tol)
+        inner += sweeps
+        z_prev, z_dm, X_dm = z, M[:, 0], M[:, 1:]
+
+        sw = np.sqrt(mu)
+        beta = np.linalg.lstsq(X_dm * sw[:, None], z_dm * sw, rcond=None)[0]
+        eta = z - (z_dm - X_dm @ beta)
+        mu = np.exp(eta)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_ratio = np.where(yv > 0, yv * np.log(yv / mu), 0.0)
+        new_deviance = 2 * np.sum(log_ratio - (yv - mu))
+        change = abs(new_deviance - deviance) / max(abs(new_deviance), 0.1)
+        deviance = new_deviance
+        if change < tol and inner_tol <= demean_tol:
+            converged = True
+            break
+    if not converged:
+        warnings.warn(f"PPML did not converge in {maxiter} IRLS iterations "
+                      f"(relative deviance change {change:.2e}, tol {tol:.0e})",
+                      RuntimeWarning, stacklevel=2)
+
+    # Score and Hessian pieces at the final weights
+    X_dm, sweeps = demean(X_dm, fe_codes, weights=mu, tol=demean_tol)
+    inner += sweeps
+    resid = yv - mu
+    bread = np.linalg.pinv((X_dm * mu[:, None]).T @ X_dm)
+    scores = X_dm * resid[:, None]
+    n_clusters = None
+    if cov_type == 'cluster':
+        groups, levels = pd.factorize(df[cluster])
+        n_clusters = len(levels)
+        S = np.column_stack([np.bincount(groups, weights=scores[:, j], minlength=n_clusters)
+                             for j in range(k)])
+        cov = bread @ (S.T @ S) @ bread * n_clusters / (n_clusters - 1)
+    else:
+        cov = bread @ (scores.T @ scores) @ bread
+        if cov_type == 'HC1':
+            cov *= n / (n - k)
+
+    return PPMLResults(
+        mu=pd.Series(mu, index=df.index),
+        deviance=deviance,
+        converged=converged,
+        n_separated=n_separated,
+        inner_iterations=inner,
+        params=pd.Series(beta, index=names),
+        cov=cov,
+        resid=pd.Series(resid, index=df.index),
+        nobs=n,
+        df_resid=n - k,
+        df_model=k,
+        n_fe={col: levels for col, (_, levels) in zip(fe, fe_codes)},
+        rsquared=np.corrcoef(yv, mu)[0, 1] ** 2,
+        rsquared_within=np.nan,
+        cov_type=cov_type,
+        use_t=False,
+        n_clusters=n_clusters,
+        iterations=iteration,
+        dropped=dropped,
+    )
+
+
+def load_facility_panel():
+    """S&P 500-matched GHGRP facility-years with the sector AI-exposure treatment of 02."""
+    from data_access import load_emissions_panel
+
+    df = load_emissions_panel(level='facility')
+    exposure = df['ai_exposure']
+    df['post_chatgpt'] = (df['year'] >= 2023).astype(int)
+    df['treatment'] = (exposure >= exposure.median()).astype(int) * df['post_chatgpt']
+    return df
+
+
+def main(args):
+    def option(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    print("=" * 60)
+    print("PPML WITH ABSORBED FIXED EFFECTS: EMISSIONS IN LEVELS")
+    print("=" * 60)
+
+    if '--data' in args:
+        # Any panel, e.g. the full all-facility GHGRP file
+        data = pd.read_csv(option('--data'))
+        specs = [(option('--data'), data, option('--y', 'total_emissions'), option('--x').split(','),
+                  option('--fe').split(','), option('--cluster'))]
+    else:
+        facilities = load_facility_panel()
+        company = facilities.groupby(['ticker', 'year'], as_index=False, observed=True).agg(
+            total_emissions=('total_emissions', 'sum'), treatment=('treatment', 'first'))
+        specs = [
+            ('Company-year, firm + year FE', company, 'total_emissions', ['treatment'],
+             ['ticker', 'year'], 'ticker'),
+            ('Facility-year, facility + year FE', facilities, 'total_emissions', ['treatment'],
+             ['facility_id', 'year'], 'ticker'),
+            ('Facility-year, facility + state-year FE',
+             facilities.assign(state_year=facilities['state'].astype(object) + '_' + facilities['year'].astype(str)),
+             'total_emissions', ['treatment'], ['facility_id', 'state_year'], 'ticker'),
+        ]
+
+    rows = []
+    for name, data, y, x, fe, cluster in specs:
+        model = ppml(data, y, x, fe=fe, cluster=cluster)
+        print(f"\n{name}: {model.nobs:,} obs ({model.n_separated} dropped: all-zero FE groups)")
+        print(f"  IRLS iterations: {model.iterations} ({model.inner_iterations} demeaning sweeps), "
+              f"pseudo R2 {model.rsquared:.4f}")
+        if not model.converged:
+            print("  WARNING: IRLS did not converge; estimates are from the last iteration")
+        for term in model.params.index:
+            coef, se, p = model.params[term], model.bse[term], model.pvalues[term]
+            print(f"  {term}: {coef:+.4f} (SE {se:.4f}, p = {p:.3f}) -> {(np.exp(coef) - 1) * 100:+.2f}%")
+            rows.append({'Specification': name, 'Term': term, 'Coefficient': coef, 'SE': se,
+                         'P_value': p, 'Pct_effect': (np.exp(coef) - 1) * 100, 'N_obs': model.nobs,
+                         'N_separated': model.n_separated, 'N_clusters': model.n_clusters,
+                         'Pseudo_R2': model.rsquared, 'Converged': model.converged})
+
+    results = pd.DataFrame(rows)
+    output = Path(option('--output', OUTPUT_DIR / "ppml_results.csv"))
+    results.to_csv(output, index=False)
+    print(f"\nSaved: {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,264 @@
+"""
+Specification curve for the AI-exposure DiD.
+
+The grid is declarative: every dimension maps option names to a column
+builder (outcome, treatment, sample) or to the columns it uses (FE, SE). The
+runner expands the full cross product, then groups specifications that share
+an estimation sample and FE structure into one design: the outcome and
+treatment columns of a design are stacked and demeaned together once
+(fixed_effects.demean), and every outcome x treatment x SE combination is a
+one-regressor FWL problem (break_scan.fwl_stats). Designs are spread over a
+process pool.
+
+CLI (writes analysis/output/spec_curve_results.csv and fig_spec_curve.png):
+    python analysis/spec_curve.py [--workers N]
+"""
+
+import hashlib
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from break_scan import fwl_stats
+from fixed_effects import absorbed_dof, demean, factorize_fe
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+OUTPUT_DIR = Path(__file__).parent / "output"
+DIMENSIONS = ['outcome', 'treatment', 'sample', 'fe', 'se']
+
+def _estimate_design(task):
+    """All outcome x treatment x SE estimates for one sample/FE design."""
+    Y, D, fe_codes, clusters = task
+    n = len(Y)
+    M, _ = demean(np.column_stack([Y, D]), fe_codes)
+    y_dm, D_dm = M[:, :Y.shape[1]], M[:, Y.shape[1]:]
+    dd = (D_dm ** 2).sum(axis=0)
+    k = absorbed_dof(fe_codes) + 1
+    out = []
+    for groups in clusters:
+        n_clusters = None if groups is None else int(groups.max()) + 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta, var, _, _ = fwl_stats(y_dm, D_dm, np.where(dd > 1e-9 * n, dd, np.nan),
+                                        groups, n_clusters, k, n - k)
+        out.append((beta, np.sqrt(var), n_clusters))
+    return out
+
+
+def run_spec_curve(data, grid, workers=None):
+    """Estimate every specification in `grid` on `data`.
+
+    Args:
+        data: panel DataFrame
+        grid: dict with keys 'outcome', 'treatment', 'sample' (option name ->
+            function of the DataFrame returning a column / boolean mask), 'fe'
+            (option name -> list of FE columns) and 'se' (option name -> cluster
+            column, or None for HC1)
+        workers: processes for the designs (None = all cores, 1 = in-process)
+
+    Returns one row per specification with coef, se, z-based p-value, N and the
+    number of clusters; specifications whose treatment is absorbed by the FE
+    have NaN estimates.
+    """
+    columns = {dim: {name: np.asarray(build(data), dtype=bool if dim == 'sample' else float)
+                     for name, build in grid[dim].items()}
+               for dim in ('outcome', 'treatment', 'sample')}
+    specs = pd.DataFrame(list(itertools.product(*(grid[dim] for dim in DIMENSIONS))),
+                         columns=DIMENSIONS)
+
+    # Specifications sharing rows and FE share one demeaned design. Each
+    # specification's rows require only its own FE and cluster columns, so the
+    # sample of e.g. an HC1 spec does not depend on which clusterings are in the grid
+    finite = {dim: {name: np.isfinite(col) for name, col in columns[dim].items()}
+              for dim in ('outcome', 'treatment')}
+    observed = {}
+    designs, design_of = {}, {}
+    for outcome, treatment, sample, fe, se in specs.itertuples(index=False):
+        fe_cols = list(grid['fe'][fe])
+        cluster = grid['se'][se]
+        needed = tuple(fe_cols + ([cluster] if cluster else []))
+        if needed not in observed:
+            observed[needed] = data[list(needed)].notna().all(axis=1).to_numpy()
+        mask = (columns['sample'][sample] & finite['outcome'][outcome]
+                & finite['treatment'][treatment] & observed[needed])
+        key = (fe, hashlib.sha1(np.packbits(mask).tobytes()).hexdigest())
+        design = designs.setdefault(key, {'mask': mask, 'fe': fe_cols, 'outcomes': [],
+                                          'treatments': [], 'ses': []})
+        for dim, name in (('outcomes', outcome), ('treatments', treatment), ('ses', se)):
+            if name not in design[dim]:
+                design[dim].append(name)
+        design_of[outcome, treatment, sample, fe, se] = key
+
+    tasks = []
+    for design in designs.values():
+        rows = data[design['mask']]
+        tasks.append((
+            np.column_stack([columns['outcome'][o][design['mask']] for o in design['outcomes']]),
+            np.column_stack([columns['treatment'][t][design['mask']] for t in design['treatments']]),
+            factorize_fe(rows, design['fe']),
+            [None if grid['se'][s] is None else pd.factorize(rows[grid['se'][s]])[0]
+             for s in design['ses']],
+        ))
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            estimates = dict(zip(designs, pool.map(_estimate_design, tasks)))
+    else:
+        estimates = dict(zip(designs, map(_estimate_design, tasks)))
+
+    design_index = {key: d for d, key in enumerate(designs)}
+    records = []
+    for spec in specs.itertuples(index=False):
+        key = design_of[tuple(spec)]
+        design = designs[key]
+        beta, se, n_clusters = estimates[key][design['ses'].index(spec.se)]
+        i, j = design['outcomes'].index(spec.outcome), design['treatments'].index(spec.treatment)
+        records.append({'coef': beta[j, i], 'std_err': se[j, i], 'nobs': int(design['mask'].sum()),
+                        'n_clusters': n_clusters, 'design': design_index[key]})
+    table = pd.concat([specs, pd.DataFrame(records)], axis=1)
+    table['p_value'] = 2 * stats.norm.sf(np.abs(table['coef'] / table['std_err']))
+    return table
+
+
+def load_panel():
+    """GHGRP firm-year emissions with sector AI exposure, as in 02_diff_in_diff_analysis.py."""
+    from data_access import load_emissions_panel
+
+    df = load_emissions_panel()
+    df['sector'] = df['GICS Sector'].astype(object).fillna(df['ticker'].astype(object))
+    df['state_year'] = df['primary_state'].astype(object) + '_' + df['year'].astype(str)
+    df['n_years'] = df.groupby('ticker', observed=True)['year'].transform('nunique')
+    return df
+
+
+def default_grid(df):
+    """Outcome x treatment definition x sample x FE x SE grid behind the robustness checks."""
+    exposure = df['ai_exposure']
+    treated = {
+        'High AI (median)': exposure >= exposure.median(),
+        'High AI (top tercile)': exposure >= exposure.quantile(2 / 3),
+        'AI exposure (std.)': (exposure - exposure.mean()) / exposure.std(),
+        'Tech sectors': df['GICS Sector'].isin(['Information Technology', 'Communication Services']),
+    }
+    treatments = {}
+    for (name, level), break_year in itertools.product(treated.items(), [2021, 2022, 2023]):
+        treatments[f"{name} x post-{break_year}"] = \
+            lambda d, level=level, b=break_year: level.astype(float) * (d['year'] >= b)
+
+    return {
+        'outcome': {
+            'log(x+1)': lambda d: np.log(d['total_emissions'] + 1),
+            'log(x)': lambda d: np.log(d['total_emissions'].where(d['total_emissions'] > 0)),
+            'asinh(x)': lambda d: np.arcsinh(d['total_emissions']),
+            'log(x+1), winsorized 1%': lambda d: np.log(d['total_emissions'].clip(
+                *d['total_emissions'].quantile([0.01, 0.99])) + 1),
+        },
+        'treatment': treatments,
+        'sample': {
+            'All firm-years': lambda d: np.ones(len(d), dtype=bool),
+            'Balanced panel': lambda d: d['n_years'] == d['year'].nunique(),
+            '2015 onwards': lambda d: d['year'] >= 2015,
+            'Excl. Energy & Utilities': lambda d: ~d['GICS Sector'].isin(['Energy', 'Utilities']),
+            'Firms with 3+ years': lambda d: d['n_years'] >= 3,
+        },
+        'fe': {
+            'Firm + Year': ['ticker', 'year'],
+            'Firm + State-Year': ['ticker', 'state_year'],
+        },
+        'se': {
+            'HC1': None,
+            'Cluster: firm': 'ticker',
+            'Cluster: sector': 'sector',
+            'Cluster: state': 'primary_state',
+        },
+    }
+
+
+def plot_spec_curve(table, path, headline=None):
+    """Sorted estimates with 95% CIs above an indicator panel of the specification choices."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    curve = table.dropna(subset=['coef']).sort_values('coef').reset_index(drop=True)
+    rank = np.arange(len(curve))
+    dims = ['outcome', 'treatment', 'sample', 'fe', 'se']
+    labels = [(dim, option) for dim in dims for option in curve[dim].unique()]
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 4 + 0.18 * len(labels)), sharex=True,
+                                   gridspec_kw={'height_ratios': [1, 0.045 * len(labels)]})
+    sig = curve['p_value'] < 0.05
+    half = 1.96 * curve['std_err']
+    ax1.vlines(rank, curve['coef'] - half, curve['coef'] + half, color='lightgray', linewidth=0.4, zorder=1)
+    ax1.scatter(rank[~sig], curve.loc[~sig, 'coef'], s=6, color='gray', label='p >= 0.05', zorder=3)
+    ax1.scatter(rank[sig], curve.loc[sig, 'coef'], s=6, color='darkred', label='p < 0.05', zorder=3)
+    ax1.axhline(0, color='black', linewidth=0.8)
+    if headline is not None:
+        match = np.flatnonzero((curve[dims] == pd.Series(headline)[dims]).all(axis=1))
+        if len(match):
+            ax1.axvline(match[0], color='darkblue', linestyle='--', alpha=0.7, label='Headline (02 Model 2)')
+    ax1.set_ylabel('DiD coefficient (95% CI)')
+    ax1.set_title(f'Specification Curve: {len(curve):,} specifications')
+    ax1.legend(loc='upper left')
+    ax1.grid(True, alpha=0.3)
+
+    for row, (dim, option) in enumerate(labels):
+        used = (curve[dim] == option).to_numpy()
+        ax2.scatter(rank[used], np.full(used.sum(), row), s=2, marker='|',
+                    color='darkred' if dims.index(dim) % 2 else 'darkblue')
+    ax2.set_yticks(range(len(labels)))
+    ax2.set_yticklabels([option for _, option in labels], fontsize=7)
+    ax2.invert_yaxis()
+    ax2.set_xlabel('Specification (ranked by coefficient)')
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+
+
+def main(workers=None):
+    print("=" * 60)
+    print("SPECIFICATION CURVE: AI EXPOSURE x POST DiD")
+    print("=" * 60)
+
+    df = load_panel()
+    grid = default_grid(df)
+    sizes = {dim: len(grid[dim]) for dim in DIMENSIONS}
+    print(f"\nPanel: {len(df)} firm-years, {df['ticker'].nunique()} firms")
+    print("Grid: " + " x ".join(f"{n} {dim}" for dim, n in sizes.items()))
+
+    table = run_spec_curve(df, grid, workers=workers)
+    est = table.dropna(subset=['coef'])
+    print(f"\nSpecifications: {len(table):,} ({table['design'].nunique()} distinct designs, "
+          f"{len(table) - len(est)} not identified)")
+    print(f"Median coefficient: {est['coef'].median():+.4f}")
+    print(f"Share positive: {(est['coef'] > 0).mean():.1%}")
+    print(f"Share significant at 5%: {(est['p_value'] < 0.05).mean():.1%} "
+          f"(positive {((est['p_value'] < 0.05) & (est['coef'] > 0)).mean():.1%}, "
+          f"negative {((est['p_value'] < 0.05) & (est['coef'] < 0)).mean():.1%})")
+
+    print("\n--- Median coefficient by choice ---")
+    for dim in DIMENSIONS:
+        medians = est.groupby(dim, sort=False)['coef'].median()
+        for option, value in medians.items():
+            print(f"  {dim:10} {option:40} {value:+.4f}")
+
+    headline = {'outcome': 'log(x+1)', 'treatment': 'High AI (median) x post-2023',
+                'sample': 'All firm-years', 'fe': 'Firm + Year', 'se': 'HC1'}
+    table.to_csv(OUTPUT_DIR / "spec_curve_results.csv", index=False)
+    plot_spec_curve(table, OUTPUT_DIR / "fig_spec_curve.png", headline=headline)
+    print(f"\nSaved: {OUTPUT_DIR / 'spec_curve_results.csv'}")
+    print(f"Saved: {OUTPUT_DIR / 'fig_spec_curve.png'}")
+    return table
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    workers = int(args[args.index('--workers') + 1]) if '--workers' in args else None
+    main(workers=workers)
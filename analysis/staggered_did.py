@@ -0,0 +1,176 @@
+"""
+Group-time ATTs for staggered adoption (Callaway & Sant'Anna 2021).
+
+Units adopt in different years (cohort g = first treated year). For every
+cohort g and period t the 2x2 comparison
+
+    ATT(g, t) = E[Y_t - Y_b | G = g] - E[Y_t - Y_b | control]
+
+uses the base period b = g - 1 for t >= g and b = t - 1 before adoption
+(the "varying" base), with never-treated or not-yet-treated units as the
+control group. All comparisons come from one units x years outcome matrix:
+the long differences for every (t, b) pair are a column gather, the cohort
+and control means are masked column sums, and each unit's influence
+function for every cell is a masked deviation from those means, so the
+covariance of all cells is one cross product. Event-time and overall ATTs
+are weighted averages of the cells (weights = cohort sizes, with their
+estimation error in the influence function), and a multiplier bootstrap
+over units (or clusters) gives SEs and simultaneous (sup-t) bands.
+
+    from staggered_did import group_time_att
+    res = group_time_att(df, 'log_emissions', unit='ticker', time='year', cohort='cohort')
+    res['event_time'], res['overall']
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+
+def _wide(data, y, unit, time, cohort):
+    """Units x years outcome matrix (NaN where unobserved) and each unit's cohort."""
+    Y = data.pivot_table(index=unit, columns=time, values=y, aggfunc='mean', observed=True)
+    g = data.groupby(unit, observed=True)[cohort].first().reindex(Y.index)
+    # Never treated: missing or 0 cohort
+    g = g.fillna(0).to_numpy(dtype=float)
+    return Y, np.where(g > 0, g, np.inf)
+
+
+def _influence(D, valid, treat, control):
+    """Cell estimates and per-unit influence functions for masked 2x2 comparisons."""
+    T = treat & valid
+    C = control & valid
+    Dz = np.where(valid, D, 0.0)
+    n_t, n_c = T.sum(axis=0), C.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mu_t = (T * Dz).sum(axis=0) / n_t
+        mu_c = (C * Dz).sum(axis=0) / n_c
+        psi = T * (Dz - mu_t) / n_t - C * (Dz - mu_c) / n_c
+    return mu_t - mu_c, np.nan_to_num(psi), n_t, n_c
+
+
+def _bootstrap(psi, clusters, n_boot, alpha, rng):
+    """Multiplier-bootstrap SEs and the sup-t critical value for the columns of psi."""
+    if clusters is not None:
+        codes, levels = pd.factorize(clusters)
+        psi = np.vstack([np.bincount(codes, weights=psi[:, k], minlength=len(levels))
+                         for k in range(psi.shape[1])]).T
+    V = rng.choice([-1.0, 1.0], size=(n_boot, psi.shape[0]))
+    draws = V @ psi
+    # Robust (interquartile) bootstrap SE, as in the did package
+    q75, q25 = np.quantile(draws, [0.75, 0.25], axis=0)
+    se = (q75 - q25) / (special.ndtri(0.75) - special.ndtri(0.25))
+    se = np.where(se > 0, se, np.nan)
+    with np.errstate(invalid='ignore'):
+        sup_t = np.nanmax(np.abs(draws) / se, axis=1)
+    return se, np.quantile(sup_t, 1 - alpha)
+
+
+def group_time_att(data, y, unit, time, cohort, control_group='never', cluster=None,
+                   n_boot=999, alpha=0.05, seed=42):
+    """Callaway-Sant'Anna ATT(g, t) with event-time and overall aggregation.
+
+    Args:
+        data: long panel DataFrame
+        y: outcome column
+        unit: unit id column
+        time: integer time column
+        cohort: first treated period per unit (0 or NaN = never treated)
+        control_group: 'never' (never treated) or 'notyet' (never or not yet treated)
+        cluster: optional column (constant within unit) to draw bootstrap weights by
+        n_boot: multiplier bootstrap draws
+        alpha: level for pointwise and simultaneous bands
+
+    Returns a dict with DataFrames 'group_time' (one row per cohort x period)
+    and 'event_time' (one row per e = t - g), each with analytic and bootstrap
+    SEs, pointwise CIs and sup-t uniform bands, plus 'overall' (the simple
+    average of post-adoption cells, weighted by cohort size).
+    """
+    if control_group not in ('never', 'notyet'):
+        raise ValueError(f"control_group must be 'never' or 'notyet', got {control_group!r}")
+    df = data.dropna(subset=[y, unit, time])
+    Y_frame, g_unit = _wide(df, y, unit, time, cohort)
+    Y = Y_frame.to_numpy(dtype=float)
+    periods = Y_frame.columns.to_numpy()
+    n = len(Y)
+    col = {p: i for i, p in enumerate(periods)}
+
+    cohorts = np.sort(np.unique(g_unit[np.isfinite(g_unit)]))
+    cohorts = cohorts[(cohorts > periods.min()) & (cohorts <= periods.max())]
+    cells = []
+    for g in cohorts:
+        for t in periods[1:]:
+            base = g - 1 if t >= g else t - 1
+            if base in col:
+                cells.append((g, t, base))
+    if not cells:
+        raise ValueError("no cohort adopts within the sample period")
+    g_c, t_c, b_c = (np.array(v) for v in zip(*cells))
+
+    # All long differences at once: (n, cells)
+    D = Y[:, [col[t] for t in t_c]] - Y[:, [col[b] for b in b_c]]
+    valid = ~np.isnan(D)
+    treat = g_unit[:, None] == g_c[None, :]
+    if control_group == 'never':
+        control = np.repeat(np.isinf(g_unit)[:, None], len(cells), axis=1)
+    else:
+        control = (g_unit[:, None] > np.maximum(t_c, b_c)[None, :]) & ~treat
+    att, psi, n_t, n_c = _influence(D, valid, treat, control)
+
+    group_time = pd.DataFrame({'cohort': g_c.astype(int), 'period': t_c.astype(int),
+                               'base_period': b_c.astype(int), 'event_time': (t_c - g_c).astype(int),
+                               'att': att, 'n_treated': n_t, 'n_control': n_c})
+    ok = np.isfinite(att)
+    group_time, psi, att = group_time[ok].reset_index(drop=True), psi[:, ok], att[ok]
+
+    # Aggregations: weights proportional to cohort shares, whose estimation
+    # error enters through the influence function of the shares
+    pi = np.array([(g_unit == g).mean() for g in group_time['cohort']])
+    pi_if = ((g_unit[:, None] == group_time['cohort'].to_numpy()[None, :]) - pi[None, :]) / n
+
+    def aggregate(mask):
+        w = pi * mask
+        total = w.sum()
+        w = w / total
+        w_if = (pi_if * mask - w[None, :] * (pi_if * mask).sum(axis=1, keepdims=True)) / total
+        return w @ att, psi @ w + w_if @ att
+
+    events = np.sort(group_time['event_time'].unique())
+    agg = [aggregate((group_time['event_time'] == e).to_numpy()) for e in events]
+    overall_att, overall_psi = aggregate((group_time['event_time'] >= 0).to_numpy())
+    event_att = np.array([a for a, _ in agg])
+    event_psi = np.column_stack([p for _, p in agg])
+
+    clusters = None
+    if cluster is not None:
+        clusters = df.groupby(unit, observed=True)[cluster].first().reindex(Y_frame.index).to_numpy()
+    rng = np.random.default_rng(seed)
+    z = special.ndtri(1 - alpha / 2)
+
+    def table(frame, est, psi_cols):
+        frame = frame.copy()
+        frame['se_analytic'] = np.sqrt((psi_cols ** 2).sum(axis=0))
+        se, crit = _bootstrap(psi_cols, clusters, n_boot, alpha, rng)
+        frame['se'] = se
+        frame['ci_lower'], frame['ci_upper'] = est - z * se, est + z * se
+        frame['band_lower'], frame['band_upper'] = est - crit * se, est + crit * se
+        frame['p_value'] = 2 * special.ndtr(-np.abs(est / se))
+        return frame, crit
+
+    group_time, gt_crit = table(group_time, att, psi)
+    event_time, es_crit = table(pd.DataFrame({'event_time': events, 'att': event_att}),
+                                event_att, event_psi)
+    overall, _ = table(pd.DataFrame({'att': [overall_att]}), np.array([overall_att]),
+                       overall_psi[:, None])
+
+    return {
+        'group_time': group_time,
+        'event_time': event_time,
+        'overall': overall.iloc[0].to_dict(),
+        'critical_value_group_time': gt_crit,
+        'critical_value_event_time': es_crit,
+        'n_units': n,
+        'cohort_sizes': {int(g): int((g_unit == g).sum()) for g in cohorts},
+        'n_never_treated': int(np.isinf(g_unit).sum()),
+        'control_group': control_group,
+    }
@@ -0,0 +1,413 @@
+"""
+Synthetic control and synthetic difference-in-differences on the Scope 2 panel.
+
+Both estimators compare the treated firms' (average) outcome path with a
+weighted average of donor firms:
+
+- synthetic control (Abadie, Diamond & Hainmueller 2010): donor weights on the
+  simplex matching the pre-period path, effect = mean post-period gap;
+- synthetic DiD (Arkhangelsky et al. 2021): regularized unit weights matching
+  pre-period trends up to a level shift, plus time weights matching the
+  donors' post-period average from pre-period years, effect = weighted DiD.
+
+All weights solve simplex-constrained least squares, approximately: by NNLS
+with the adding-up constraint as a heavily weighted penalty row (then
+renormalized), or, for very large donor pools, by pairwise Frank-Wolfe. In-space
+placebos re-run the estimator with each donor as the treated unit (on a
+process pool) and give the permutation p-values; for a treated group, the
+SDID placebo SE and p-value come from random donor groups of the same size
+instead. Weights are cached on disk under a hash of the donor pool, the
+target path and the regularization, so re-running with an extra post-period
+year re-solves only the weights that depend on it (SDID time weights and the
+penalty scale).
+
+With one post-treatment year (the default window, 2023 only), the SC p-value
+ranks a single post/pre RMSPE ratio among the donors' and has almost no power:
+the 0.86-0.97 values in the results table are uninformative, not evidence of
+no effect. Widen the post window (--post) before reading them.
+
+CLI (writes analysis/output/synthetic_control_results.csv,
+synthetic_control_placebos.csv and fig_synthetic_control.png):
+    python analysis/synthetic_control.py [--start 2015] [--end 2023] [--post 2023] [--workers N]
+"""
+
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+
+from randomization_inference import AI_BUILDERS, load_scope2_panel
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+OUTPUT_DIR = Path(__file__).parent / "output"
+CACHE_DIR = DATA_DIR / "scope2_manual" / "cache" / "synth_weights"
+
+CLOUD_BUILDERS = ['MSFT', 'GOOGL', 'META', 'AMZN']
+
+
+def frank_wolfe(A, b, penalty=0.0, min_decrease=0.0, max_iter=10000, tol=1e-10):
+    """Pairwise Frank-Wolfe for min ||A w - b||^2 + penalty * ||w||^2 on the simplex.
+
+    Stops when the duality gap falls below tol * ||b||^2 or an iteration lowers
+    the objective by less than min_decrease^2 (as in synthdid).
+    """
+    J = A.shape[1]
+    w = np.full(J, 1.0 / J)
+    Aw = A @ w
+    scale = max(b @ b, 1e-12)
+    objective = np.inf
+    for iteration in range(max_iter):
+        if iteration % 100 == 0:
+            Aw = A @ w
+        r = Aw - b
+        new_objective = r @ r + penalty * (w @ w)
+        if objective - new_objective <= min_decrease ** 2:
+            break
+        objective = new_objective
+        grad = 2 * (A.T @ r) + 2 * penalty * w
+        s = int(np.argmin(grad))
+        if grad @ w - grad[s] <= tol * scale:
+            break
+        # Pairwise step: move mass from the worst active donor to the best vertex
+        active = np.flatnonzero(w > 0)
+        v = active[np.argmax(grad[active])]
+        d_A = A[:, s] - A[:, v]
+        denom = d_A @ d_A + 2 * penalty
+        step = min((grad[v] - grad[s]) / (2 * denom), w[v]) if denom > 0 else w[v]
+        w[s] += step
+        w[v] -= step
+        Aw += step * d_A
+    return w
+
+
+def simplex_least_squares(A, b, penalty=0.0, intercept=False, method='qp', min_decrease=0.0):
+    """min ||A w (+ c) - b||^2 + penalty * ||w||^2 over the simplex.
+
+    With intercept=True the columns of A and b are centered first (a free
+    level shift c). method='qp' runs NNLS on the stacked problem (ridge penalty
+    as extra rows, the adding-up constraint as a row weighted by `big`) and
+    renormalizes the result, so sum(w) = 1 is enforced by penalty rather than
+    exactly and the weights are an approximation to the constrained optimum,
+    close when `big` dominates the scale of A and b. method='fw' uses pairwise
+    Frank-Wolfe, which scales to very large donor pools. Returns the weights.
+    """
+    A = np.asarray(A, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if intercept:
+        A = A - A.mean(axis=0)
+        b = b - b.mean()
+    if method == 'fw':
+        return frank_wolfe(A, b, penalty, min_decrease)
+    if method != 'qp':
+        raise ValueError(f"method must be 'qp' or 'fw', got {method!r}")
+    J = A.shape[1]
+    big = 1e3 * max(np.abs(A).max(), np.abs(b).max(), 1.0)
+    rows = [A, np.full((1, J), big)]
+    target = [b, [big]]
+    if penalty > 0:
+        rows.insert(1, np.sqrt(penalty) * np.eye(J))
+        target.insert(1, np.zeros(J))
+    w, _ = nnls(np.vstack(rows), np.concatenate(target), maxiter=50 * J)
+    return w / w.sum()
+
+
+def _cache_key(kind, target, donors, donor_names, penalty, intercept, method, min_decrease):
+    h = hashlib.sha1()
+    h.update(f"{kind}|{penalty:.12g}|{intercept}|{method}|{min_decrease:.12g}|".encode())
+    h.update(",".join(map(str, donor_names)).encode())
+    h.update(np.ascontiguousarray(target, dtype=float).tobytes())
+    h.update(np.ascontiguousarray(donors, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def cached_weights(kind, A, b, names, penalty=0.0, intercept=False, method='qp', min_decrease=0.0,
+                   cache_dir=CACHE_DIR):
+    """simplex_least_squares with an on-disk cache keyed by the problem's content."""
+    if cache_dir is None:
+        return simplex_least_squares(A, b, penalty, intercept, method, min_decrease), False
+    key = _cache_key(kind, b, A, names, penalty, intercept, method, min_decrease)
+    path = Path(cache_dir) / f"{key}.npy"
+    if path.exists():
+        return np.load(path), True
+    w = simplex_least_squares(A, b, penalty, intercept, method, min_decrease)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        np.save(f, w)
+    tmp.replace(path)
+    return w, False
+
+
+def estimate(target, donors, donor_names, n_post, n_treated=1, cache_dir=CACHE_DIR):
+    """SC and SDID estimates for one target path against a donor matrix.
+
+    Args:
+        target: (T,) outcome path of the treated unit (or treated average)
+        donors: (J, T) donor outcome paths; the last n_post periods are post-treatment
+        donor_names: donor identifiers (part of the cache key)
+        n_treated: treated units behind `target` (scales the SDID penalty)
+    """
+    T0 = len(target) - n_post
+    Y0_pre, Y0_post = donors[:, :T0], donors[:, T0:]
+    y_pre, y_post = target[:T0], target[T0:]
+    hits = 0
+    # Noise level: dispersion of the donors' pre-period changes
+    sigma = np.std(np.diff(Y0_pre, axis=1), ddof=1) if T0 > 1 else 0.0
+    min_decrease = 1e-5 * sigma
+
+    # Synthetic control: match the pre-period path in levels
+    w_sc, hit = cached_weights('sc', Y0_pre.T, y_pre, donor_names, min_decrease=min_decrease,
+                               cache_dir=cache_dir)
+    hits += hit
+    gap = target - w_sc @ donors
+    pre_rmspe = np.sqrt(np.mean(gap[:T0] ** 2))
+    post_rmspe = np.sqrt(np.mean(gap[T0:] ** 2))
+
+    # Synthetic DiD: regularized unit weights (trends), time weights (pre -> post)
+    zeta = (n_treated * n_post) ** 0.25 * sigma
+    omega, hit = cached_weights('sdid_unit', Y0_pre.T, y_pre, donor_names, penalty=T0 * zeta ** 2,
+                                intercept=True, min_decrease=min_decrease, cache_dir=cache_dir)
+    hits += hit
+    lam, hit = cached_weights('sdid_time', Y0_pre, Y0_post.mean(axis=1), donor_names,
+                              penalty=len(donors) * (1e-6 * sigma) ** 2, intercept=True,
+                              min_decrease=min_decrease, cache_dir=cache_dir)
+    hits += hit
+    tau_sdid = (y_post.mean() - lam @ y_pre) - omega @ (Y0_post.mean(axis=1) - Y0_pre @ lam)
+
+    return {
+        'sc': gap[T0:].mean(),
+        'sdid': tau_sdid,
+        'gap': gap,
+        'pre_rmspe': pre_rmspe,
+        'post_rmspe': post_rmspe,
+        'rmspe_ratio': post_rmspe / pre_rmspe if pre_rmspe > 0 else np.inf,
+        'w_sc': w_sc,
+        'omega': omega,
+        'lambda': lam,
+        'cache_hits': hits,
+    }
+
+
+def _placebo(task):
+    j, Y0, names, n_post, cache_dir = task
+    others = np.arange(len(Y0)) != j
+    res = estimate(Y0[j], Y0[others], [n for n, keep in zip(names, others) if keep],
+                   n_post, cache_dir=cache_dir)
+    return {k: res[k] for k in ('sc', 'sdid', 'pre_rmspe', 'post_rmspe', 'rmspe_ratio', 'gap', 'cache_hits')}
+
+
+def _group_placebo(task):
+    members, Y0, names, n_post, cache_dir = task
+    others = ~np.isin(np.arange(len(Y0)), members)
+    res = estimate(Y0[members].mean(axis=0), Y0[others], [n for n, keep in zip(names, others) if keep],
+                   n_post, n_treated=len(members), cache_dir=cache_dir)
+    return res['sdid'], res['cache_hits']
+
+
+def synthetic_control(data, y, unit, time, treated, post_start, donors=None, years=None,
+                      placebos=True, se_draws=200, seed=42, workers=None, cache_dir=CACHE_DIR):
+    """SC and SDID effect of treatment on the average path of `treated` units.
+
+    Args:
+        data: long panel DataFrame
+        y: outcome column
+        unit, time: unit and time columns
+        treated: treated unit ids (their average is the treated path)
+        post_start: first post-treatment period
+        donors: candidate donor ids (default: every other unit)
+        years: periods to use (default: all); donors must be observed in every one
+        placebos: run in-space placebos for every donor
+        se_draws: random donor groups the size of the treated group for the SDID
+            placebo SE when several units are treated (single-unit placebos otherwise)
+        seed: seed for those groups
+        workers: processes for the placebos (None = all cores, 1 = in-process)
+        cache_dir: weight cache directory (None disables caching)
+
+    Returns a dict with both estimates, permutation p-values, placebo SEs, the
+    path table, the donor and time weights and the placebo table.
+    """
+    wide = data.pivot_table(index=unit, columns=time, values=y, aggfunc='mean', observed=True)
+    if years is not None:
+        wide = wide[[t for t in wide.columns if t in set(years)]]
+    periods = wide.columns.to_numpy()
+    n_post = int((periods >= post_start).sum())
+    if n_post == 0 or n_post == len(periods):
+        raise ValueError("need at least one pre- and one post-treatment period")
+
+    treated = [u for u in treated if u in wide.index]
+    Y1 = wide.loc[treated]
+    if Y1.isna().any().any():
+        missing = Y1.index[Y1.isna().any(axis=1)].tolist()
+        raise ValueError(f"treated units missing periods in the window: {missing}")
+    pool = wide.drop(index=treated)
+    if donors is not None:
+        pool = pool[pool.index.isin(donors)]
+    pool = pool.dropna()
+    names = pool.index.tolist()
+    Y0 = pool.to_numpy(dtype=float)
+    target = Y1.to_numpy(dtype=float).mean(axis=0)
+
+    res = estimate(target, Y0, names, n_post, n_treated=len(treated), cache_dir=cache_dir)
+    T0 = len(periods) - n_post
+    synthetic_sc = res['w_sc'] @ Y0
+    paths = pd.DataFrame({time: periods, 'treated': target, 'synthetic_sc': synthetic_sc,
+                          'gap_sc': target - synthetic_sc,
+                          'sdid_time_weight': np.r_[res['lambda'], np.zeros(n_post)],
+                          'post': periods >= post_start})
+    weights = pd.DataFrame({unit: names, 'w_sc': res['w_sc'], 'omega_sdid': res['omega']})
+    out = {
+        'sc': res['sc'],
+        'sdid': res['sdid'],
+        'pre_rmspe': res['pre_rmspe'],
+        'rmspe_ratio': res['rmspe_ratio'],
+        'n_donors': len(names),
+        'n_pre': T0,
+        'n_post': n_post,
+        'paths': paths,
+        'weights': weights.sort_values('omega_sdid', ascending=False).reset_index(drop=True),
+        'cache_hits': res['cache_hits'],
+    }
+    if not placebos:
+        return out
+
+    tasks = [(j, Y0, names, n_post, cache_dir) for j in range(len(names))]
+    # Placebo variance (Arkhangelsky et al.): pseudo-treated groups of the same
+    # size as the treated group, drawn from the donors
+    n_tr = len(treated)
+    rng = np.random.default_rng(seed)
+    group_tasks = [(np.sort(rng.choice(len(names), n_tr, replace=False)), Y0, names, n_post, cache_dir)
+                   for _ in range(se_draws if n_tr > 1 else 0)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool_exec:
+            chunksize = max(1, len(tasks) // (4 * workers))
+            placebo = list(pool_exec.map(_placebo, tasks, chunksize=chunksize))
+            groups = list(pool_exec.map(_group_placebo, group_tasks, chunksize=chunksize))
+    else:
+        placebo = [_placebo(task) for task in tasks]
+        groups = [_group_placebo(task) for task in group_tasks]
+    placebo = pd.DataFrame(placebo)
+    placebo.insert(0, unit, names)
+    out['placebo_gaps'] = pd.DataFrame(np.vstack(placebo.pop('gap')), index=names, columns=periods)
+
+    J = len(placebo)
+    out['placebos'] = placebo
+    out['p_value_sc'] = (1 + np.sum(placebo['rmspe_ratio'] >= res['rmspe_ratio'])) / (J + 1)
+    # Single treated units share the donor placebos, so their SE and p-value
+    # reference distribution are the same for every treated firm
+    sdid_placebo = np.array([tau for tau, _ in groups]) if groups else placebo['sdid'].to_numpy()
+    out['p_value_sdid'] = ((1 + np.sum(np.abs(sdid_placebo) >= abs(res['sdid'])))
+                           / (len(sdid_placebo) + 1))
+    out['se_sdid'] = sdid_placebo.std(ddof=0)
+    out['se_sc'] = placebo['sc'].std(ddof=0)
+    out['cache_hits'] += int(placebo['cache_hits'].sum()) + sum(hits for _, hits in groups)
+    return out
+
+
+def plot_synthetic_control(result, path, label):
+    """Treated vs synthetic path, and the treated gap against the placebo gaps."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    paths = result['paths']
+    years = paths['year']
+    post_start = years[paths['post']].min()
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5))
+
+    ax1.plot(years, paths['treated'], 'o-', color='darkred', linewidth=2, label=label)
+    ax1.plot(years, paths['synthetic_sc'], 's--', color='darkblue', linewidth=2, label='Synthetic control')
+    ax1.axvline(post_start - 0.5, color='gray', linestyle='--', alpha=0.7)
+    ax1.set_xlabel('Year')
+    ax1.set_ylabel('Log Scope 2 emissions')
+    ax1.set_title('A. Treated vs Synthetic Control')
+    ax1.legend()
+    ax1.grid(True, alpha=0.3)
+
+    # Placebos with a pre-period fit comparable to the treated path (Abadie et al.)
+    gaps = result['placebo_gaps']
+    good = result['placebos']['pre_rmspe'].to_numpy() <= 5 * result['pre_rmspe']
+    for row in gaps.to_numpy()[good]:
+        ax2.plot(years, row, color='lightgray', linewidth=0.7)
+    ax2.plot(years, paths['gap_sc'], color='darkred', linewidth=2.5, label=label)
+    ax2.axhline(0, color='black', linewidth=0.8)
+    ax2.axvline(post_start - 0.5, color='gray', linestyle='--', alpha=0.7)
+    ax2.set_xlabel('Year')
+    ax2.set_ylabel('Gap (treated - synthetic)')
+    ax2.set_title(f'B. In-Space Placebos ({int(good.sum())} donors, pre-RMSPE <= 5x treated)')
+    ax2.legend()
+    ax2.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+
+
+def main(start=2015, end=2023, post=2023, workers=None):
+    print("=" * 60)
+    print("SYNTHETIC CONTROL / SYNTHETIC DiD: CLOUD BUILDERS' SCOPE 2")
+    print("=" * 60)
+
+    df = load_scope2_panel()
+    # Donors: firms outside the AI-builder list, observed in every year of the window
+    donors = sorted(set(df['ticker']) - set(AI_BUILDERS))
+    years = range(start, end + 1)
+    print(f"\nWindow: {start}-{end}, treatment from {post}; treated: {', '.join(CLOUD_BUILDERS)}")
+
+    runs = [('Cloud builders (average)', CLOUD_BUILDERS)] + [(t, [t]) for t in CLOUD_BUILDERS]
+    rows, main_result = [], None
+    for name, treated in runs:
+        res = synthetic_control(df, 'ln_scope2', 'ticker', 'year', treated, post, donors=donors,
+                                years=years, workers=workers)
+        main_result = main_result or res
+        print(f"\n{name}: {res['n_donors']} donors, {res['n_pre']} pre / {res['n_post']} post years "
+              f"(weight cache hits: {res['cache_hits']})")
+        print(f"  Synthetic control: {res['sc']:+.4f} (pre-RMSPE {res['pre_rmspe']:.4f}, "
+              f"placebo p = {res['p_value_sc']:.3f})")
+        print(f"  Synthetic DiD:     {res['sdid']:+.4f} (placebo SE {res['se_sdid']:.4f}, "
+              f"p = {res['p_value_sdid']:.3f})")
+        rows.append({
+            'Treated': name,
+            'SC_estimate': res['sc'],
+            'SC_pre_RMSPE': res['pre_rmspe'],
+            'SC_p_value': res['p_value_sc'],
+            'SDID_estimate': res['sdid'],
+            'SDID_SE': res['se_sdid'],
+            'SDID_p_value': res['p_value_sdid'],
+            'N_donors': res['n_donors'],
+            'N_pre': res['n_pre'],
+            'N_post': res['n_post'],
+        })
+
+    if main_result['n_post'] == 1:
+        print("\nNote: with one post-treatment year the SC placebo p-values have almost no power;")
+        print("      high values are uninformative rather than evidence of no effect.")
+
+    print("\nLargest SDID donor weights (average of cloud builders):")
+    for _, row in main_result['weights'].head(8).iterrows():
+        print(f"  {row['ticker']:6} omega = {row['omega_sdid']:.3f}  (SC weight {row['w_sc']:.3f})")
+
+    results = pd.DataFrame(rows)
+    results.to_csv(OUTPUT_DIR / "synthetic_control_results.csv", index=False)
+    main_result['placebos'].drop(columns='cache_hits').to_csv(
+        OUTPUT_DIR / "synthetic_control_placebos.csv", index=False)
+    plot_synthetic_control(main_result, OUTPUT_DIR / "fig_synthetic_control.png", runs[0][0])
+    print(f"\nSaved: {OUTPUT_DIR / 'synthetic_control_results.csv'}")
+    print(f"Saved: {OUTPUT_DIR / 'synthetic_control_placebos.csv'}")
+    print(f"Saved: {OUTPUT_DIR / 'fig_synthetic_control.png'}")
+    return results
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default):
+        return int(args[args.index(name) + 1]) if name in args else default
+
+    main(start=option('--start', 2015), end=option('--end', 2023), post=option('--post', 2023),
+         workers=option('--workers', None))
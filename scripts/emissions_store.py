@@ -0,0 +1,244 @@
+"""
+Partitioned columnar store for GHGRP facility-year and company-year emissions.
+
+Layout (Hive-style, one Parquet file per year, rows sorted by ticker so that
+row-group statistics prune ticker filters):
+
+    data/epa_ghgrp/store/facility/year=2023/part-0.parquet
+    data/epa_ghgrp/store/company/year=2023/part-0.parquet
+
+`query_emissions` pushes year/ticker/state/NAICS predicates and the column
+selection down to the Parquet reader, so only the needed partitions, row groups
+and columns are read. Without the store (or without pyarrow) it falls back to
+the processed CSVs and filters in pandas.
+
+Each level records the fingerprint of the CSV it was built from
+(store/{level}.source.json). If that CSV has since been regenerated, the store
+is stale: `query_emissions` warns and reads the CSV instead.
+
+Usage:
+    python scripts/emissions_store.py      # build the store from the processed CSVs
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import warnings
+from pathlib import Path
+
+import pandas as pd
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+PROCESSED_DIR = DATA_DIR / "epa_ghgrp" / "processed"
+STORE_DIR = DATA_DIR / "epa_ghgrp" / "store"
+
+SOURCES = {
+    'facility': PROCESSED_DIR / "ghgrp_facilities_sp500_all_years.csv",
+    'company': PROCESSED_DIR / "ghgrp_company_year_sp500_all_years.csv",
+}
+STATE_COLUMN = {'facility': 'state', 'company': 'primary_state'}
+ROW_GROUP_SIZE = 1024
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def file_fingerprint(path, with_hash=True):
+    """Return size, mtime and (optionally) SHA-256 of a file."""
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+def normalize_object_columns(df):
+    """Stringify mixed-type object columns (e.g. names parsed as numbers) so Parquet accepts them."""
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _source_meta_path(level, store_dir=STORE_DIR):
+    return Path(store_dir) / f"{level}.source.json"
+
+
+def store_is_current(level, store_dir=STORE_DIR):
+    """True when the level's store was built from the CSV currently on disk.
+
+    Without a CSV the store is the only copy and counts as current; a store
+    without a recorded source (or built from a different CSV) does not.
+    """
+    source = SOURCES[level]
+    if not source.exists():
+        return True
+    meta_path = _source_meta_path(level, store_dir)
+    if not meta_path.exists():
+        return False
+    meta = json.loads(meta_path.read_text())
+
+    current = file_fingerprint(source, with_hash=False)
+    if current['size'] != meta.get('size'):
+        return False
+    if current['mtime_ns'] != meta.get('mtime_ns'):
+        current = file_fingerprint(source)
+        if current['sha256'] != meta.get('sha256'):
+            return False
+        meta['mtime_ns'] = current['mtime_ns']
+        meta_path.write_text(json.dumps(meta, indent=2))
+    return True
+
+
+def write_table(df, level, store_dir=STORE_DIR):
+    """Write one level ('facility' or 'company') as year partitions sorted by ticker."""
+    pa = _pyarrow()
+    if pa is None:
+        print("  pyarrow not installed; skipping emissions store")
+        return
+    target = Path(store_dir) / level
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    df = normalize_object_columns(df)
+    if 'naics_code' in df.columns:
+        df['naics_code'] = pd.to_numeric(df['naics_code'], errors='coerce').astype('Int64')
+    for year, part in df.groupby('year', sort=True):
+        part = part.drop(columns='year').sort_values(['ticker', 'facility_id']
+                                                     if 'facility_id' in part.columns else ['ticker'])
+        path = tmp / f"year={int(year)}" / "part-0.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        pa.parquet.write_table(table, path, row_group_size=ROW_GROUP_SIZE)
+
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+
+    # Record which CSV this level mirrors so query_emissions can detect a stale store
+    meta_path = _source_meta_path(level, store_dir)
+    if SOURCES[level].exists():
+        meta_path.write_text(json.dumps(file_fingerprint(SOURCES[level]), indent=2))
+    else:
+        meta_path.unlink(missing_ok=True)
+
+
+def build_store(facilities=None, company_year=None, store_dir=STORE_DIR):
+    """Build the store from frames, or from the processed CSVs when not given.
+
+    Frames passed in must match the processed CSVs already written to disk;
+    their fingerprints are recorded as the store's source.
+    """
+    if facilities is None:
+        facilities = pd.read_csv(SOURCES['facility'])
+    if company_year is None:
+        company_year = pd.read_csv(SOURCES['company'])
+    write_table(facilities, 'facility', store_dir)
+    write_table(company_year, 'company', store_dir)
+
+
+def _naics_bounds(prefix, digits=6):
+    prefix = str(prefix)
+    scale = 10 ** (digits - len(prefix))
+    return int(prefix) * scale, (int(prefix) + 1) * scale
+
+
+def query_emissions(level='company', tickers=None, years=None, states=None,
+                    naics_prefix=None, columns=None, store_dir=STORE_DIR):
+    """Read GHGRP emissions with filters applied at the storage layer.
+
+    Args:
+        level: 'company' (ticker-year panel) or 'facility' (facility-year rows)
+        tickers, years, states: iterables of values to keep (None = all)
+        naics_prefix: NAICS prefix string or list of prefixes (facility level only)
+        columns: columns to return (None = all)
+
+    Returns a DataFrame sorted by ticker and year (and facility_id).
+    """
+    if level not in SOURCES:
+        raise ValueError(f"level must be one of {list(SOURCES)}, got {level!r}")
+    if naics_prefix is not None and level != 'facility':
+        raise ValueError("naics_prefix filters are only available at the facility level")
+
+    prefixes = [naics_prefix] if isinstance(naics_prefix, (str, int)) else naics_prefix
+    state_col = STATE_COLUMN[level]
+    sort_keys = ['ticker', 'year', 'facility_id'] if level == 'facility' else ['ticker', 'year']
+    root = Path(store_dir) / level
+
+    pa = _pyarrow()
+    use_store = pa is not None and root.exists()
+    if use_store and not store_is_current(level, store_dir):
+        warnings.warn(f"emissions store for {level!r} is older than {SOURCES[level].name}; "
+                      f"reading the CSV (rebuild with scripts/emissions_store.py)")
+        use_store = False
+    if use_store:
+        import pyarrow.compute as pc
+
+        conditions = []
+        if years is not None:
+            conditions.append(pc.field('year').isin([int(y) for y in years]))
+        if tickers is not None:
+            conditions.append(pc.field('ticker').isin(list(tickers)))
+        if states is not None:
+            conditions.append(pc.field(state_col).isin(list(states)))
+        if prefixes is not None:
+            naics = None
+            for prefix in prefixes:
+                lo, hi = _naics_bounds(prefix)
+                term = (pc.field('naics_code') >= lo) & (pc.field('naics_code') < hi)
+                naics = term if naics is None else naics | term
+            conditions.append(naics)
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        dataset = pa.dataset.dataset(root, format='parquet', partitioning='hive')
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(sort_keys + list(columns)))
+        df = dataset.to_table(columns=read_columns, filter=expression).to_pandas()
+        df['year'] = df['year'].astype('int64')
+    else:
+        df = pd.read_csv(SOURCES[level])
+        mask = pd.Series(True, index=df.index)
+        if years is not None:
+            mask &= df['year'].isin(list(years))
+        if tickers is not None:
+            mask &= df['ticker'].isin(list(tickers))
+        if states is not None:
+            mask &= df[state_col].isin(list(states))
+        if prefixes is not None:
+            codes = pd.to_numeric(df['naics_code'], errors='coerce')
+            naics = pd.Series(False, index=df.index)
+            for prefix in prefixes:
+                lo, hi = _naics_bounds(prefix)
+                naics |= (codes >= lo) & (codes < hi)
+            mask &= naics
+        df = df[mask]
+        if columns is not None:
+            df = df[list(dict.fromkeys(sort_keys + list(columns)))]
+
+    df = df.sort_values(sort_keys, kind='stable').reset_index(drop=True)
+    if columns is not None:
+        return df[list(columns)]
+    front = ['ticker', 'year']
+    return df[front + [c for c in df.columns if c not in front]]
+
+
+if __name__ == "__main__":
+    print("Building GHGRP emissions store...")
+    build_store()
+    for level in SOURCES:
+        n_years = len(list((STORE_DIR / level).glob("year=*")))
+        print(f"  {level}: {n_years} year partitions -> {STORE_DIR / level}")
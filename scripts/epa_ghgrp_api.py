@@ -1,25 +1,212 @@
 """
 EPA GHGRP Data Download via Envirofacts API
 Downloads facility-level greenhouse gas emissions data
+
+Full tables are fetched page by page: the page plan comes from the table's
+/count endpoint, pages are downloaded concurrently under a shared rate limit
+and each page is streamed into its own part file
+
+    data/epa_ghgrp/parts/{table}/part-00000.csv, part-00001.csv, ...
+
+Part files are only ever added (written to .tmp, then renamed), so an
+interrupted run resumes by skipping the pages already on disk. If the table's
+row count has changed since the parts were planned, they are discarded and the
+table is downloaded again. The planned parts are finally concatenated into one
+CSV per table.
+
+Usage:
+    python scripts/epa_ghgrp_api.py                        # 1,000-row sample
+    python scripts/epa_ghgrp_api.py --full                 # all tables
+    python scripts/epa_ghgrp_api.py --full --workers 4 --rate 2 --page-size 10000
+    python scripts/epa_ghgrp_api.py --full --base-url http://localhost:8000/efservice
 """
 
+import json
+import threading
 import requests
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import time
 
+from instrumentation import instrumented
+
 BASE_DIR = Path("/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research")
 DATA_DIR = BASE_DIR / "data" / "epa_ghgrp"
+PARTS_DIR = DATA_DIR / "parts"
 
 # Envirofacts REST API
 # Documentation: https://www.epa.gov/enviro/envirofacts-data-service-api
+BASE_URL = "https://data.epa.gov/efservice"
+
+# Key GHGRP tables
+# See: https://enviro.epa.gov/envirofacts/ghg/model
+TABLES = {
+    'V_GHG_EMITTER_FACILITIES': 'ghgrp_facilities.csv',      # Facility info
+    'V_GHG_EMITTER_GHG': 'ghgrp_emissions.csv',              # Emissions by facility
+    'V_GHG_EMITTER_SUBPART': 'ghgrp_subparts.csv',           # Subpart details
+}
+
+PAGE_SIZE = 10000
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing request starts at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def get_row_count(table_name, base_url=BASE_URL, session=None):
+    """Total rows in a table from its /count/JSON endpoint."""
+    http = session or requests
+    response = http.get(f"{base_url}/{table_name}/count/JSON", timeout=30)
+    response.raise_for_status()
+    count_data = response.json()
+    if isinstance(count_data, list):
+        count_data = count_data[0] if count_data else {}
+    return int(count_data.get('TOTALQUERYRESULTS', 0))
+
+
+def plan_pages(total_rows, page_size=PAGE_SIZE):
+    """Split a table into (page, first_row, last_row) ranges; Envirofacts rows/a:b is inclusive."""
+    return [(page, start, min(start + page_size, total_rows) - 1)
+            for page, start in enumerate(range(0, total_rows, page_size))]
+
+
+def part_path(parts_dir, page):
+    return Path(parts_dir) / f"part-{page:05d}.csv"
+
+
+@instrumented('fetch_page')
+def fetch_page(session, url, path, limiter, retries=5, backoff=2.0, chunk_size=1 << 16):
+    """Stream one page into `path` (via a .tmp file); returns bytes written."""
+    tmp = path.with_suffix('.csv.tmp')
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            with session.get(url, stream=True, timeout=(30, 300)) as response:
+                if response.status_code in RETRY_STATUS and attempt < retries:
+                    raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                response.raise_for_status()
+                size = 0
+                with open(tmp, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        size += len(chunk)
+            tmp.replace(path)
+            return size
+        except requests.RequestException:
+            tmp.unlink(missing_ok=True)
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
 
-def download_ghgrp_data(table_name, rows=10000, start=0):
-    """Download data from EPA Envirofacts API"""
+
+def load_plan(parts_dir, table_name, total_rows, page_size):
+    """Reuse the page plan of an interrupted run so existing parts stay valid.
+
+    Pages are row-offset slices, so when the table's row count has changed
+    every existing part may be shifted; the parts are then discarded and the
+    table is planned from scratch.
+    """
+    parts_dir = Path(parts_dir)
+    plan_file = parts_dir / "plan.json"
+    if plan_file.exists():
+        plan = json.loads(plan_file.read_text())
+        if plan['total_rows'] == total_rows:
+            page_size = plan['page_size']
+        else:
+            stale = list(parts_dir.glob("part-*.csv"))
+            print(f"  Row count changed ({plan['total_rows']:,} -> {total_rows:,}); "
+                  f"discarding {len(stale)} existing parts")
+            for part in stale:
+                part.unlink()
+    plan = {'table': table_name, 'total_rows': total_rows, 'page_size': page_size}
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    plan_file.write_text(json.dumps(plan, indent=2))
+    return plan
+
+
+def download_table(table_name, base_url=BASE_URL, parts_dir=None, page_size=PAGE_SIZE,
+                   workers=4, rate=2.0, retries=5):
+    """Download a full table into part files, skipping pages already on disk.
+
+    Returns the directory holding the part files.
+    """
+    parts_dir = Path(parts_dir or PARTS_DIR / table_name)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(workers, 1))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    total_rows = get_row_count(table_name, base_url, session)
+    plan = load_plan(parts_dir, table_name, total_rows, page_size)
+    pages = plan_pages(total_rows, plan['page_size'])
+    todo = [p for p in pages if not part_path(parts_dir, p[0]).exists()]
+    print(f"Table {table_name}: {total_rows:,} rows, {len(pages)} pages "
+          f"({len(pages) - len(todo)} already downloaded)")
+
+    limiter = RateLimiter(rate)
+    start_time = time.time()
+    done_bytes = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(fetch_page, session, f"{base_url}/{table_name}/rows/{first}:{last}/CSV",
+                        part_path(parts_dir, page), limiter, retries): page
+            for page, first, last in todo
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            done_bytes += future.result()
+            if i % 10 == 0 or i == len(futures):
+                print(f"  {i}/{len(futures)} pages, {done_bytes / 1e6:.1f} MB "
+                      f"({time.time() - start_time:.1f}s)")
+    return parts_dir
+
+
+def combine_parts(parts_dir, output_path):
+    """Concatenate the planned part files in page order into one CSV, keeping the first header only."""
+    plan = json.loads((Path(parts_dir) / "plan.json").read_text())
+    parts = [part_path(parts_dir, page) for page, _, _ in plan_pages(plan['total_rows'], plan['page_size'])]
+    missing = [part.name for part in parts if not part.exists()]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} planned parts not downloaded yet (first: {missing[0]})")
+    tmp = Path(output_path).with_suffix('.csv.tmp')
+    rows = 0
+    header = None
+    with open(tmp, 'wb') as out:
+        for part in parts:
+            with open(part, 'rb') as f:
+                first = f.readline()
+                if header is None:
+                    header = first
+                    out.write(first)
+                elif first != header:
+                    raise ValueError(f"{part.name}: header differs from the first part")
+                for line in f:
+                    out.write(line)
+                    rows += 1
+    tmp.replace(output_path)
+    return rows
+
+
+def download_ghgrp_data(table_name, rows=10000, start=0, base_url=BASE_URL):
+    """Download a single row range from EPA Envirofacts API (used for samples)"""
     # API endpoint format: https://data.epa.gov/efservice/{table}/JSON
     # or CSV: https://data.epa.gov/efservice/{table}/rows/{start}:{end}/CSV
 
-    base_url = f"https://data.epa.gov/efservice/{table_name}"
+    base_url = f"{base_url}/{table_name}"
 
     try:
         # Get row count first
@@ -46,37 +233,28 @@ def download_ghgrp_data(table_name, rows=10000, start=0):
         print(f"Error downloading {table_name}: {e}")
         return None, None
 
-def download_all_ghgrp_tables():
-    """Download key GHGRP tables"""
+def download_all_ghgrp_tables(base_url=BASE_URL, data_dir=DATA_DIR, page_size=PAGE_SIZE,
+                               workers=4, rate=2.0):
+    """Download the complete key GHGRP tables"""
     print("="*60)
     print("EPA GHGRP Data Download via Envirofacts API")
     print("="*60)
 
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-    # Key GHGRP tables
-    # See: https://enviro.epa.gov/envirofacts/ghg/model
-    tables = {
-        'V_GHG_EMITTER_FACILITIES': 'ghgrp_facilities.csv',      # Facility info
-        'V_GHG_EMITTER_GHG': 'ghgrp_emissions.csv',              # Emissions by facility
-        'V_GHG_EMITTER_SUBPART': 'ghgrp_subparts.csv',           # Subpart details
-    }
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
 
-    for table, filename in tables.items():
+    for table, filename in TABLES.items():
         print(f"\n--- Downloading {table} ---")
-        csv_data, total = download_ghgrp_data(table, rows=50000)
+        try:
+            parts_dir = download_table(table, base_url, data_dir / "parts" / table,
+                                       page_size=page_size, workers=workers, rate=rate)
+        except Exception as e:
+            print(f"Error downloading {table}: {e} (rerun to resume)")
+            continue
 
-        if csv_data:
-            output_path = DATA_DIR / filename
-            with open(output_path, 'w') as f:
-                f.write(csv_data)
-
-            # Verify
-            df = pd.read_csv(output_path)
-            print(f"Saved: {output_path} ({len(df):,} rows, {len(df.columns)} columns)")
-            print(f"Columns: {list(df.columns)[:5]}...")
-
-        time.sleep(1)
+        output_path = data_dir / filename
+        n_rows = combine_parts(parts_dir, output_path)
+        print(f"Saved: {output_path} ({n_rows:,} rows)")
 
 def quick_test():
     """Test API with a small sample"""
@@ -103,7 +281,16 @@ def quick_test():
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) > 1 and sys.argv[1] == '--full':
-        download_all_ghgrp_tables()
+    args = sys.argv[1:]
+
+    def option(name, default, cast):
+        return cast(args[args.index(name) + 1]) if name in args else default
+
+    if '--full' in args:
+        download_all_ghgrp_tables(base_url=option('--base-url', BASE_URL, str),
+                                  data_dir=option('--data-dir', DATA_DIR, Path),
+                                  page_size=option('--page-size', PAGE_SIZE, int),
+                                  workers=option('--workers', 4, int),
+                                  rate=option('--rate', 2.0, float))
     else:
         quick_test()
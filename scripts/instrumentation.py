@@ -0,0 +1,359 @@
+"""
+Stage instrumentation: wall time, CPU time, peak RSS, rows in/out and cache hits.
+
+    from instrumentation import instrumented, stage
+
+    with stage('parse_ghgp_year', year=2023) as s:
+        df = pd.read_excel(path)
+        s.rows_out = len(df)
+
+    @instrumented('feols', rows_in=lambda data, *args, **kwargs: len(data),
+                  rows_out=lambda result: result.nobs)
+    def feols(data, ...): ...
+
+    with stage('load_panel') as s:
+        s.cache_hit()                  # or s.cache_miss()
+
+Each finished stage becomes one event: name, wall and CPU seconds, peak RSS
+(the process high-water mark at the end of the stage, and how much the stage
+raised it), rows in/out, cache hits/misses, any extra keyword attributes, and
+the exception type if the stage raised. Nested stages record their parent;
+times are inclusive. CPU time is process-wide, so it includes other threads.
+
+Tracing is opt-in, so importing an instrumented module (e.g. fixed_effects
+from a notebook) records and writes nothing. It is on when ESG_TRACE is set
+to a file path, or to 1/on/true for analysis/.pipeline/traces/<script>.jsonl
+(started fresh when the run enters its first stage), and when a caller starts
+a trace itself with start_trace(): the pipeline runner points ESG_TRACE at one
+file for all its stages, so a full run ends up in a single trace, and the esg
+worker traces to analysis/.pipeline/traces/esg.jsonl. The setting is passed
+on to child processes.
+
+While tracing, events are appended to the trace when the process exits
+(events from a multiprocessing worker as soon as its top-level stage ends,
+since workers skip exit handlers) and a summary table goes to stderr. Set
+ESG_TRACE_CHROME to a path to also export the trace in Chrome trace format
+(chrome://tracing or ui.perfetto.dev), which shows the run as a flame chart
+per process and thread.
+
+    ESG_TRACE=1 python analysis/02_diff_in_diff_analysis.py
+
+Usage:
+    python scripts/instrumentation.py summary TRACE.jsonl
+    python scripts/instrumentation.py chrome TRACE.jsonl [OUTPUT.json]
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROJECT_ROOT = Path(__file__).parent.parent
+TRACE_DIR = PROJECT_ROOT / "analysis" / ".pipeline" / "traces"
+
+TRACE_ON = ('1', 'on', 'true', 'yes')
+TRACE_OFF = ('0', 'off', 'false', 'no')
+
+_events = []
+_summarized = 0   # trace offset up to which events have been summarized
+_exit_registered = False
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def maxrss_mb(maxrss):
+    """Convert a getrusage ru_maxrss value to MB (kilobytes on Linux, bytes on macOS)."""
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident set size, in MB (None if unknown)."""
+    if resource is None:
+        return None
+    return maxrss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _setting():
+    return os.environ.get('ESG_TRACE', '').strip()
+
+
+def tracing_enabled():
+    """True when this process records stages (ESG_TRACE set and not off)."""
+    setting = _setting().lower()
+    return bool(setting) and setting not in TRACE_OFF
+
+
+def start_trace(default):
+    """Turn tracing on for this run; returns the trace file, or None when ESG_TRACE is off.
+
+    An ESG_TRACE path wins; otherwise `default` is started empty and exported
+    through ESG_TRACE, so child processes append to the same file.
+    """
+    global _summarized
+    setting = _setting()
+    if setting.lower() in TRACE_OFF:
+        return None
+    _register_exit()
+    if setting and setting.lower() not in TRACE_ON:
+        return Path(setting)
+    path = Path(default)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("")
+    _summarized = 0
+    os.environ['ESG_TRACE'] = str(path)
+    return path
+
+
+def trace_path():
+    """JSONL trace of this run, or None when tracing is off."""
+    if not tracing_enabled():
+        return None
+    if _setting().lower() in TRACE_ON:
+        if _in_worker():
+            return None  # the parent process never started a trace
+        return start_trace(TRACE_DIR / f"{_process_name()}.jsonl")
+    return Path(_setting())
+
+
+def _register_exit():
+    global _exit_registered
+    if not _exit_registered:
+        atexit.register(flush)
+        _exit_registered = True
+
+
+def _in_worker():
+    """True in a multiprocessing child, which exits without running atexit handlers."""
+    mp = sys.modules.get('multiprocessing')
+    return mp is not None and mp.parent_process() is not None
+
+
+def _process_name():
+    return Path(sys.argv[0]).stem if sys.argv and sys.argv[0] not in ('', '-c') else 'python'
+
+
+class Stage:
+    """One timed stage; use through `stage(...)`."""
+
+    def __init__(self, name, rows_in=None, **attrs):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.attrs = attrs
+        # Measured on exit unless set by the caller (e.g. for a child process)
+        self.cpu_s = None
+        self.peak_rss_mb = None
+
+    def cache_hit(self, n=1):
+        self.cache_hits += n
+
+    def cache_miss(self, n=1):
+        self.cache_misses += n
+
+    def __enter__(self):
+        if (tracing_enabled() and not _in_worker()
+                and os.environ.get('ESG_TRACE_ROOT') != str(os.getpid())):
+            # Start the trace before any worker processes are created, so they
+            # inherit it and tag their events with this run
+            trace_path()
+            os.environ['ESG_TRACE_ROOT'] = str(os.getpid())
+        stack = getattr(_local, 'stack', None)
+        if stack is None or _local.pid != os.getpid():
+            # A forked worker starts its own stack rather than the parent's
+            stack = _local.stack = []
+            _local.pid = os.getpid()
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        self._rss0 = peak_rss_mb()
+        self._start = time.time()
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall0
+        cpu = time.process_time() - self._cpu0
+        _local.stack.pop()
+        if not tracing_enabled():
+            return False
+        rss = peak_rss_mb()
+        event = {
+            'name': self.name,
+            'process': _process_name(),
+            'pid': os.getpid(),
+            'root': int(os.environ.get('ESG_TRACE_ROOT', os.getpid())),
+            'tid': threading.get_ident(),
+            'start': self._start,
+            'wall_s': wall,
+            'cpu_s': cpu if self.cpu_s is None else self.cpu_s,
+            'peak_rss_mb': rss if self.peak_rss_mb is None else self.peak_rss_mb,
+            'rss_growth_mb': (rss - self._rss0) if self.peak_rss_mb is None and rss is not None else None,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'depth': self.depth,
+            'parent': self.parent,
+        }
+        if self.attrs:
+            event['attrs'] = {k: v if isinstance(v, (int, float, str, bool, type(None))) else str(v)
+                              for k, v in self.attrs.items()}
+        if exc_type is not None:
+            event['error'] = exc_type.__name__
+        with _lock:
+            _events.append(event)
+        if self.depth == 0 and _in_worker():
+            flush(summary=False)
+        return False
+
+
+def stage(name, rows_in=None, **attrs):
+    """Context manager timing the enclosed block as stage `name`."""
+    return Stage(name, rows_in=rows_in, **attrs)
+
+
+def instrumented(name=None, rows_in=None, rows_out=None):
+    """Decorator timing every call as a stage.
+
+    Args:
+        name: stage name (default: the function's qualified name)
+        rows_in: callable(*args, **kwargs) -> rows going in
+        rows_out: callable(result) -> rows coming out
+    """
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(label, rows_in=rows_in(*args, **kwargs) if rows_in else None) as s:
+                result = func(*args, **kwargs)
+                if rows_out is not None:
+                    s.rows_out = rows_out(result)
+                return result
+        return wrapper
+    return decorate
+
+
+def flush(summary=True, file=None):
+    """Append this process's pending events to the trace and print the summary table.
+
+    The summary covers the events of this run written since the last flush,
+    including those of its worker processes. Called at exit; long-lived
+    processes (the esg worker) call it after each run.
+    """
+    global _summarized
+    with _lock:
+        # A forked child inherits its parent's unflushed events; write only its own
+        events = [e for e in _events if e['pid'] == os.getpid()]
+        _events.clear()
+    if not events:
+        return
+    path = trace_path()
+    if path is None:
+        return
+    with open(path, 'a') as f:
+        f.write("".join(json.dumps(e) + "\n" for e in events))
+    if _in_worker():
+        return
+    chrome = os.environ.get('ESG_TRACE_CHROME')
+    if chrome:
+        export_chrome_trace(read_trace(path), chrome)
+    if summary:
+        with open(path) as f:
+            f.seek(_summarized)
+            lines = f.read().splitlines()
+            _summarized = f.tell()
+        run = [e for e in map(json.loads, filter(str.strip, lines)) if e.get('root') == os.getpid()]
+        print_summary(run, file=file or sys.stderr, title=f"STAGE TIMINGS ({path})")
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(events):
+    """Per-stage totals: calls, wall, CPU, max peak RSS, rows and cache hits/misses."""
+    table = {}
+    for e in events:
+        row = table.setdefault(e['name'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_mb': None,
+                                           'rows_in': None, 'rows_out': None,
+                                           'cache_hits': 0, 'cache_misses': 0, 'errors': 0})
+        row['calls'] += 1
+        row['wall_s'] += e['wall_s']
+        row['cpu_s'] += e['cpu_s'] or 0.0
+        if e.get('peak_rss_mb') is not None:
+            row['peak_rss_mb'] = max(row['peak_rss_mb'] or 0.0, e['peak_rss_mb'])
+        for key in ('rows_in', 'rows_out'):
+            if e.get(key) is not None:
+                row[key] = (row[key] or 0) + e[key]
+        row['cache_hits'] += e.get('cache_hits', 0)
+        row['cache_misses'] += e.get('cache_misses', 0)
+        row['errors'] += 'error' in e
+    return dict(sorted(table.items(), key=lambda item: -item[1]['wall_s']))
+
+
+def print_summary(events, file=None, title=None):
+    file = file or sys.stdout
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else '-'
+
+    print("=" * 60, file=file)
+    print(title or "STAGE TIMINGS", file=file)
+    print("=" * 60, file=file)
+    print(f"{'stage':32s} {'calls':>6s} {'wall s':>9s} {'cpu s':>9s} {'peak MB':>8s} "
+          f"{'rows in':>10s} {'rows out':>10s} {'cache h/m':>11s}", file=file)
+    for name, row in summarize(events).items():
+        cache = f"{row['cache_hits']}/{row['cache_misses']}" if row['cache_hits'] or row['cache_misses'] else '-'
+        errors = f"  ({row['errors']} failed)" if row['errors'] else ''
+        print(f"{name[:32]:32s} {row['calls']:6d} {row['wall_s']:9.3f} {row['cpu_s']:9.3f} "
+              f"{fmt(row['peak_rss_mb'], '8.0f'):>8s} {fmt(row['rows_in'], 'd'):>10s} "
+              f"{fmt(row['rows_out'], 'd'):>10s} {cache:>11s}{errors}", file=file)
+
+
+def export_chrome_trace(events, path):
+    """Write events in Chrome trace format (complete 'X' events, one row per process/thread)."""
+    trace = []
+    for pid, process in sorted({(e['pid'], e['process']) for e in events}):
+        trace.append({'ph': 'M', 'name': 'process_name', 'pid': pid, 'tid': 0,
+                      'args': {'name': f"{process} ({pid})"}})
+    for e in events:
+        args = {key: e[key] for key in ('cpu_s', 'peak_rss_mb', 'rss_growth_mb', 'rows_in', 'rows_out',
+                                        'cache_hits', 'cache_misses', 'error') if e.get(key) is not None}
+        args.update(e.get('attrs', {}))
+        trace.append({'name': e['name'], 'cat': e['process'], 'ph': 'X', 'pid': e['pid'], 'tid': e['tid'],
+                      'ts': e['start'] * 1e6, 'dur': e['wall_s'] * 1e6, 'args': args})
+    tmp = Path(str(path) + ".tmp")
+    tmp.write_text(json.dumps({'traceEvents': trace, 'displayTimeUnit': 'ms'}))
+    os.replace(tmp, path)
+
+
+if tracing_enabled():
+    _register_exit()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ('summary', 'chrome'):
+        print(__doc__)
+        sys.exit(2)
+    events = read_trace(args[1])
+    if args[0] == 'summary':
+        print_summary(events, title=f"STAGE TIMINGS ({args[1]})")
+    else:
+        output = args[2] if len(args) > 2 else str(Path(args[1]).with_suffix('.chrome.json'))
+        export_chrome_trace(events, output)
+        print(f"Saved: {output} ({len(events)} events; open in chrome://tracing or ui.perfetto.dev)")
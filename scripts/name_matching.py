@@ -0,0 +1,239 @@
+"""
+Company name matching helpers shared by the GHGRP processors.
+
+- AhoCorasick: multi-pattern substring automaton (longest pattern wins)
+- TickerMatcher: exact -> suffix-stripped -> substring lookup of parent names,
+  resolved once per distinct name and mapped back onto a Series
+- FuzzyMatcher: n-gram blocked, batched fuzzy matching (rapidfuzz kernels)
+
+Requires rapidfuzz (pip install rapidfuzz), which replaces fuzzywuzzy.
+"""
+
+import re
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+
+SUFFIX_RE = re.compile(
+    r'\s+(CORP|CORPORATION|INC|CO|COMPANY|LTD|LLC|PLC|LP|&|HOLDING|HOLDINGS|GROUP|ENTERPRISES?)\.?$')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over a {pattern: value} mapping.
+
+    `longest_match` returns the value of the longest pattern occurring anywhere
+    in the text; ties go to the pattern inserted first.
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        # Best output reachable from each node: (length, -priority, value)
+        self.best = [None]
+
+        for priority, (pattern, value) in enumerate(patterns.items()):
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(None)
+                node = nxt
+            candidate = (len(pattern), -priority, value)
+            if self.best[node] is None or candidate[:2] > self.best[node][:2]:
+                self.best[node] = candidate
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                inherited = self.best[self.fail[child]]
+                if inherited is not None and (self.best[child] is None
+                                              or inherited[:2] > self.best[child][:2]):
+                    self.best[child] = inherited
+
+    def longest_match(self, text):
+        """Return the value of the longest pattern contained in `text`, or None."""
+        goto, fail, best_at = self.goto, self.fail, self.best
+        node = 0
+        best = None
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = best_at[node]
+            if hit is not None and (best is None or hit[:2] > best[:2]):
+                best = hit
+        return best[2] if best is not None else None
+
+
+class TickerMatcher:
+    """Resolve parent company names to tickers.
+
+    Lookup order: exact name, name with corporate suffixes removed, then the
+    longest known pattern (over `min_partial_len` characters) contained in the name.
+    Instances are callable on a single name; use `match_many` for a whole column.
+    """
+
+    def __init__(self, matches, min_partial_len=6):
+        self.matches = dict(matches)
+        self.automaton = AhoCorasick(
+            {key: ticker for key, ticker in self.matches.items() if len(key) >= min_partial_len})
+
+    def __call__(self, parent_name):
+        if pd.isna(parent_name):
+            return None
+        name = str(parent_name).upper().strip()
+
+        ticker = self.matches.get(name)
+        if ticker is not None:
+            return ticker
+
+        cleaned = WHITESPACE_RE.sub(' ', SUFFIX_RE.sub('', name)).strip()
+        ticker = self.matches.get(cleaned)
+        if ticker is not None:
+            return ticker
+
+        return self.automaton.longest_match(name)
+
+    @instrumented('ticker_match', rows_in=lambda self, names: len(names), rows_out=len)
+    def match_many(self, names):
+        """Match a Series of names, resolving each distinct name only once."""
+        names = pd.Series(names)
+        uniques = names.dropna().unique()
+        lookup = {name: self(name) for name in uniques}
+        return names.map(lookup)
+
+
+class FuzzyMatcher:
+    """Blocked fuzzy matcher from free-text names to a fixed list of choices.
+
+    Candidates are shortlisted through a character n-gram index (a sparse
+    query x choice shared-gram count), then all shortlisted pairs are scored in
+    one rapidfuzz `cpdist` call spread over `workers` threads (-1 = all cores).
+    The best-scoring choice per name is kept if it reaches `threshold`; ties go
+    to the earlier choice, as with `process.extractOne`.
+    """
+
+    def __init__(self, choices, scorer='token_sort_ratio', threshold=85,
+                 ngram_size=3, max_candidates=10, min_shared_ngrams=2, workers=-1):
+        from rapidfuzz import fuzz, utils
+
+        self.choices = list(choices)
+        self.scorer = getattr(fuzz, scorer) if isinstance(scorer, str) else scorer
+        self.processor = utils.default_process
+        self.threshold = threshold
+        self.ngram_size = ngram_size
+        self.max_candidates = max_candidates
+        self.min_shared_ngrams = min_shared_ngrams
+        self.workers = workers
+        self.timing = {}
+
+        self.vocab = {}
+        self.choice_grams = self._gram_matrix([self.processor(c) for c in self.choices], grow=True)
+
+    def _ngrams(self, text):
+        padded = f" {text} "
+        n = self.ngram_size
+        return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+    def _gram_matrix(self, texts, grow=False):
+        from scipy import sparse
+
+        rows, cols = [], []
+        for i, text in enumerate(texts):
+            for gram in self._ngrams(text):
+                col = self.vocab.get(gram)
+                if col is None:
+                    if not grow:
+                        continue
+                    col = self.vocab[gram] = len(self.vocab)
+                rows.append(i)
+                cols.append(col)
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csr_matrix((data, (rows, cols)), shape=(len(texts), max(len(self.vocab), 1)))
+
+    def _candidate_pairs(self, processed):
+        """Return (query_idx, choice_idx) arrays of shortlisted pairs."""
+        query_grams = self._gram_matrix(processed)
+        query_grams.resize((len(processed), self.choice_grams.shape[1]))
+        shared = (query_grams @ self.choice_grams.T).tocsr()
+
+        q_idx, c_idx = [], []
+        for i in range(shared.shape[0]):
+            start, end = shared.indptr[i], shared.indptr[i + 1]
+            counts = shared.data[start:end]
+            cols = shared.indices[start:end]
+            keep = counts >= self.min_shared_ngrams
+            counts, cols = counts[keep], cols[keep]
+            if len(cols) > self.max_candidates:
+                top = np.argpartition(-counts, self.max_candidates - 1)[:self.max_candidates]
+                cols = cols[top]
+            q_idx.append(np.full(len(cols), i))
+            c_idx.append(cols)
+        if not q_idx:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        return np.concatenate(q_idx).astype(int), np.concatenate(c_idx).astype(int)
+
+    @instrumented('fuzzy_match', rows_in=lambda self, names: len(names), rows_out=len)
+    def match(self, names):
+        """Match names to choices; returns a DataFrame of name, match, score."""
+        from rapidfuzz.process import cpdist
+
+        names = list(names)
+        result = pd.DataFrame({'name': names, 'match': None, 'score': np.nan})
+        self.timing = {'names': len(names), 'candidate_pairs': 0,
+                       'full_pairs': len(names) * len(self.choices),
+                       'blocking_s': 0.0, 'scoring_s': 0.0}
+        if not names:
+            return result
+
+        start = time.perf_counter()
+        processed = [self.processor(n) for n in names]
+        q_idx, c_idx = self._candidate_pairs(processed)
+        block_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if len(q_idx):
+            scores = cpdist([names[i] for i in q_idx], [self.choices[j] for j in c_idx],
+                            scorer=self.scorer, processor=self.processor, workers=self.workers)
+            order = np.lexsort((c_idx, -scores, q_idx))
+            q_sorted = q_idx[order]
+            first = order[np.r_[True, q_sorted[1:] != q_sorted[:-1]]]
+            first = first[scores[first] >= self.threshold]
+            result.loc[q_idx[first], 'match'] = [self.choices[j] for j in c_idx[first]]
+            result.loc[q_idx[first], 'score'] = scores[first]
+        score_time = time.perf_counter() - start
+
+        self.timing = {
+            'names': len(names),
+            'candidate_pairs': int(len(q_idx)),
+            'full_pairs': len(names) * len(self.choices),
+            'blocking_s': block_time,
+            'scoring_s': score_time,
+        }
+        return result
+
+    def report_timing(self):
+        t = self.timing
+        if not t:
+            return
+        print(f"  Fuzzy engine: {t['names']:,} names, {t['candidate_pairs']:,} candidate pairs "
+              f"(of {t['full_pairs']:,}); blocking {t['blocking_s']:.3f}s, scoring {t['scoring_s']:.3f}s")
@@ -0,0 +1,101 @@
+"""
+Time-varying GHGRP parent-company ownership.
+
+The EPA parent company workbook has one snapshot per reporting year. These
+helpers collapse the snapshots into validity intervals per facility (a new
+spell starts whenever the set of parents or their percentages changes) and
+resolve every facility-year to its contemporaneous parents with a vectorized
+as-of join:
+
+- a facility-year takes the latest spell starting at or before that year;
+- years before a facility's first snapshot take its earliest spell.
+"""
+
+import numpy as np
+import pandas as pd
+
+OPEN_END = 9999
+
+
+def build_ownership_intervals(history):
+    """Collapse yearly parent snapshots into (facility_id, valid_from, valid_to) spells.
+
+    `history` needs facility_id, year, parent_company and ownership_pct; any
+    other columns (e.g. clean_parent, ticker) are carried along. Parent row
+    order within a snapshot is preserved, so the first row remains the
+    facility's primary parent.
+    """
+    history = history.dropna(subset=['facility_id', 'year']).copy()
+    history['facility_id'] = history['facility_id'].astype(int)
+    history['year'] = history['year'].astype(int)
+    history['parent_order'] = history.groupby(['facility_id', 'year']).cumcount()
+
+    # Order-independent signature of each facility-year's parent set
+    row_hash = pd.util.hash_pandas_object(
+        history[['parent_company', 'ownership_pct']].astype(str), index=False)
+    history['row_hash'] = row_hash.to_numpy()
+    snapshots = (history.groupby(['facility_id', 'year'])['row_hash']
+                 .sum().rename('signature').reset_index()
+                 .sort_values(['facility_id', 'year']))
+
+    new_facility = snapshots['facility_id'].ne(snapshots['facility_id'].shift())
+    changed = snapshots['signature'].ne(snapshots['signature'].shift())
+    spell_starts = snapshots[new_facility | changed].copy()
+    spell_starts = spell_starts.rename(columns={'year': 'valid_from'})
+
+    next_start = spell_starts.groupby('facility_id')['valid_from'].shift(-1)
+    spell_starts['valid_to'] = (next_start - 1).fillna(OPEN_END).astype(int)
+
+    intervals = history.merge(spell_starts[['facility_id', 'valid_from', 'valid_to']],
+                              left_on=['facility_id', 'year'],
+                              right_on=['facility_id', 'valid_from'])
+    intervals = (intervals
+                 .drop(columns=['year', 'row_hash'])
+                 .sort_values(['facility_id', 'valid_from', 'parent_order'])
+                 .reset_index(drop=True))
+    return intervals
+
+
+def resolve_parents(facility_years, intervals):
+    """Attach contemporaneous parent rows to facility-year keys.
+
+    Returns one row per (facility_id, year, parent), ordered so the primary
+    parent comes first; facility-years without any ownership history are
+    dropped.
+    """
+    keys = (facility_years[['facility_id', 'year']]
+            .drop_duplicates()
+            .astype({'facility_id': int, 'year': int})
+            .sort_values('year'))
+    spells = (intervals[['facility_id', 'valid_from']]
+              .drop_duplicates()
+              .astype({'facility_id': int, 'valid_from': int})
+              .sort_values('valid_from'))
+
+    resolved = pd.merge_asof(keys, spells, left_on='year', right_on='valid_from',
+                             by='facility_id', direction='backward')
+    before_first = resolved['valid_from'].isna()
+    if before_first.any():
+        earliest = pd.merge_asof(resolved.loc[before_first, ['facility_id', 'year']], spells,
+                                 left_on='year', right_on='valid_from',
+                                 by='facility_id', direction='forward')
+        resolved.loc[before_first, 'valid_from'] = earliest['valid_from'].to_numpy()
+    resolved = resolved.dropna(subset=['valid_from'])
+    resolved['valid_from'] = resolved['valid_from'].astype(int)
+
+    parents = resolved.merge(intervals, on=['facility_id', 'valid_from'])
+    return (parents
+            .sort_values(['facility_id', 'year', 'parent_order'])
+            .drop(columns=['valid_from', 'valid_to', 'parent_order'])
+            .reset_index(drop=True))
+
+
+def primary_parents(parents):
+    """Keep the first (primary) parent per facility-year."""
+    return parents.drop_duplicates(subset=['facility_id', 'year'])
+
+
+def changed_ownership(intervals):
+    """Facilities with more than one ownership spell (M&A, divestitures, ...)."""
+    n_spells = intervals.groupby('facility_id')['valid_from'].nunique()
+    return np.asarray(n_spells.index[n_spells > 1])
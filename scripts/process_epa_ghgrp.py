@@ -6,15 +6,18 @@ INSTRUCTIONS:
 1. Download EPA GHGRP data from: https://www.epa.gov/ghgreporting/data-sets
 2. Download "Data Summary Spreadsheets" and "Parent Company Data"
 3. Extract to: data/epa_ghgrp/raw/
-4. Run this script: python scripts/process_epa_ghgrp.py
+4. Install the fuzzy matcher (replaces fuzzywuzzy): pip install rapidfuzz
+5. Run this script: python scripts/process_epa_ghgrp.py
 """
 
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import re
-from fuzzywuzzy import fuzz, process
 import warnings
+
+from ghgrp_aggregation import group_mode
+from name_matching import FuzzyMatcher
 warnings.filterwarnings('ignore')
 
 BASE_DIR = Path("/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research")
@@ -182,7 +185,8 @@ def load_emissions_data():
 
     return None
 
-def match_to_sp500(df, name_to_ticker, sp500_names):
+def match_to_sp500(df, name_to_ticker, sp500_names, scorer='token_sort_ratio',
+                   threshold=85, workers=-1):
     """Match parent companies to S&P 500 tickers"""
     print("\nMatching companies to S&P 500...")
 
@@ -190,8 +194,10 @@ def match_to_sp500(df, name_to_ticker, sp500_names):
         print("  ERROR: No parent_company column")
         return df
 
-    # Clean names
-    df['clean_parent'] = df['parent_company'].apply(clean_company_name)
+    # Clean names (once per distinct parent)
+    parents = df['parent_company'].dropna().unique()
+    clean_lookup = {name: clean_company_name(name) for name in parents}
+    df['clean_parent'] = df['parent_company'].map(clean_lookup).fillna("")
 
     # Direct matching
     df['ticker'] = df['clean_parent'].map(name_to_ticker)
@@ -201,27 +207,18 @@ def match_to_sp500(df, name_to_ticker, sp500_names):
 
     # Fuzzy matching for unmatched
     unmatched = df[df['ticker'].isna()]['clean_parent'].unique()
+    unmatched = [name for name in unmatched if name and len(name) >= 3]
     print(f"  Attempting fuzzy match for {len(unmatched):,} unique companies...")
 
-    fuzzy_matches = {}
-    match_count = 0
-    for name in unmatched:
-        if not name or len(name) < 3:
-            continue
-
-        match = process.extractOne(name, sp500_names, scorer=fuzz.token_sort_ratio)
-        if match and match[1] >= 85:  # 85% similarity threshold
-            fuzzy_matches[name] = name_to_ticker.get(match[0])
-            match_count += 1
+    matcher = FuzzyMatcher(sp500_names, scorer=scorer, threshold=threshold, workers=workers)
+    fuzzy = matcher.match(unmatched).dropna(subset=['match'])
+    fuzzy_matches = dict(zip(fuzzy['name'], fuzzy['match'].map(name_to_ticker)))
+    matcher.report_timing()
 
-    print(f"  Fuzzy matches found: {match_count}")
+    print(f"  Fuzzy matches found: {len(fuzzy_matches)}")
 
     # Apply fuzzy matches
-    df['ticker'] = df.apply(
-        lambda row: row['ticker'] if pd.notna(row['ticker'])
-                    else fuzzy_matches.get(row['clean_parent']),
-        axis=1
-    )
+    df['ticker'] = df['ticker'].fillna(df['clean_parent'].map(fuzzy_matches))
 
     total_matched = df['ticker'].notna().sum()
     print(f"  Total matched: {total_matched:,} ({total_matched/len(df)*100:.1f}%)")
@@ -281,12 +278,11 @@ def process_all():
     company_year = matched_facilities.groupby(['ticker', 'year']).agg({
         'total_emissions': 'sum',
         'facility_id': 'nunique',
-        'state': lambda x: x.mode().iloc[0] if len(x.mode()) > 0 else None,
     }).reset_index()
-    company_year = company_year.rename(columns={
-        'facility_id': 'num_facilities',
-        'state': 'primary_state'
-    })
+    company_year = company_year.rename(columns={'facility_id': 'num_facilities'})
+    primary_state = group_mode(matched_facilities, ['ticker', 'year'], 'state')
+    company_year = company_year.merge(primary_state.rename('primary_state').reset_index(),
+                                      on=['ticker', 'year'], how='left')
 
     if len(company_year) > 0:
         company_file = OUTPUT_DIR / "ghgrp_company_year_sp500.csv"
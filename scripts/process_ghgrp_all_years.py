@@ -1,18 +1,48 @@
 """
-Process EPA GHGRP data for all years (2010-2023) and match to S&P 500 companies.
+Process EPA GHGRP data for all years (2010 onward) and match to S&P 500 companies.
 
-Strategy: Use 2023 parent company data and apply it to all years via stable facility IDs.
+Strategy: Build a parent-company ownership history (validity intervals per facility)
+from every yearly parent snapshot, and resolve each facility-year to its
+contemporaneous parents with an as-of join on stable facility IDs.
 
 Outputs:
 - ghgrp_facilities_all_years.csv: All facilities with emissions by year
 - ghgrp_facilities_sp500_all_years.csv: S&P 500 matched facilities with emissions by year
 - ghgrp_company_year_sp500_all_years.csv: Company-year aggregated emissions for S&P 500
+- ghgrp_company_year_sp500_equity_all_years.csv: Same, weighted by parent ownership share
+- ghgrp_parent_ownership_history.csv: Facility-parent ownership spells (valid_from, valid_to)
+
+Usage:
+    python scripts/process_ghgrp_all_years.py [--workers N] [--no-cache] [--full]
+
+Parsed yearly spreadsheets are cached as Parquet under data/epa_ghgrp/cache/,
+keyed by each source file's size, mtime and SHA-256, so reruns skip Excel parsing.
+
+Runs are incremental: data/epa_ghgrp/cache/manifest.json records the hashes of
+the raw inputs (yearly spreadsheets, parent company workbook, S&P 500 list) and
+of the processing code. Only year partitions whose spreadsheet changed are
+rebuilt, unless the shared inputs changed, in which case every year is; the
+all-year outputs are then re-assembled from the partitions. --full forces a
+complete rebuild.
 """
 
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import re
+from concurrent.futures import ProcessPoolExecutor
+import ast
+import hashlib
+import json
+import os
+import sys
+import time
+
+from emissions_store import build_store, file_fingerprint, normalize_object_columns
+from ghgrp_aggregation import company_year_panels, group_mode, ownership_links
+from instrumentation import instrumented, stage
+from name_matching import TickerMatcher
+from ownership_history import (build_ownership_intervals, changed_ownership,
+                               primary_parents, resolve_parents)
 
 # Paths
 DATA_DIR = Path(__file__).parent.parent / "data"
@@ -20,19 +50,80 @@ GHGRP_DIR = DATA_DIR / "epa_ghgrp"
 RAW_DIR = GHGRP_DIR / "raw"
 SUMMARY_DIR = RAW_DIR / "2023 Data Summary Spreadsheets"
 PROCESSED_DIR = GHGRP_DIR / "processed"
+CACHE_DIR = GHGRP_DIR / "cache"
+PARTITION_DIR = CACHE_DIR / "partitions"
+MANIFEST_PATH = CACHE_DIR / "manifest.json"
+
+PARENT_FILE = RAW_DIR / "EPA Parent Company Data.xlsb"
+SP500_FILE = DATA_DIR / "sp500_constituents.csv"
+
+def local_modules(script):
+    """The script plus every scripts/ module it imports, transitively."""
+    seen, todo = [], [Path(script).resolve()]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        for node in ast.walk(ast.parse(path.read_text(), filename=str(path))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = path.parent / f"{name.split('.')[0]}.py"
+                if candidate.exists():
+                    todo.append(candidate)
+    return sorted(seen)
+
+CODE_FILES = local_modules(__file__)
+
+OUTPUT_FILES = [
+    "ghgrp_facilities_all_years.csv",
+    "ghgrp_facilities_sp500_all_years.csv",
+    "ghgrp_company_year_sp500_all_years.csv",
+    "ghgrp_company_year_sp500_equity_all_years.csv",
+    "ghgrp_parent_ownership_history.csv",
+]
+
+def discover_years():
+    """Reporting years with a summary spreadsheet on disk."""
+    years = []
+    for path in SUMMARY_DIR.glob("ghgp_data_*.xlsx"):
+        suffix = path.stem.rsplit('_', 1)[-1]
+        if suffix.isdigit():
+            years.append(int(suffix))
+    return sorted(years)
 
 def load_sp500():
     """Load S&P 500 constituents with cleaned company names for matching."""
-    df = pd.read_csv(DATA_DIR / "sp500_constituents.csv")
+    df = pd.read_csv(SP500_FILE)
     df['clean_name'] = df['Security'].str.upper().str.strip()
     df['clean_name_short'] = df['clean_name'].str.replace(r'\s+(CORP|CORPORATION|INC|CO|COMPANY|LTD|LLC|PLC|&)\.?$', '', regex=True)
     return df
 
+@instrumented('parse_parent_companies', rows_out=len)
 def load_parent_company_data():
-    """Load parent company ownership data (2023 only, applied to all years)."""
-    parent_file = RAW_DIR / "EPA Parent Company Data.xlsb"
-    df = pd.read_excel(parent_file, engine='pyxlsb')
-    df.columns = [c.strip() for c in df.columns]
+    """Load parent company ownership data for every reporting year.
+
+    The workbook has one sheet per reporting year; the year comes from the
+    REPORTING YEAR column when present, otherwise from the sheet name.
+    """
+    sheets = pd.read_excel(PARENT_FILE, engine='pyxlsb', sheet_name=None)
+
+    frames = []
+    for sheet_name, df in sheets.items():
+        df.columns = [c.strip() for c in df.columns]
+        if 'REPORTING YEAR' in df.columns:
+            df['year'] = pd.to_numeric(df['REPORTING YEAR'], errors='coerce')
+        elif str(sheet_name).strip().isdigit():
+            df['year'] = int(str(sheet_name).strip())
+        else:
+            continue
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
 
     # Clean parent company names
     df['clean_parent'] = (df['PARENT COMPANY NAME']
@@ -44,7 +135,7 @@ def load_parent_company_data():
     return df
 
 def build_ticker_matcher(sp500_df):
-    """Build function to match parent company names to S&P 500 tickers."""
+    """Build a callable matcher from parent company names to S&P 500 tickers."""
     matches = {}
 
     # Direct matching from S&P 500 list
@@ -200,29 +291,7 @@ def build_ticker_matcher(sp500_df):
     }
     matches.update(manual_matches)
 
-    def find_match(parent_name):
-        if pd.isna(parent_name):
-            return None
-        name = str(parent_name).upper().strip()
-
-        # Direct match
-        if name in matches:
-            return matches[name]
-
-        # Remove common suffixes and try again
-        cleaned = re.sub(r'\s+(CORP|CORPORATION|INC|CO|COMPANY|LTD|LLC|PLC|LP|&|HOLDING|HOLDINGS|GROUP|ENTERPRISES?)\.?$', '', name)
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-        if cleaned in matches:
-            return matches[cleaned]
-
-        # Try partial matching for key words
-        for key, ticker in matches.items():
-            if len(key) > 5 and key in name:
-                return ticker
-
-        return None
-
-    return find_match
+    return TickerMatcher(matches)
 
 def load_ghgp_year(year):
     """Load GHGP data for a specific year."""
@@ -271,52 +340,271 @@ def load_ghgp_year(year):
 
     return df
 
-def main():
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _cache_paths(year):
+    return (CACHE_DIR / f"ghgp_data_{year}.parquet",
+            CACHE_DIR / f"ghgp_data_{year}.json")
+
+def read_year_cache(year):
+    """Return the cached frame for a year if it matches the source file, else None.
+
+    Size and mtime are checked first; if only the mtime moved (e.g. the file was
+    re-copied) the content hash decides, and the stored mtime is refreshed.
+    """
+    source = SUMMARY_DIR / f"ghgp_data_{year}.xlsx"
+    data_path, meta_path = _cache_paths(year)
+    if not (source.exists() and data_path.exists() and meta_path.exists()):
+        return None
+
+    meta = json.loads(meta_path.read_text())
+    current = file_fingerprint(source, with_hash=False)
+    if current['size'] != meta.get('size'):
+        return None
+    if current['mtime_ns'] != meta.get('mtime_ns'):
+        current = file_fingerprint(source)
+        if current['sha256'] != meta.get('sha256'):
+            return None
+        meta['mtime_ns'] = current['mtime_ns']
+        meta_path.write_text(json.dumps(meta, indent=2))
+
+    return pd.read_parquet(data_path)
+
+def _write_parquet(df, path):
+    """Atomically write a frame to Parquet."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = normalize_object_columns(df)
+
+    tmp_path = path.with_suffix('.parquet.tmp')
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def write_year_cache(year, df):
+    """Write a parsed year to the Parquet cache with its source fingerprint."""
+    source = SUMMARY_DIR / f"ghgp_data_{year}.xlsx"
+    data_path, meta_path = _cache_paths(year)
+    _write_parquet(df, data_path)
+
+    meta = file_fingerprint(source)
+    meta['year'] = year
+    meta['rows'] = len(df)
+    meta_path.write_text(json.dumps(meta, indent=2))
+
+def _parse_year(year, use_cache):
+    """Worker entry point: parse one year's spreadsheet and optionally cache it."""
+    with stage('parse_ghgp_year', year=year) as s:
+        df = load_ghgp_year(year)
+        s.rows_out = len(df) if df is not None else 0
+    if df is not None and use_cache:
+        write_year_cache(year, df)
+    return year, df
+
+def load_all_years(years=None, workers=None, use_cache=True):
+    """Load GHGP data for several years, parsing cache misses in a process pool.
+
+    Returns a dict mapping year -> DataFrame (None for missing source files).
+    """
+    years = discover_years() if years is None else list(years)
+    use_cache = use_cache and _parquet_available()
+    frames = {}
+    misses = []
+    with stage('read_year_cache') as s:
+        for year in years:
+            df = read_year_cache(year) if use_cache else None
+            if df is not None:
+                frames[year] = df
+                s.cache_hit()
+                s.rows_out = (s.rows_out or 0) + len(df)
+                print(f"   {year}: {len(df)} facilities (cached)")
+            else:
+                misses.append(year)
+                s.cache_miss()
+
+    if misses:
+        n_workers = min(workers or os.cpu_count() or 1, len(misses))
+        print(f"   Parsing {len(misses)} spreadsheet(s) with {n_workers} worker(s)...")
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                results = list(executor.map(_parse_year, misses, [use_cache] * len(misses)))
+        else:
+            results = [_parse_year(year, use_cache) for year in misses]
+        for year, df in results:
+            frames[year] = df
+            print(f"   {year}: {len(df)} facilities" if df is not None else f"   {year}: skipped")
+
+    return {year: frames[year] for year in years}
+
+def load_manifest():
+    if MANIFEST_PATH.exists():
+        return json.loads(MANIFEST_PATH.read_text())
+    return {'inputs': {}, 'partitions': {}}
+
+def save_manifest(manifest):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_suffix('.json.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def source_fingerprints(years, previous):
+    """Fingerprint the raw inputs, reusing stored hashes when size and mtime match."""
+    paths = {PARENT_FILE.name: PARENT_FILE, SP500_FILE.name: SP500_FILE}
+    for year in years:
+        paths[f"ghgp_data_{year}.xlsx"] = SUMMARY_DIR / f"ghgp_data_{year}.xlsx"
+
+    fingerprints = {}
+    for name, path in paths.items():
+        if not path.exists():
+            continue
+        old = previous.get(name)
+        current = file_fingerprint(path, with_hash=False)
+        if old and old['size'] == current['size'] and old['mtime_ns'] == current['mtime_ns']:
+            fingerprints[name] = old
+        else:
+            fingerprints[name] = file_fingerprint(path)
+    return fingerprints
+
+def shared_inputs_key(fingerprints):
+    """Hash of everything every year partition depends on (parents, S&P 500 list, code)."""
+    digest = hashlib.sha256()
+    for name in (PARENT_FILE.name, SP500_FILE.name):
+        digest.update(fingerprints.get(name, {}).get('sha256', '').encode())
+    for path in CODE_FILES:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+def plan_rebuild(manifest, fingerprints, years, shared_key):
+    """Return (stale_years, removed_years) relative to the manifest."""
+    stale = []
+    for year in years:
+        recorded = manifest['partitions'].get(str(year), {})
+        source = fingerprints.get(f"ghgp_data_{year}.xlsx", {}).get('sha256')
+        if (recorded.get('source') != source or recorded.get('shared') != shared_key
+                or not _partition_paths(year)[0].exists()):
+            stale.append(year)
+    removed = [int(y) for y in manifest['partitions'] if int(y) not in years]
+    return stale, removed
+
+def _partition_paths(year):
+    return (PARTITION_DIR / f"facilities_{year}.parquet",
+            PARTITION_DIR / f"parent_links_{year}.parquet")
+
+def build_intervals(sp500):
+    """Ownership spells with tickers, from the parent company workbook."""
+    parent_data = load_parent_company_data()
+    print(f"   Parent company records ({parent_data['year'].min():.0f}-{parent_data['year'].max():.0f}): "
+          f"{len(parent_data)}")
+
+    # Build facility ownership history (validity intervals per facility)
+    parent_history = parent_data[['GHGRP FACILITY ID', 'year', 'PARENT COMPANY NAME',
+                                  'PARENT CO. PERCENT OWNERSHIP', 'clean_parent']].copy()
+    parent_history.columns = ['facility_id', 'year', 'parent_company', 'ownership_pct', 'clean_parent']
+    intervals = build_ownership_intervals(parent_history)
+
+    # Build ticker matcher and add tickers to every ownership spell
+    find_ticker = build_ticker_matcher(sp500)
+    intervals['ticker'] = find_ticker.match_many(intervals['clean_parent'])
+    return intervals
+
+def build_year_partitions(yearly, intervals):
+    """Resolve parents for each loaded year.
+
+    Returns {year: (facilities, parent_links)}.
+    """
+    partitions = {}
+    for year, df in yearly.items():
+        if df is None:
+            continue
+        parent_links = resolve_parents(df, intervals)
+        facilities = df.merge(primary_parents(parent_links), on=['facility_id', 'year'], how='left')
+        partitions[year] = (facilities, parent_links)
+    return partitions
+
+def main(workers=None, use_cache=True, full=False):
     print("Processing EPA GHGRP data for all years...")
     print("=" * 60)
 
+    incremental = use_cache and _parquet_available()
+    years = discover_years()
+    manifest = load_manifest() if incremental else {'inputs': {}, 'partitions': {}}
+    fingerprints = source_fingerprints(years, manifest['inputs'])
+    shared_key = shared_inputs_key(fingerprints)
+
+    if incremental and not full:
+        stale, removed = plan_rebuild(manifest, fingerprints, years, shared_key)
+    else:
+        stale, removed = list(years), []
+    print(f"\nYears on disk: {len(years)}; partitions to rebuild: {stale if stale else 'none'}")
+
+    outputs_exist = all((PROCESSED_DIR / name).exists() for name in OUTPUT_FILES)
+    if not stale and not removed and outputs_exist:
+        print("All partitions and outputs are up to date; nothing to do.")
+        return
+
     # Load reference data
     print("\n1. Loading reference data...")
     sp500 = load_sp500()
     print(f"   S&P 500 companies: {len(sp500)}")
 
-    parent_data = load_parent_company_data()
-    print(f"   Parent company records (2023): {len(parent_data)}")
-
-    # Build facility-to-parent lookup (using 2023 data)
-    facility_parent = parent_data[['GHGRP FACILITY ID', 'PARENT COMPANY NAME',
-                                    'PARENT CO. PERCENT OWNERSHIP', 'clean_parent']].copy()
-    facility_parent.columns = ['facility_id', 'parent_company', 'ownership_pct', 'clean_parent']
-    facility_parent = facility_parent.drop_duplicates(subset=['facility_id'])
-    print(f"   Unique facilities with parent data: {len(facility_parent)}")
-
-    # Build ticker matcher
-    find_ticker = build_ticker_matcher(sp500)
-
-    # Add ticker to facility lookup
-    facility_parent['ticker'] = facility_parent['clean_parent'].apply(find_ticker)
-    sp500_facilities = facility_parent[facility_parent['ticker'].notna()].copy()
-    print(f"   Facilities matched to S&P 500: {len(sp500_facilities)}")
+    intervals_path = PARTITION_DIR / "ownership_intervals.parquet"
+    if incremental and manifest.get('shared') == shared_key and intervals_path.exists():
+        intervals = pd.read_parquet(intervals_path)
+        print("   Ownership history: unchanged (cached)")
+    else:
+        intervals = build_intervals(sp500)
+        if incremental:
+            _write_parquet(intervals, intervals_path)
+    print(f"   Unique facilities with parent data: {intervals['facility_id'].nunique()}")
+    print(f"   Facilities with ownership changes: {len(changed_ownership(intervals))}")
+    sp500_facilities = intervals[intervals['ticker'].notna()]
+    print(f"   Facilities matched to S&P 500: {sp500_facilities['facility_id'].nunique()}")
     print(f"   Unique S&P 500 tickers: {sp500_facilities['ticker'].nunique()}")
 
-    # Load all years of GHGP data
-    print("\n2. Loading GHGP data for all years...")
-    all_years = []
-    for year in range(2010, 2024):
-        print(f"   Loading {year}...", end=" ")
-        df = load_ghgp_year(year)
-        if df is not None:
-            print(f"{len(df)} facilities")
-            all_years.append(df)
-        else:
-            print("skipped")
-
-    ghgp_all = pd.concat(all_years, ignore_index=True)
-    print(f"\n   Total facility-year records: {len(ghgp_all)}")
+    # Load and resolve the stale years of GHGP data
+    print("\n2. Loading GHGP data for changed years...")
+    start = time.perf_counter()
+    yearly = load_all_years(stale, workers=workers, use_cache=use_cache)
+    print(f"   Loaded {sum(df is not None for df in yearly.values())} years in "
+          f"{time.perf_counter() - start:.2f}s")
 
-    # Merge with parent company data (using stable facility IDs)
+    # Resolve each facility-year to its contemporaneous parents (as-of join)
     print("\n3. Merging with parent company data...")
-    ghgp_all = ghgp_all.merge(facility_parent, on='facility_id', how='left')
+    partitions = build_year_partitions(yearly, intervals)
+
+    if incremental:
+        for year, (facilities, parent_links) in partitions.items():
+            facility_path, links_path = _partition_paths(year)
+            _write_parquet(facilities, facility_path)
+            _write_parquet(parent_links, links_path)
+            manifest['partitions'][str(year)] = {
+                'source': fingerprints[f"ghgp_data_{year}.xlsx"]['sha256'],
+                'shared': shared_key,
+                'rows': len(facilities),
+            }
+        for year in removed:
+            for path in _partition_paths(year):
+                path.unlink(missing_ok=True)
+            manifest['partitions'].pop(str(year), None)
+
+        # Re-assemble all years from the partitions
+        facility_frames, link_frames = [], []
+        for year in years:
+            facility_path, links_path = _partition_paths(year)
+            if facility_path.exists():
+                facility_frames.append(pd.read_parquet(facility_path))
+                link_frames.append(pd.read_parquet(links_path))
+    else:
+        facility_frames = [p[0] for p in partitions.values()]
+        link_frames = [p[1] for p in partitions.values()]
+
+    ghgp_all = pd.concat(facility_frames, ignore_index=True)
+    parent_links = pd.concat(link_frames, ignore_index=True)
+    facility_parent = primary_parents(parent_links)
+    print(f"\n   Total facility-year records: {len(ghgp_all)}")
     matched = ghgp_all['parent_company'].notna().sum()
     print(f"   Facility-years with parent company: {matched}")
 
@@ -336,21 +624,40 @@ def main():
     sp500_data.to_csv(PROCESSED_DIR / "ghgrp_facilities_sp500_all_years.csv", index=False)
     print(f"   Saved: ghgrp_facilities_sp500_all_years.csv ({len(sp500_data)} records)")
 
-    # Aggregate to company-year level for S&P 500
-    company_year = (sp500_data
-        .groupby(['ticker', 'year'])
-        .agg({
-            'total_emissions': 'sum',
-            'facility_id': 'count',
-            'state': lambda x: x.mode().iloc[0] if len(x) > 0 and len(x.mode()) > 0 else None
-        })
-        .reset_index())
-    company_year.columns = ['ticker', 'year', 'total_emissions', 'num_facilities', 'primary_state']
+    intervals.to_csv(PROCESSED_DIR / "ghgrp_parent_ownership_history.csv", index=False)
+    print(f"   Saved: ghgrp_parent_ownership_history.csv ({len(intervals)} spells)")
+
+    # Aggregate to company-year level for S&P 500: full attribution to the
+    # facility-year's primary parent, plus equity-share attribution across all parents
+    panels = company_year_panels(ghgp_all, {
+        'full': ownership_links(facility_parent, weighting='full'),
+        'equity': ownership_links(parent_links, weighting='equity'),
+    })
+    # Most common facility state, and the state holding the largest share of emissions
+    states = pd.concat([
+        group_mode(sp500_data, ['ticker', 'year'], 'state').rename('primary_state'),
+        group_mode(sp500_data, ['ticker', 'year'], 'state',
+                   weights='total_emissions').rename('primary_state_by_emissions'),
+    ], axis=1).reset_index()
+    company_year = panels['full'].merge(states, on=['ticker', 'year'], how='left')
     company_year = company_year.sort_values(['ticker', 'year'])
 
     company_year.to_csv(PROCESSED_DIR / "ghgrp_company_year_sp500_all_years.csv", index=False)
     print(f"   Saved: ghgrp_company_year_sp500_all_years.csv ({len(company_year)} records)")
 
+    equity_year = panels['equity'].sort_values(['ticker', 'year'])
+    equity_year.to_csv(PROCESSED_DIR / "ghgrp_company_year_sp500_equity_all_years.csv", index=False)
+    print(f"   Saved: ghgrp_company_year_sp500_equity_all_years.csv ({len(equity_year)} records)")
+
+    # Year-partitioned columnar store for query_emissions()
+    build_store(sp500_data, company_year)
+    print("   Updated emissions store (data/epa_ghgrp/store/)")
+
+    if incremental:
+        manifest['inputs'] = fingerprints
+        manifest['shared'] = shared_key
+        save_manifest(manifest)
+
     # Summary statistics
     print("\n" + "=" * 60)
     print("SUMMARY")
@@ -380,4 +687,10 @@ def main():
     print("Processing complete!")
 
 if __name__ == "__main__":
-    main()
+    args = sys.argv[1:]
+    workers = None
+    if '--workers' in args:
+        idx = args.index('--workers')
+        if idx + 1 < len(args):
+            workers = int(args[idx + 1])
+    main(workers=workers, use_cache='--no-cache' not in args, full='--full' in args)
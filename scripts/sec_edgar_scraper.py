@@ -11,6 +11,8 @@ import pandas as pd
 from pathlib import Path
 from datetime import datetime
 
+from instrumentation import instrumented
+
 BASE_DIR = Path("/Users/amalkova/Library/CloudStorage/OneDrive-FloridaInstituteofTechnology/Research")
 DATA_DIR = BASE_DIR / "data" / "sec_filings"
 
@@ -109,6 +111,7 @@ def count_ai_keywords(text):
 
     return counts, total
 
+@instrumented('scrape_10k_filings', rows_out=len)
 def process_company(ticker, start_year=2018):
     """Process all 10-K filings for a company"""
     print(f"\nProcessing {ticker}...")
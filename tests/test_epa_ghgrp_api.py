@@ -0,0 +1,124 @@
+"""Envirofacts downloader against a local stand-in HTTP server."""
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+import epa_ghgrp_api as api
+
+TABLE = 'V_GHG_EMITTER_FACILITIES'
+
+
+class StandIn:
+    """Serves /{table}/count/JSON and inclusive /{table}/rows/a:b/CSV slices of `rows`."""
+
+    def __init__(self, n_rows, fail_first=0):
+        self.set_rows(n_rows)
+        self.fail_first = fail_first
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def set_rows(self, n_rows, tag='v1'):
+        self.rows = [f"{i},facility {i},{tag}" for i in range(n_rows)]
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests.append(self.path)
+                    fail = server.fail_first > 0 and '/rows/' in self.path
+                    if fail:
+                        server.fail_first -= 1
+                if fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                parts = self.path.strip('/').split('/')
+                if parts[1] == 'count':
+                    body = json.dumps([{'TOTALQUERYRESULTS': len(server.rows)}]).encode()
+                else:
+                    first, last = map(int, parts[2].split(':'))
+                    lines = ['FACILITY_ID,FACILITY_NAME,VERSION'] + server.rows[first:last + 1]
+                    body = ('\n'.join(lines) + '\n').encode()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def stand_in():
+    table = StandIn(25)
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), table.handler())
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    table.base_url = f"http://127.0.0.1:{httpd.server_port}"
+    yield table
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def download(stand_in, tmp_path, page_size=10):
+    parts_dir = api.download_table(TABLE, stand_in.base_url, tmp_path / "parts",
+                                   page_size=page_size, workers=3, rate=0, retries=2)
+    output = tmp_path / "table.csv"
+    n_rows = api.combine_parts(parts_dir, output)
+    return parts_dir, output, n_rows
+
+
+def data_lines(path):
+    return path.read_text().splitlines()[1:]
+
+
+def test_full_table_in_pages(stand_in, tmp_path):
+    parts_dir, output, n_rows = download(stand_in, tmp_path)
+    assert n_rows == 25
+    assert data_lines(output) == stand_in.rows
+    assert sorted(p.name for p in parts_dir.glob("part-*.csv")) == [
+        'part-00000.csv', 'part-00001.csv', 'part-00002.csv']
+
+
+def test_retries_unavailable_pages(stand_in, tmp_path, monkeypatch):
+    monkeypatch.setattr(api.time, 'sleep', lambda seconds: None)
+    stand_in.fail_first = 2
+    _, output, _ = download(stand_in, tmp_path)
+    assert data_lines(output) == stand_in.rows
+
+
+def test_resume_skips_downloaded_pages(stand_in, tmp_path):
+    parts_dir, _, _ = download(stand_in, tmp_path)
+    api.part_path(parts_dir, 1).unlink()
+    stand_in.requests.clear()
+
+    _, output, _ = download(stand_in, tmp_path)
+    assert [r for r in stand_in.requests if '/rows/' in r] == [f"/{TABLE}/rows/10:19/CSV"]
+    assert data_lines(output) == stand_in.rows
+
+
+def test_changed_row_count_discards_parts(stand_in, tmp_path):
+    download(stand_in, tmp_path)
+    stand_in.set_rows(12, tag='v2')
+
+    parts_dir, output, n_rows = download(stand_in, tmp_path)
+    assert n_rows == 12
+    assert data_lines(output) == stand_in.rows
+    assert not api.part_path(parts_dir, 2).exists()
+
+
+def test_combine_requires_every_planned_part(stand_in, tmp_path):
+    parts_dir, _, _ = download(stand_in, tmp_path)
+    api.part_path(parts_dir, 0).unlink()
+    with pytest.raises(FileNotFoundError):
+        api.combine_parts(parts_dir, tmp_path / "table.csv")